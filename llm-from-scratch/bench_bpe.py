@@ -0,0 +1,112 @@
+"""
+BPE vs SimpleTokenizerV1: vocabulary size, unseen-text coverage and throughput.
+
+Runs on the-verdict.txt and on a synthetic corpus of --mb megabytes whose
+words follow a Zipf distribution over a large invented vocabulary (so, as
+with real text, new words keep appearing). The last 10% of each corpus is
+held out: the word vocabulary cannot encode what it has not seen, BPE can.
+
+    python bench_bpe.py --mb 8 --vocab-size 5000
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+from bpe import BPETokenizer
+from main import SimpleTokenizerV1, file_path, load_text
+
+
+def synthetic_corpus(megabytes: float, words: int = 200_000, seed: int = 42):
+    """Documents of sentences over `words` invented words with Zipf frequencies."""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"] + ["th", "ch", "sh", "qu", "ng"]
+    vocabulary = ["".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(words)]
+    weights, total = [], 0.0
+    for rank in range(1, words + 1):
+        total += 1.0 / rank
+        weights.append(total)
+    documents, size, target = [], 0, int(megabytes * 1024 * 1024)
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(5, 40)):
+            sentence = " ".join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(4, 20)))
+            sentences.append(sentence.capitalize() + rng.choice([".", ".", ".", "?", "!", "--"]))
+        document = " ".join(sentences)
+        documents.append(document)
+        size += len(document)
+    return documents
+
+
+def v1_vocab(documents):
+    words = set()
+    for document in documents:
+        words.update(item.strip() for item in re.split(r'([,.:;?_!"()\']|--|\s)', document) if item.strip())
+    return {token: integer for integer, token in enumerate(sorted(words))}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(name: str, documents, vocab_size: int):
+    if len(documents) == 1:  # a single text: hold out its last 10%
+        cut = len(documents[0]) * 9 // 10
+        train, held_out = [documents[0][:cut]], [documents[0][cut:]]
+    else:
+        split = len(documents) * 9 // 10
+        train, held_out = documents[:split], documents[split:]
+    chars = sum(len(d) for d in train)
+    print(f"{name}: {len(documents)} documents, {sum(len(d) for d in documents) / 1e6:.1f}M chars")
+    print(f"  {'tokenizer':<12} {'vocab':>9} {'build s':>8} {'Mtok/sec':>9} {'Mchar/s':>8} "
+          f"{'tok/char':>9} {'unseen ok':>10}")
+
+    vocab, build = timed(lambda: v1_vocab(train))
+    simple = SimpleTokenizerV1(vocab)
+    ids, elapsed = timed(lambda: [simple.encode(d) for d in train])
+    tokens = sum(len(i) for i in ids)
+    encodable = 0
+    for document in held_out:
+        try:
+            simple.encode(document)
+            encodable += 1
+        except KeyError:
+            pass
+    print(f"  {'V1':<12} {len(vocab):>9} {build:>8.2f} {tokens / elapsed / 1e6:>9.2f} {chars / elapsed / 1e6:>8.1f} "
+          f"{tokens / chars:>9.3f} {encodable:>4}/{len(held_out):<5}")
+
+    bpe, build = timed(lambda: BPETokenizer.train(train, vocab_size))
+    ids, cold = timed(lambda: [bpe.encode(d) for d in train])
+    ids, elapsed = timed(lambda: [bpe.encode(d) for d in train])
+    tokens = sum(len(i) for i in ids)
+    lossless = all(bpe.decode(bpe.encode(d)) == d for d in held_out)
+    print(f"  {'BPE':<12} {bpe.vocab_size:>9} {build:>8.2f} {tokens / elapsed / 1e6:>9.2f} {chars / elapsed / 1e6:>8.1f} "
+          f"{tokens / chars:>9.3f} {len(held_out) if lossless else 0:>4}/{len(held_out):<5}")
+    print(f"  BPE: {len(bpe.merges)} merges (build includes word counting), first encode {chars / cold / 1e6:.1f} Mchar/s "
+          f"(empty word cache), decode(encode(x)) == x on held-out text: {lossless}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tokenizer.bpe")
+        bpe.save(path)
+        loaded, elapsed = timed(lambda: BPETokenizer.load(path))
+        assert loaded.merges == bpe.merges
+        print(f"  BPE file: {os.path.getsize(path):,} bytes, loaded in {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BPE against the word-level tokenizer.")
+    parser.add_argument("--file", default=file_path)
+    parser.add_argument("--mb", type=float, default=8, help="Size of the synthetic corpus")
+    parser.add_argument("--vocab-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    run(args.file, [load_text(args.file)], args.vocab_size)
+    run("synthetic", synthetic_corpus(args.mb), args.vocab_size)
+
+
+if __name__ == "__main__":
+    main()
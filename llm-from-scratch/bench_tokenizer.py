@@ -0,0 +1,90 @@
+"""
+Tokenizer throughput benchmark: SimpleTokenizerV1 vs FastTokenizer.
+
+Encodes the-verdict.txt and a synthetic corpus (paragraphs of the-verdict
+shuffled and repeated to --mb megabytes, so every word is in the vocab) and
+reports tokens/sec for V1, the fast tokenizer (first with an empty piece
+cache, then warm) and its process pool:
+
+    python bench_tokenizer.py --mb 50 --workers 2 4 8
+"""
+import argparse
+import random
+import time
+
+from main import SimpleTokenizerV1, file_path, load_text
+from tokenizer import FastTokenizer, build_vocab
+
+
+def synthetic_corpus(text: str, megabytes: float, seed: int = 42):
+    """Documents built from shuffled paragraphs of `text`, about `megabytes` MB in total."""
+    rng = random.Random(seed)
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    documents, size, target = [], 0, int(megabytes * 1024 * 1024)
+    while size < target:
+        document = "\n\n".join(rng.choice(paragraphs) for _ in range(rng.randint(5, 20)))
+        documents.append(document)
+        size += len(document)
+    return documents
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def report(name: str, tokens: int, chars: int, elapsed: float, baseline: float = None):
+    speedup = f"{baseline / elapsed:>7.1f}x" if baseline else ""
+    print(f"  {name:<22} {elapsed:>8.3f} {tokens / elapsed / 1e6:>10.2f} {chars / elapsed / 1e6:>9.1f} {speedup}")
+
+
+def run(name: str, documents, workers):
+    chars = sum(len(d) for d in documents)
+    vocab = build_vocab("\n".join(documents))
+    simple = SimpleTokenizerV1(vocab)
+    print(f"{name}: {len(documents)} documents, {chars / 1e6:.1f}M chars, vocab {len(vocab)}")
+    print(f"  {'tokenizer':<22} {'seconds':>8} {'Mtok/sec':>10} {'Mchar/s':>9}")
+
+    expected, baseline = timed(lambda: [simple.encode(d) for d in documents])
+    tokens = sum(len(ids) for ids in expected)
+    report("V1 encode", tokens, chars, baseline)
+
+    with FastTokenizer(vocab) as fast:
+        ids, elapsed = timed(lambda: [fast.encode(d) for d in documents])
+        assert [a.tolist() for a in ids] == expected, "FastTokenizer output differs from V1"
+        report("fast encode (cold)", tokens, chars, elapsed, baseline)
+        _, elapsed = timed(lambda: [fast.encode(d) for d in documents])
+        report("fast encode", tokens, chars, elapsed, baseline)
+        _, elapsed = timed(lambda: [fast.encode(d, as_numpy=True) for d in documents])
+        report("fast encode (numpy)", tokens, chars, elapsed, baseline)
+        for count in workers:
+            fast.encode_batch(documents[:count * 64], workers=count)  # warm-up: start the workers
+            batch, elapsed = timed(lambda: fast.encode_batch(documents, workers=count))
+            assert [a.tolist() for a in batch] == expected
+            report(f"fast batch x{count}", tokens, chars, elapsed, baseline)
+
+        decoded, v1_decode = timed(lambda: [simple.decode(e) for e in expected])
+        report("V1 decode", tokens, chars, v1_decode)
+        fast_decoded, elapsed = timed(lambda: [fast.decode(a) for a in ids])
+        assert fast_decoded == decoded, "FastTokenizer.decode differs from V1"
+        report("fast decode", tokens, chars, elapsed, v1_decode)
+
+    memory = (sum(len(e) for e in expected) * 8 + 56 * len(expected), sum(a.buffer_info()[1] * 4 for a in ids))
+    print(f"  ids in memory: list {memory[0] / 1e6:.1f} MB (pointers only), array('I') {memory[1] / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark word-level tokenizers.")
+    parser.add_argument("--file", default=file_path)
+    parser.add_argument("--mb", type=float, default=20, help="Size of the synthetic corpus")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    text = load_text(args.file)
+    run(args.file, [text], [])
+    run("synthetic", synthetic_corpus(text, args.mb), args.workers)
+
+
+if __name__ == "__main__":
+    main()
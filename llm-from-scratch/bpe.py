@@ -0,0 +1,280 @@
+"""
+Byte-level byte-pair-encoding (BPE) tokenizer: training, encoding, and a
+compact binary file format.
+
+Unlike the word vocabulary of SimpleTokenizerV1, the vocabulary size is
+chosen up front and any text can be encoded (unseen words fall back to
+smaller pieces, down to single bytes):
+
+    tokenizer = BPETokenizer.train(raw_text, vocab_size=1000)
+    ids = tokenizer.encode("Hello, world.")        # array('I')
+    tokenizer.save("verdict.bpe")
+    tokenizer = BPETokenizer.load("verdict.bpe")
+
+See bench_bpe.py for training and encoding throughput against SimpleTokenizerV1.
+"""
+import heapq
+import os
+import re
+import struct
+import sys
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain, repeat
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from tokenizer import END_OF_TEXT
+
+# Ids 0-255 are the raw bytes; merge i creates id 256 + i
+BYTE_TOKENS = 256
+
+# Distinct pre-tokens (words) whose ids are cached per tokenizer
+WORD_CACHE_SIZE = int(os.getenv("BPE_WORD_CACHE_SIZE", 200_000))
+
+# GPT-2 style pre-tokenization (merges never cross these boundaries), written
+# for the re module: contractions, letters, digits, other symbols (each with
+# one optional leading space), then whitespace. Every character is matched.
+PRETOKEN_RE = re.compile(
+    r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+"""
+)
+
+# File format: header, merges as pairs of uint16 (or uint32 for vocabularies
+# over 65536 ids), then the special tokens separated by "\n"; little-endian
+_MAGIC = b"BPE\x01"
+_HEADER = struct.Struct("<4sBII")  # magic, bytes per id, merge count, special tokens length
+
+Pair = Tuple[int, int]
+
+
+def _merge(ids: List[int], pair: Pair, new_id: int) -> List[int]:
+    """Replaces every non-overlapping occurrence of `pair` (left to right) with new_id."""
+    first, second = pair
+    out, i, n = [], 0, len(ids)
+    while i < n:
+        if i < n - 1 and ids[i] == first and ids[i + 1] == second:
+            out.append(new_id)
+            i += 2
+        else:
+            out.append(ids[i])
+            i += 1
+    return out
+
+
+class BPETokenizer:
+    """
+    Args:
+        merges: merged pairs in training order; merge i creates id 256 + i.
+        special_tokens: tokens matched whole in the text (ids after the merges).
+    """
+
+    def __init__(self, merges: Sequence[Pair], special_tokens: Sequence[str] = (END_OF_TEXT,)):
+        self.merges: List[Pair] = [tuple(pair) for pair in merges]
+        self.ranks: Dict[Pair, int] = {pair: rank for rank, pair in enumerate(self.merges)}
+        self.special_tokens = list(special_tokens)
+        first_special = BYTE_TOKENS + len(self.merges)
+        self.special_ids = {token: first_special + i for i, token in enumerate(self.special_tokens)}
+
+        # Bytes of every id, for decoding
+        self._bytes = [bytes([i]) for i in range(BYTE_TOKENS)]
+        for first, second in self.merges:
+            self._bytes.append(self._bytes[first] + self._bytes[second])
+        self._bytes.extend(token.encode("utf-8") for token in self.special_tokens)
+
+        specials = sorted(self.special_tokens, key=len, reverse=True)
+        self._special_re = re.compile("(" + "|".join(map(re.escape, specials)) + ")") if specials else None
+        self._cache = _WordCache(self)
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self._bytes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = _WordCache(self)
+
+    # --- Training ---
+
+    @classmethod
+    def train(cls, texts: Union[str, Iterable[str]], vocab_size: int, min_frequency: int = 2,
+              special_tokens: Sequence[str] = (END_OF_TEXT,), verbose: bool = False) -> "BPETokenizer":
+        """
+        Learns merges until the vocabulary reaches `vocab_size` (bytes, merges
+        and special tokens) or no pair occurs `min_frequency` times.
+
+        Training works on distinct words weighted by their counts. Pair counts
+        live in a max-heap that is updated incrementally: a merge only touches
+        the words containing the merged pair (found through a pair -> words
+        index), and outdated heap entries are re-checked when they surface
+        instead of recounting all pairs after every merge.
+        """
+        if vocab_size < BYTE_TOKENS + len(special_tokens):
+            raise ValueError(f"vocab_size must be at least {BYTE_TOKENS + len(special_tokens)}")
+        if isinstance(texts, str):
+            texts = [texts]
+        special_re = re.compile("|".join(map(re.escape, special_tokens))) if special_tokens else None
+        word_counts = Counter()
+        for text in texts:
+            for part in special_re.split(text) if special_re else [text]:
+                word_counts.update(PRETOKEN_RE.findall(part))
+
+        words = [list(word.encode("utf-8")) for word in word_counts]
+        freqs = list(word_counts.values())
+        del word_counts
+        pair_counts: Dict[Pair, int] = defaultdict(int)
+        where: Dict[Pair, set] = defaultdict(set)
+        for i, word in enumerate(words):
+            for pair in zip(word, word[1:]):
+                pair_counts[pair] += freqs[i]
+                where[pair].add(i)
+        heap = [(-count, pair) for pair, count in pair_counts.items()]
+        heapq.heapify(heap)
+
+        merges: List[Pair] = []
+        target = vocab_size - BYTE_TOKENS - len(special_tokens)
+        while len(merges) < target and heap:
+            negative, pair = heapq.heappop(heap)
+            count = pair_counts.get(pair, 0)
+            if count != -negative:  # outdated entry: requeue with the current count
+                if count > 0:
+                    heapq.heappush(heap, (-count, pair))
+                continue
+            if count < min_frequency:
+                break
+            new_id = BYTE_TOKENS + len(merges)
+            merges.append(pair)
+            first, second = pair
+            grown = set()
+            for i in where.pop(pair):
+                word, freq = words[i], freqs[i]
+                # Merge left to right, updating only the pairs around each occurrence
+                merged, j, n = [], 0, len(word)
+                while j < n:
+                    if j < n - 1 and word[j] == first and word[j + 1] == second:
+                        if j > 0:
+                            pair_counts[word[j - 1], first] -= freq
+                            new = (merged[-1], new_id)
+                            pair_counts[new] += freq
+                            where[new].add(i)
+                            grown.add(new)
+                        # When the next occurrence follows directly, it accounts for the pair in between
+                        if j + 2 < n and not (j + 3 < n and word[j + 2] == first and word[j + 3] == second):
+                            pair_counts[second, word[j + 2]] -= freq
+                            new = (new_id, word[j + 2])
+                            pair_counts[new] += freq
+                            where[new].add(i)
+                            grown.add(new)
+                        merged.append(new_id)
+                        j += 2
+                    else:
+                        merged.append(word[j])
+                        j += 1
+                # The index is not pruned: words that no longer have the pair are unchanged
+                words[i] = merged
+            del pair_counts[pair]
+            # Only pairs with the new id gained counts; decreases are handled lazily
+            for new in grown:
+                heapq.heappush(heap, (-pair_counts[new], new))
+            if verbose and len(merges) % 1000 == 0:
+                print(f"{len(merges)} merges, last count {count}")
+        return cls(merges, special_tokens)
+
+    # --- Encoding ---
+
+    def _encode_word(self, word: str) -> Tuple[int, ...]:
+        """Applies the merges to one pre-token, always the lowest-ranked adjacent pair first."""
+        ids = list(word.encode("utf-8"))
+        ranks_get = self.ranks.get
+        missing = len(self.merges)
+        while len(ids) > 1:
+            rank = min(map(ranks_get, zip(ids, ids[1:]), repeat(missing)))
+            if rank == missing:
+                break
+            ids = _merge(ids, self.merges[rank], BYTE_TOKENS + rank)
+        return tuple(ids)
+
+    def encode(self, text: str, add_end_of_text: bool = False,
+               as_numpy: bool = False) -> Union[array, np.ndarray]:
+        """
+        Args:
+            text: text to encode; special tokens in it are encoded whole.
+            add_end_of_text: append <|endoftext|> (to concatenate documents).
+            as_numpy: return an int32 NumPy array (a view, no copy).
+
+        Returns:
+            array('I') of token ids, or an np.int32 array.
+        """
+        ids = array("I")
+        parts = self._special_re.split(text) if self._special_re is not None else [text]
+        # re.split with a group alternates text, special, text, ...
+        for i, part in enumerate(parts):
+            if i % 2:
+                ids.append(self.special_ids[part])
+            elif part:
+                ids.extend(chain.from_iterable(map(self._cache.__getitem__, PRETOKEN_RE.findall(part))))
+        if add_end_of_text:
+            ids.append(self.special_ids[END_OF_TEXT])
+        return np.frombuffer(ids, dtype=np.uint32).view(np.int32) if as_numpy else ids
+
+    def decode(self, ids: Iterable[int]) -> str:
+        """Inverse of encode (bytes that do not form valid UTF-8 become U+FFFD)."""
+        return b"".join(map(self._bytes.__getitem__, ids)).decode("utf-8", errors="replace")
+
+    # --- Storage ---
+
+    def save(self, path: str):
+        """Writes merges and special tokens in the compact binary format (atomically)."""
+        width = 2 if self.vocab_size <= 1 << 16 else 4
+        merges = array("H" if width == 2 else "I", chain.from_iterable(self.merges))
+        if sys.byteorder == "big":
+            merges.byteswap()
+        specials = "\n".join(self.special_tokens).encode("utf-8")
+        with open(path + ".tmp", "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, width, len(self.merges), len(specials)))
+            f.write(merges.tobytes())
+            f.write(specials)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "BPETokenizer":
+        """
+        Raises:
+            ValueError: the file is not a BPE tokenizer file or is truncated.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path} is not a BPE tokenizer file")
+        magic, width, merge_count, specials_length = _HEADER.unpack_from(data)
+        if magic != _MAGIC or width not in (2, 4):
+            raise ValueError(f"{path} is not a BPE tokenizer file")
+        merges_end = _HEADER.size + merge_count * 2 * width
+        if len(data) != merges_end + specials_length:
+            raise ValueError(f"{path} is truncated or corrupted")
+        merges = array("H" if width == 2 else "I")
+        merges.frombytes(data[_HEADER.size:merges_end])
+        if sys.byteorder == "big":
+            merges.byteswap()
+        specials = data[merges_end:].decode("utf-8")
+        pairs = list(zip(merges[::2], merges[1::2]))
+        return cls(pairs, specials.split("\n") if specials else [])
+
+
+class _WordCache(dict):
+    """Pre-token -> tuple of ids; misses are merged by __missing__, hits stay in C."""
+
+    def __init__(self, tokenizer: BPETokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+
+    def __missing__(self, word: str) -> Tuple[int, ...]:
+        ids = self.tokenizer._encode_word(word)
+        if len(self) < WORD_CACHE_SIZE:
+            self[word] = ids
+        return ids
@@ -2,37 +2,25 @@ import os
 import urllib.request
 import re
 
-file_path = 'the-verdict.txt'
-
-if not os.path.exists(file_path):
-    url = ("https://raw.githubusercontent.com/rasbt/LLMs-from-scratch/refs/heads/main/ch02/01_main-chapter-code/the-verdict.txt")
-    urllib.request.urlretrieve(url, file_path)
-
-with open(file_path, 'r', encoding="utf-8") as f:
-    raw_text = f.read()
+from tokenizer import FastTokenizer, build_vocab
 
-print(len(raw_text))
+file_path = 'the-verdict.txt'
 
-# Preprocess raw_text
-result = re.split(r'([,.:;?_!"()\']|--|\s)', raw_text)
-result = [item.strip() for item in result if item.strip()]
-preprocessed = result
-print("First 10 tokens:", preprocessed[:10])
 
-# Vocabulary
-all_words = sorted(set(preprocessed))
-vocab_size = len(all_words)
-print("Vocab size:", vocab_size)
+def load_text(file_path=file_path):
+    if not os.path.exists(file_path):
+        url = ("https://raw.githubusercontent.com/rasbt/LLMs-from-scratch/refs/heads/main/ch02/01_main-chapter-code/the-verdict.txt")
+        urllib.request.urlretrieve(url, file_path)
 
-vocab = {token: integer for integer, token in enumerate(all_words)}
-print("Sample vocab entries:", list(vocab.items())[:10])
+    with open(file_path, 'r', encoding="utf-8") as f:
+        return f.read()
 
 
 class SimpleTokenizerV1:
     def __init__(self, vocab):
         self.str_to_int = vocab
         self.int_to_str = {i: s for s, i in vocab.items()}
-    
+
     def encode(self, text):
         preprocessed = re.split(r'([,.:;?_!"()\']|--|\s)', text)  # match preprocessing
         preprocessed = [item.strip() for item in preprocessed if item.strip()]
@@ -45,11 +33,35 @@ class SimpleTokenizerV1:
         return text
 
 
-tokenizer = SimpleTokenizerV1(vocab)
+if __name__ == "__main__":
+    raw_text = load_text()
+    print(len(raw_text))
+
+    # Preprocess raw_text
+    result = re.split(r'([,.:;?_!"()\']|--|\s)', raw_text)
+    result = [item.strip() for item in result if item.strip()]
+    preprocessed = result
+    print("First 10 tokens:", preprocessed[:10])
+
+    # Vocabulary
+    all_words = sorted(set(preprocessed))
+    vocab_size = len(all_words)
+    print("Vocab size:", vocab_size)
+
+    vocab = {token: integer for integer, token in enumerate(all_words)}
+    print("Sample vocab entries:", list(vocab.items())[:10])
+
+    # Same vocabulary plus <|endoftext|> and <|unk|>, so unseen words can be encoded
+    fast_tokenizer = FastTokenizer(build_vocab(raw_text), unknown="replace")
+    ids = fast_tokenizer.encode("Hello, world. Is this-- a test?", add_end_of_text=True)
+    print("Encoded (fast):", ids.tolist())
+    print("Decoded (fast):", fast_tokenizer.decode(ids))
+
+    tokenizer = SimpleTokenizerV1(vocab)
 
-text = "Hello, world. Is this-- a test?"
-ids = tokenizer.encode(text)
-print("Encoded:", ids)
+    text = "Hello, world. Is this-- a test?"
+    ids = tokenizer.encode(text)
+    print("Encoded:", ids)
 
-decoded = tokenizer.decode(ids)
-print("Decoded:", decoded)
+    decoded = tokenizer.decode(ids)
+    print("Decoded:", decoded)
@@ -0,0 +1,242 @@
+"""
+Word-level tokenizer for large corpora, compatible with SimpleTokenizerV1.
+
+Splits text exactly like SimpleTokenizerV1 (words, punctuation and "--";
+whitespace is dropped), but with one precompiled regex pass per distinct
+whitespace-separated piece (cached), and returns compact array('I') (or
+NumPy int32) ids instead of lists:
+
+    vocab = build_vocab(raw_text)                  # + <|endoftext|>, <|unk|>
+    tokenizer = FastTokenizer(vocab, unknown="replace")
+    ids = tokenizer.encode(text, add_end_of_text=True)
+    batches = tokenizer.encode_batch(texts, workers=4, as_numpy=True)
+
+See bench_tokenizer.py for throughput numbers.
+"""
+import multiprocessing
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+END_OF_TEXT = "<|endoftext|>"
+UNK_TOKEN = "<|unk|>"
+SPECIAL_TOKENS = (END_OF_TEXT, UNK_TOKEN)
+
+# Worker processes used by encode_batch (1 = encode in this process)
+ENCODE_WORKERS = int(os.getenv("TOKENIZER_WORKERS", min(8, os.cpu_count() or 1)))
+
+# Smaller batches are encoded in this process (not worth the transfer to workers)
+PARALLEL_MIN_TEXTS = int(os.getenv("TOKENIZER_PARALLEL_MIN_TEXTS", 64))
+
+# Distinct whitespace-separated pieces whose ids are cached per tokenizer
+PIECE_CACHE_SIZE = int(os.getenv("TOKENIZER_PIECE_CACHE_SIZE", 200_000))
+
+# One pass equivalent to re.split(r'([,.:;?_!"()\']|--|\s)') + dropping blanks:
+# a word (a run of other characters in which single "-" may occur, "--" may
+# not), "--", a punctuation mark, or a word starting with a lone "-"
+_WORD = r'[^\s,.:;?_!"()\'-]'
+TOKEN_RE = re.compile(
+    rf'{_WORD}+(?:-(?!-){_WORD}*)*|--|[,.:;?_!"()\']|-(?:{_WORD}+|-(?!-))*'
+)
+
+# Punctuation that decode attaches to the previous token (as SimpleTokenizerV1.decode)
+_ATTACHED = frozenset(',.?!"()\'')
+
+
+def split_text(text: str) -> List[str]:
+    """The tokens of `text`, same as SimpleTokenizerV1's preprocessing."""
+    return TOKEN_RE.findall(text)
+
+
+def build_vocab(text: str, special_tokens: Sequence[str] = SPECIAL_TOKENS) -> Dict[str, int]:
+    """
+    Sorted word vocabulary of `text` (as in main.py) with the special tokens
+    appended at the end.
+    """
+    words = sorted(set(split_text(text)))
+    words.extend(token for token in special_tokens if token not in words)
+    return {token: integer for integer, token in enumerate(words)}
+
+
+class FastTokenizer:
+    """
+    Args:
+        vocab: token -> id (ids must fit in 32 bits).
+        unknown: "error" raises KeyError on a token missing from the vocab
+            (like SimpleTokenizerV1), "replace" encodes it as <|unk|>.
+
+    Special tokens present in the vocab (<|endoftext|>, <|unk|>) are matched
+    as whole tokens in the text, even when not surrounded by whitespace.
+    """
+
+    def __init__(self, vocab: Dict[str, int], unknown: str = "error"):
+        if unknown not in ("error", "replace"):
+            raise ValueError(f"unknown must be 'error' or 'replace', not {unknown!r}")
+        if unknown == "replace" and UNK_TOKEN not in vocab:
+            raise ValueError(f"unknown='replace' needs {UNK_TOKEN} in the vocab")
+        self.str_to_int = vocab
+        self.int_to_str = {i: s for s, i in vocab.items()}
+        self.unknown = unknown
+        self.unk_id = vocab.get(UNK_TOKEN)
+        self.end_of_text_id = vocab.get(END_OF_TEXT)
+
+        specials = sorted((t for t in SPECIAL_TOKENS if t in vocab), key=len, reverse=True)
+        self._special_re = re.compile("(" + "|".join(map(re.escape, specials)) + ")") if specials else None
+
+        # Decoded form of every id: " word", or the bare mark for attached punctuation
+        pieces = {i: (s if s in _ATTACHED else " " + s) for i, s in self.int_to_str.items()}
+        if sorted(pieces) == list(range(len(pieces))):
+            pieces = [pieces[i] for i in range(len(pieces))]  # dense ids: list indexing
+        self._pieces = pieces
+        self._cache = _PieceCache(self)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+
+    def __getstate__(self):
+        # Sent to pool workers: they build their own cache and have no pool
+        state = self.__dict__.copy()
+        state["_cache"], state["_pool"], state["_pool_workers"] = None, None, 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = _PieceCache(self)
+
+    # --- Encoding ---
+
+    def _split_piece(self, piece: str) -> List[str]:
+        """Tokens of one whitespace-free piece, keeping special tokens whole."""
+        if self._special_re is None:
+            return TOKEN_RE.findall(piece)
+        tokens = []
+        # re.split with a group alternates text, special, text, ...
+        for i, part in enumerate(self._special_re.split(piece)):
+            if i % 2:
+                tokens.append(part)
+            elif part:
+                tokens.extend(TOKEN_RE.findall(part))
+        return tokens
+
+    def tokenize(self, text: str) -> List[str]:
+        """Splits text into tokens, same as SimpleTokenizerV1 apart from special tokens."""
+        return [token for piece in text.split() for token in self._split_piece(piece)]
+
+    def encode(self, text: str, add_end_of_text: bool = False,
+               as_numpy: bool = False) -> Union[array, np.ndarray]:
+        """
+        Whitespace never occurs inside a token, so the text is cut with
+        str.split() and every distinct piece ("world," -> (id, id)) is
+        tokenized once and cached; known pieces are looked up without
+        running any Python code per token.
+
+        Args:
+            text: text to encode.
+            add_end_of_text: append <|endoftext|> (to concatenate documents).
+            as_numpy: return an int32 NumPy array (a view, no copy).
+
+        Returns:
+            array('I') of token ids, or an np.int32 array.
+
+        Raises:
+            KeyError: a token is not in the vocab and unknown="error".
+        """
+        ids = array("I", chain.from_iterable(map(self._cache.__getitem__, text.split())))
+        if add_end_of_text:
+            if self.end_of_text_id is None:
+                raise KeyError(END_OF_TEXT)
+            ids.append(self.end_of_text_id)
+        return _as_numpy(ids) if as_numpy else ids
+
+    def encode_batch(self, texts: Iterable[str], workers: Optional[int] = None, add_end_of_text: bool = False,
+                     as_numpy: bool = False) -> List[Union[array, np.ndarray]]:
+        """
+        Encodes many texts, in a process pool when the batch is large enough.
+
+        The pool is started on first use and reused; each worker receives
+        the vocab once, then only texts and ids cross process boundaries
+        (array('I') pickles as raw bytes).
+
+        Returns:
+            list: one id array per text, in input order.
+        """
+        texts = texts if isinstance(texts, list) else list(texts)
+        workers = workers or ENCODE_WORKERS
+        if workers <= 1 or len(texts) < PARALLEL_MIN_TEXTS:
+            return [self.encode(text, add_end_of_text, as_numpy) for text in texts]
+        pool = self._get_pool(workers)
+        chunksize = max(1, len(texts) // (workers * 4))
+        results = list(pool.map(_encode_in_worker, texts, repeat(add_end_of_text), chunksize=chunksize))
+        return [_as_numpy(ids) for ids in results] if as_numpy else results
+
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            # fork where available: spawned workers would re-run the calling script
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                             initializer=_init_worker, initargs=(self,))
+            self._pool_workers = workers
+        return self._pool
+
+    def close(self):
+        """Shuts the worker pool down (a later encode_batch starts a new one)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool, self._pool_workers = None, 0
+
+    def __enter__(self) -> "FastTokenizer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # --- Decoding ---
+
+    def decode(self, ids: Iterable[int]) -> str:
+        """Inverse of encode, formatted like SimpleTokenizerV1.decode."""
+        text = "".join(map(self._pieces.__getitem__, ids))
+        return text[1:] if text.startswith(" ") else text
+
+
+class _PieceCache(dict):
+    """Piece -> tuple of ids; misses are tokenized by __missing__, hits stay in C."""
+
+    def __init__(self, tokenizer: "FastTokenizer"):
+        super().__init__()
+        self.tokenizer = tokenizer
+
+    def __missing__(self, piece: str) -> Tuple[int, ...]:
+        tokenizer = self.tokenizer
+        tokens = tokenizer._split_piece(piece)
+        if tokenizer.unknown == "replace":
+            ids = tuple(map(tokenizer.str_to_int.get, tokens, repeat(tokenizer.unk_id)))
+        else:
+            ids = tuple(map(tokenizer.str_to_int.__getitem__, tokens))
+        if len(self) < PIECE_CACHE_SIZE:
+            self[piece] = ids
+        return ids
+
+
+def _as_numpy(ids: array) -> np.ndarray:
+    return np.frombuffer(ids, dtype=np.uint32).view(np.int32)
+
+
+# --- Worker processes ---
+
+_worker_tokenizer: Optional[FastTokenizer] = None
+
+
+def _init_worker(tokenizer: FastTokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _encode_in_worker(text: str, add_end_of_text: bool) -> array:
+    return _worker_tokenizer.encode(text, add_end_of_text)
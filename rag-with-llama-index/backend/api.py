@@ -1,41 +1,274 @@
 
 import os
-import openai
+import re
+import json
+import time
+import uuid
+import atexit
+import threading
 import config
+import metrics
 from rag_service import RAGService
-from audit_logger import log_query, log_feedback
-from flask import Flask, request, jsonify
+from service_registry import ServiceRegistry, UnknownCollectionError
+from openai_client import check_health as check_openai_health
+from audit_logger import log_query, log_queries, new_log_id, log_feedback, get_metrics as get_audit_metrics
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from sync_service import sync_data_directory
+from watch_service import DataDirectoryWatcher
+from timings import track
 
 # Initialize Flask app
 app = Flask(__name__)
 
 
-# Synchronize index with data directory at startup
-try:
-    sync_data_directory()
-except Exception as e:
-    print(f"Error during index synchronization: {e}")
+# One RAGService per collection, loaded on first use (the default one at startup)
+registry = ServiceRegistry()
+startup_state = {"state": "starting", "error": None}
 
-# Initialize the RAG service on application startup
-try:
-    rag_service = RAGService()
-except Exception as e:
-    print(f"Fatal error during RAG Service initialization: {e}")
-    rag_service = None
+def initialize_services():
+    """Builds the default collection's RAGService and syncs its index with the data directory."""
+    try:
+        service = RAGService(config.DEFAULT_COLLECTION)
+    except Exception as e:
+        print(f"Fatal error during RAG Service initialization: {e}")
+        startup_state.update(state="error", error=str(e))
+        return
+
+    # Synchronize index with data directory, reusing the same service
+    try:
+        sync_data_directory(service)
+    except Exception as e:
+        print(f"Error during index synchronization: {e}")
+
+    # Pinned: the watcher below keeps this instance up to date
+    registry.add(service, pinned=True)
+    startup_state["state"] = "ready"
+
+    if config.WATCH_DATA_DIR:
+        watcher = DataDirectoryWatcher(service)
+        watcher.start()
+        atexit.register(watcher.stop)
+
+def lookup_service(collection=None):
+    """
+    Returns the RAGService of a collection (the default one when omitted).
+
+    Returns:
+        tuple: (service, None, 200) on success, otherwise
+        (None, error body, HTTP status).
+    """
+    if startup_state["state"] != "ready":
+        return None, {"error": "Service is not ready.", "state": startup_state["state"]}, 503
+    collection = collection or config.DEFAULT_COLLECTION
+    try:
+        return registry.get(collection), None, 200
+    except ValueError as e:
+        return None, {"error": str(e)}, 400
+    except UnknownCollectionError:
+        return None, {"error": f"Unknown collection '{collection}'."}, 404
+
+# --- Tracing and Metrics ---
+
+# Accept client-supplied trace ids only if they are short and header-safe
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+def resolve_trace_id(headers):
+    """Returns the request's trace ID (client-supplied or new), or None when disabled."""
+    if not config.TRACE_IDS_ENABLED:
+        return None
+    incoming = headers.get(config.TRACE_ID_HEADER)
+    if incoming and _TRACE_ID_RE.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    g.trace_id = resolve_trace_id(request.headers)
+
+@app.after_request
+def finish_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - g.started, endpoint=endpoint, status=response.status_code)
+    if g.trace_id:
+        response.headers[config.TRACE_ID_HEADER] = g.trace_id
+    return response
+
+def _cache_samples():
+    samples = []
+    for service in registry.loaded():
+        if service.cache is not None:
+            samples += [((service.collection, result), service.cache.stats[key]) for key, result in
+                        (("exact_hits", "exact_hit"), ("semantic_hits", "semantic_hit"), ("misses", "miss"))]
+    return samples
+
+def _cache_hit_ratio(cache, hit_keys, labels=()):
+    if cache is None:
+        return []
+    total = sum(cache.stats.values())
+    return [(labels, sum(cache.stats[k] for k in hit_keys) / total if total else 0.0)]
+
+def _response_cache_hit_ratios():
+    return [sample for service in registry.loaded()
+            for sample in _cache_hit_ratio(service.cache, ("exact_hits", "semantic_hits"), (service.collection,))]
+
+def _shared_embedding_cache():
+    # Every service holds the same process-wide cache
+    services = registry.loaded()
+    return services[0].embedding_cache if services else None
+
+def _embedding_cache_samples():
+    cache = _shared_embedding_cache()
+    if cache is None:
+        return []
+    return [(("hit",), cache.stats["hits"]), (("miss",), cache.stats["misses"])]
+
+def _audit_samples(keys):
+    audit = get_audit_metrics()
+    return [((key,), audit[key]) for key in keys]
+
+metrics.register_callback(
+    "rag_response_cache_lookups_total", "Response cache lookups by result.", "counter",
+    ["collection", "result"], _cache_samples,
+)
+metrics.register_callback(
+    "rag_response_cache_hit_ratio", "Share of response cache lookups answered from the cache.", "gauge",
+    ["collection"], _response_cache_hit_ratios,
+)
+metrics.register_callback(
+    "rag_embedding_cache_lookups_total", "Chunk embedding cache lookups by result.", "counter", ["result"],
+    _embedding_cache_samples,
+)
+metrics.register_callback(
+    "rag_embedding_cache_hit_ratio", "Share of chunk embeddings served from the cache.", "gauge", [],
+    lambda: _cache_hit_ratio(_shared_embedding_cache(), ("hits",)),
+)
+metrics.register_callback(
+    "rag_audit_records_total", "Audit records by outcome.", "counter", ["outcome"],
+    lambda: _audit_samples(("written", "dropped", "spilled")),
+)
+metrics.register_callback(
+    "rag_audit_queue_depth", "Audit records waiting for the background writer.", "gauge", [],
+    lambda: [((), get_audit_metrics()["queue_depth"])],
+)
+metrics.register_callback(
+    "rag_collection_memory_bytes", "Estimated index memory of each loaded collection.", "gauge", ["collection"],
+    lambda: [((s.collection,), s.memory_bytes()) for s in registry.loaded()],
+)
+metrics.register_callback(
+    "rag_service_ready", "1 once the index and models are loaded.", "gauge", [],
+    lambda: [((), 1 if startup_state["state"] == "ready" else 0)],
+)
+
+# Initialize the RAG service on application startup, but not when an
+# ingestion worker imports this script as its main module (see ingestion.get_pool)
+if __name__ != "__mp_main__":
+    if config.LAZY_INIT:
+        threading.Thread(target=initialize_services, name="rag-init", daemon=True).start()
+    else:
+        initialize_services()
 
 @app.route('/chat', methods=['POST'])
 def chat_endpoint():
     data = request.get_json()
+    rag_service, error, status = lookup_service(data.get('collection'))
+    if rag_service is None:
+        return jsonify(error), status
     prompt = data['prompt']
-    response_text = rag_service.query(prompt)
-    log_id = log_query(prompt, response_text)
+    with track() as timings:
+        response_text = rag_service.query(prompt)
+        log_id = log_query(prompt, response_text, trace_id=g.trace_id)
     
     return jsonify({
         "response": response_text,
-        "log_id": log_id
+        "collection": rag_service.collection,
+        "log_id": log_id,
+        "trace_id": g.trace_id,
+        "timings_ms": timings
     })
 
+def format_sse(event: str, payload: dict) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream_endpoint():
+    data = request.get_json()
+    rag_service, error, status = lookup_service(data.get('collection'))
+    if rag_service is None:
+        return jsonify(error), status
+    prompt = data['prompt']
+    trace_id = g.trace_id
+
+    def generate():
+        parts = []
+        with track() as timings:
+            try:
+                for token in rag_service.stream_query(prompt):
+                    parts.append(token)
+                    yield format_sse("token", {"token": token})
+            except Exception as e:
+                yield format_sse("error", {"details": str(e)})
+                return
+            # Log only once the full answer is known
+            log_id = log_query(prompt, "".join(parts), trace_id=trace_id)
+        yield format_sse("done", {"log_id": log_id, "trace_id": trace_id, "timings_ms": timings})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """
+    Answers a list of prompts in one request.
+
+    Body: {"prompts": [...], "collection": optional}. Streams one JSON object
+    per line (application/x-ndjson) as answers complete, so results arrive out
+    of order and carry the index of their prompt.
+    """
+    data = request.get_json()
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not prompts or not all(isinstance(p, str) for p in prompts):
+        return jsonify({"error": "'prompts' must be a non-empty list of strings"}), 400
+    if len(prompts) > config.BATCH_MAX_PROMPTS:
+        return jsonify({"error": f"At most {config.BATCH_MAX_PROMPTS} prompts per batch"}), 400
+    rag_service, error, status = lookup_service(data.get('collection'))
+    if rag_service is None:
+        return jsonify(error), status
+    trace_id = g.trace_id
+
+    def generate():
+        # Audit records are written in bulk rather than one queue item per answer
+        entries = []
+        last_flush = time.monotonic()
+        try:
+            for index, answer, error in rag_service.query_many(prompts):
+                line = {"index": index}
+                if error is None:
+                    log_id = new_log_id()
+                    entries.append((log_id, prompts[index], answer))
+                    line.update(response=answer, log_id=log_id)
+                else:
+                    line["error"] = error
+                yield json.dumps(line) + "\n"
+                if len(entries) >= config.AUDIT_BATCH_SIZE or time.monotonic() - last_flush >= config.AUDIT_FLUSH_INTERVAL:
+                    log_queries(entries, trace_id=trace_id)
+                    entries = []
+                    last_flush = time.monotonic()
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            log_queries(entries, trace_id=trace_id)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/feedback", methods=["POST"])
 def feedback_endpoint():
     data = request.get_json()
@@ -51,21 +284,37 @@ def feedback_endpoint():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "message": "Application is up and running."})
+    state = startup_state["state"]
+    if state == "ready":
+        return jsonify({"status": "ok", "ready": True, "message": "Application is up and running."})
+    body = {"status": state, "ready": False, "message": "Application is loading the model and index."}
+    if startup_state["error"]:
+        body["message"] = f"Initialization failed: {startup_state['error']}"
+    return jsonify(body), 503
+
+@app.route('/collections', methods=['GET'])
+def collections_endpoint():
+    """Lists the collections on disk and the ones currently loaded."""
+    return jsonify({"available": registry.available(), **registry.stats()})
+
+@app.route('/health/audit', methods=['GET'])
+def health_audit():
+    return jsonify({"status": "ok", "metrics": get_audit_metrics()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 @app.route('/health/openai', methods=['GET'])
 def health_openai():
-    try:
-        client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
-        client.models.list()
-        return jsonify({"status": "ok", "message": "OpenAI API is accessible."})
-    except openai.AuthenticationError:
-        return jsonify({"status": "error", "details": "OpenAI API authentication failed. Check your API key."}), 500
-    except Exception as e:
-        return jsonify({"status": "error", "details": str(e)}), 500
+    # Probes the API at most once per OPENAI_HEALTH_TTL_SECONDS
+    result = check_openai_health()
+    return jsonify(result), 200 if result["status"] == "ok" else 500
 
 if __name__ == '__main__':
     os.makedirs(config.LOG_DIR, exist_ok=True)
     os.makedirs(config.STORAGE_DIR, exist_ok=True)
     
-    app.run(debug=True)
+    # The reloader would import this module (and build the index) twice
+    app.run(debug=True, use_reloader=False)
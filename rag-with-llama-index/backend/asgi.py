@@ -0,0 +1,107 @@
+# Async serving mode for the RAG backend.
+#
+# Run a single worker per process, from the project root:
+#     uvicorn asgi:app --app-dir backend --workers 1
+#
+# /chat is an async view that awaits retrieval and the LLM call, so one
+# process serves many requests concurrently while sharing the per-collection
+# RAGService registry built by `api`. Concurrency towards OpenAI is capped by
+# the shared HTTP transport (openai_client, OPENAI_MAX_CONCURRENCY), which
+# holds a slot per request in flight. Every other route is served by the Flask app.
+
+import time
+import asyncio
+import config
+import metrics
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import api
+from audit_logger import log_query
+from timings import track
+
+
+def _finish(response, started: float, endpoint: str, trace_id):
+    """Records request latency and attaches the trace ID header."""
+    metrics.HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=response.status_code)
+    if trace_id:
+        response.headers[config.TRACE_ID_HEADER] = trace_id
+    return response
+
+
+async def chat_endpoint(request: Request):
+    started = time.perf_counter()
+    trace_id = api.resolve_trace_id(request.headers)
+    data = await request.json()
+    # Loading a cold collection blocks, keep it off the event loop
+    rag_service, error, status = await asyncio.to_thread(api.lookup_service, data.get('collection'))
+    if rag_service is None:
+        return _finish(JSONResponse(error, status_code=status), started, "/chat", trace_id)
+    prompt = data['prompt']
+    with track() as timings:
+        response_text = await rag_service.aquery(prompt)
+        log_id = log_query(prompt, response_text, trace_id=trace_id)
+
+    return _finish(JSONResponse({
+        "response": response_text,
+        "collection": rag_service.collection,
+        "log_id": log_id,
+        "trace_id": trace_id,
+        "timings_ms": timings
+    }), started, "/chat", trace_id)
+
+
+def _next_timed(tokens, default, timings: dict):
+    """next() on the token generator, recording its stages into `timings`."""
+    with track() as step:
+        token = next(tokens, default)
+    for name, elapsed in step.items():
+        timings[name] = timings.get(name, 0.0) + elapsed
+    return token
+
+
+async def chat_stream_endpoint(request: Request):
+    started = time.perf_counter()
+    trace_id = api.resolve_trace_id(request.headers)
+    data = await request.json()
+    rag_service, error, status = await asyncio.to_thread(api.lookup_service, data.get('collection'))
+    if rag_service is None:
+        return _finish(JSONResponse(error, status_code=status), started, "/chat/stream", trace_id)
+    prompt = data['prompt']
+
+    async def generate():
+        parts = []
+        timings = {}
+        # The streaming engine yields from a blocking generator; pull each
+        # token in a worker thread so the event loop stays free
+        tokens = rag_service.stream_query(prompt)
+        sentinel = object()
+        try:
+            while True:
+                token = await asyncio.to_thread(_next_timed, tokens, sentinel, timings)
+                if token is sentinel:
+                    break
+                parts.append(token)
+                yield api.format_sse("token", {"token": token})
+        except Exception as e:
+            yield api.format_sse("error", {"details": str(e)})
+            return
+        log_id = log_query(prompt, "".join(parts), trace_id=trace_id)
+        yield api.format_sse("done", {"log_id": log_id, "trace_id": trace_id, "timings_ms": timings})
+
+    # Latency up to the start of the stream, as for the Flask route
+    return _finish(StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    ), started, "/chat/stream", trace_id)
+
+
+app = Starlette(routes=[
+    Route('/chat', chat_endpoint, methods=['POST']),
+    Route('/chat/stream', chat_stream_endpoint, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(api.app)),
+])
@@ -1,70 +1,406 @@
 import os
+import csv
+import json
+import time
 import uuid
-import pandas as pd
+import queue
+import atexit
+import sqlite3
+import threading
 from datetime import datetime
 import config
+from metrics import AUDIT_FLUSH_SECONDS
+from timings import stage
 
-# --- CSV-based Logging Implementation ---
-
-def _get_log_df():
-    """Reads the audit log CSV into a pandas DataFrame or creates a new one."""
-    if os.path.exists(config.AUDIT_LOG_FILE):
-        return pd.read_csv(config.AUDIT_LOG_FILE)
-    else:
-        # Create the directory if it doesn't exist
-        os.makedirs(os.path.dirname(config.AUDIT_LOG_FILE), exist_ok=True)
-        # Define columns for the new DataFrame
-        return pd.DataFrame(columns=["id", "timestamp", "prompt", "response", "feedback"])
- 
-def log_query(prompt: str, response: str) -> str:
+# --- SQLite-based Logging Implementation ---
+# The audit log lives in a single SQLite table in WAL mode. New queries are
+# plain INSERTs (append-only) and feedback updates go through the primary key
+# on `id`, so neither operation depends on the size of the log history.
+
+_COLUMNS = ["id", "timestamp", "prompt", "response", "feedback", "trace_id"]
+_INSERT_SQL = (
+    "INSERT OR IGNORE INTO audit_log (id, timestamp, prompt, response, feedback, trace_id) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_FEEDBACK_SQL = "UPDATE audit_log SET feedback = ? WHERE id = ?"
+
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def _migrate_csv(conn: sqlite3.Connection):
+    """Imports a legacy audit_log.csv into the SQLite store (runs once)."""
+    if not os.path.exists(config.AUDIT_LOG_FILE):
+        return
+    with open(config.AUDIT_LOG_FILE, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        rows = [tuple(row.get(col) or "" for col in _COLUMNS[:-1]) + (row.get("trace_id") or None,)
+                for row in reader]
+    with conn:
+        conn.executemany(_INSERT_SQL, rows)
+    # Keep the original file around, but make sure it is not imported twice
+    os.replace(config.AUDIT_LOG_FILE, config.AUDIT_LOG_FILE + ".migrated")
+    print(f"Migrated {len(rows)} audit log entries from {config.AUDIT_LOG_FILE}.")
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Opens (once per process) the audit log database and creates the schema."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(config.AUDIT_DB_FILE), exist_ok=True)
+        conn = sqlite3.connect(config.AUDIT_DB_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS audit_log (
+                id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                prompt TEXT,
+                response TEXT,
+                feedback TEXT NOT NULL DEFAULT 'N/A',
+                trace_id TEXT
+            )
+            """
+        )
+        # Databases created before trace ids were recorded lack the column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(audit_log)")}
+        if "trace_id" not in columns:
+            conn.execute("ALTER TABLE audit_log ADD COLUMN trace_id TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_trace_id ON audit_log (trace_id)")
+        conn.commit()
+        _migrate_csv(conn)
+        _conn = conn
+    return _conn
+
+
+# --- Background Writer ---
+# Requests only enqueue their audit records; a single writer thread
+# group-commits them in batches so /chat never waits on the disk.
+# Feedback on an entry that is not written yet travels with its insert: it
+# is applied in the transaction that inserts the entry, or spilled right
+# after an insert that was spilled, so the UPDATE never runs before the row
+# exists.
+
+class _AuditWriter:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=config.AUDIT_QUEUE_SIZE)
+        self._pending = set()  # ids enqueued but not committed yet
+        self._spilled = set()  # pending ids whose insert is in the spill file
+        self._feedback = {}  # pending (queued) id -> feedback to apply with its insert
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.shutdown)
+
+    @staticmethod
+    def _ids(log_id) -> tuple:
+        """Log ids of a queued item ("insert_many" items carry a tuple of ids)."""
+        if log_id is None:
+            return ()
+        return log_id if isinstance(log_id, tuple) else (log_id,)
+
+    def defer_feedback(self, log_id: str, feedback: str) -> bool:
+        """
+        Attaches feedback to an entry that is not written yet.
+
+        Returns:
+            bool: False if the entry is not pending (update the table directly).
+        """
+        with self._lock:
+            if log_id not in self._pending:
+                return False
+            if log_id not in self._spilled:
+                self._feedback[log_id] = feedback
+                return True
+        # Appended after the insert, so the replay applies it in order
+        self._spill(("feedback", (feedback, log_id), None))
+        return True
+
+    def submit(self, op: str, params: tuple, log_id: str = None):
+        """Queues an operation, applying the configured backpressure policy when full."""
+        if self._stopped:
+            self._write_batch([(op, params, log_id)])
+            return
+        self._ensure_started()
+        with self._lock:
+            self._pending.update(self._ids(log_id))
+        item = (op, params, log_id)
+        policy = config.AUDIT_BACKPRESSURE
+        try:
+            if policy == "block":
+                self._queue.put(item)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            if policy == "spill":
+                self._spill(item)
+                return
+            with self._lock:
+                self._metrics["dropped"] += len(params) if op == "insert_many" else 1
+                self._pending.difference_update(self._ids(log_id))
+            return
+        with self._lock:
+            self._metrics["enqueued"] += 1
+            depth = self._queue.qsize()
+            if depth > self._metrics["max_queue_depth"]:
+                self._metrics["max_queue_depth"] = depth
+
+    def _spill(self, item):
+        op, params, log_id = item
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(config.AUDIT_SPILL_FILE), exist_ok=True)
+            with open(config.AUDIT_SPILL_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"op": op, "params": list(params), "log_id": log_id}) + "\n")
+            with self._lock:
+                self._metrics["spilled"] += len(params) if op == "insert_many" else 1
+                ids = self._ids(log_id)
+                self._spilled.update(ids)
+                # Feedback attached while the insert was queued follows it to the file
+                feedback = [(self._feedback.pop(i), i) for i in ids if i in self._feedback]
+            if feedback:
+                with open(config.AUDIT_SPILL_FILE, "a", encoding="utf-8") as f:
+                    for params in feedback:
+                        f.write(json.dumps({"op": "feedback", "params": list(params), "log_id": None}) + "\n")
+
+    def _replay_spill(self):
+        """Writes back records that were spilled to disk while the queue was full."""
+        if not os.path.exists(config.AUDIT_SPILL_FILE):
+            return
+        with self._spill_lock:
+            replay_path = config.AUDIT_SPILL_FILE + ".replay"
+            os.replace(config.AUDIT_SPILL_FILE, replay_path)
+        with open(replay_path, "r", encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        batch = []
+        for it in items:
+            if it["op"] == "insert_many":
+                batch.append((it["op"], tuple(tuple(row) for row in it["params"]), tuple(it["log_id"])))
+                continue
+            params = tuple(it["params"])
+            if it["op"] == "insert" and len(params) == len(_COLUMNS) - 1:
+                params += (None,)  # Spilled before trace ids were recorded
+            batch.append((it["op"], params, it["log_id"]))
+        self._write_batch(batch)
+        os.remove(replay_path)
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        ids = [i for _, _, log_id in batch for i in self._ids(log_id)]
+        with _conn_lock:
+            conn = _get_connection()
+            with conn:
+                for op, params, _ in batch:
+                    if op == "insert_many":
+                        conn.executemany(_INSERT_SQL, params)
+                    else:
+                        conn.execute(_INSERT_SQL if op == "insert" else _FEEDBACK_SQL, params)
+                # Once no longer pending, feedback goes straight to the table,
+                # where it waits for this transaction on _conn_lock
+                with self._lock:
+                    feedback = [(self._feedback.pop(i), i) for i in ids if i in self._feedback]
+                    self._pending.difference_update(ids)
+                    self._spilled.difference_update(ids)
+                if feedback:
+                    conn.executemany(_FEEDBACK_SQL, feedback)
+        elapsed = time.perf_counter() - started
+        AUDIT_FLUSH_SECONDS.observe(elapsed)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            m = self._metrics
+            m["written"] += sum(len(params) if op == "insert_many" else 1 for op, params, _ in batch) + len(feedback)
+            m["batches"] += 1
+            m["last_flush_ms"] = elapsed_ms
+            m["max_flush_ms"] = max(m["max_flush_ms"], elapsed_ms)
+            m["total_flush_ms"] += elapsed_ms
+
+    def _run(self):
+        self._replay_spill()
+        while True:
+            try:
+                first = self._queue.get(timeout=config.AUDIT_FLUSH_INTERVAL)
+            except queue.Empty:
+                self._replay_spill()
+                continue
+            if first is None:
+                self._queue.task_done()
+                break
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + config.AUDIT_FLUSH_INTERVAL
+            while len(batch) < config.AUDIT_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Error writing audit log batch: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                break
+        self._replay_spill()
+
+    def flush(self):
+        """Blocks until every queued record has been committed."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        self._replay_spill()
+
+    def shutdown(self):
+        """Flushes outstanding records and stops the writer thread."""
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._replay_spill()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._metrics)
+        m["queue_depth"] = self._queue.qsize()
+        m["avg_flush_ms"] = m["total_flush_ms"] / m["batches"] if m["batches"] else 0.0
+        del m["total_flush_ms"]
+        return m
+
+
+_writer = _AuditWriter()
+
+
+def new_log_id() -> str:
+    """Returns a fresh audit log ID (for entries queued later with log_queries)."""
+    return str(uuid.uuid4())
+
+def log_query(prompt: str, response: str, trace_id: str = None) -> str:
     """
-    Logs a new prompt and its response to the CSV file.
+    Queues a new prompt and its response for the audit log.
+
+    The record is written by the background writer; the returned ID can be
+    used with log_feedback right away.
 
     Args:
         prompt (str): The user's query.
         response (str): The model's answer.
+        trace_id (str): Optional trace ID of the request, stored so slow
+            requests can be matched with their audit entry.
 
     Returns:
         str: A unique ID for this log entry.
     """
-    df = _get_log_df()
-    log_id = str(uuid.uuid4())
-    new_log = pd.DataFrame([{
-        "id": log_id,
-        "timestamp": datetime.now().isoformat(),
-        "prompt": prompt,
-        "response": response,
-        "feedback": "N/A" # Default feedback state
-    }])
-
-    # Append the new log and save to CSV
-    df = pd.concat([df, new_log], ignore_index=True)
-    df.to_csv(config.AUDIT_LOG_FILE, index=False)
-    
+    log_id = new_log_id()
+    # Default feedback state is "N/A"
+    with stage("audit_log"):
+        _writer.submit("insert", (log_id, datetime.now().isoformat(), prompt, response, "N/A", trace_id), log_id)
+
     # log_to_firebase(prompt, response) # Example of calling the Firebase function
     return log_id
 
+def log_queries(entries, trace_id: str = None):
+    """
+    Queues many audit entries as one group, committed with a single
+    executemany by the background writer.
+
+    IDs come from new_log_id() so callers can hand them out (e.g. in a
+    streamed batch response) before the group is queued.
+
+    Args:
+        entries (list): (log_id, prompt, response) tuples.
+        trace_id (str): Optional trace ID shared by all entries (e.g. of a batch request).
+    """
+    timestamp = datetime.now().isoformat()
+    rows = tuple((log_id, timestamp, prompt, response, "N/A", trace_id) for log_id, prompt, response in entries)
+    if rows:
+        with stage("audit_log"):
+            _writer.submit("insert_many", rows, tuple(row[0] for row in rows))
+
 def log_feedback(log_id: str, feedback: str) -> bool:
     """
-    Updates the feedback for a specific log entry in the CSV file.
+    Updates the feedback for a specific log entry.
 
     Args:
         log_id (str): The unique ID of the log entry to update.
         feedback (str): The feedback provided by the user ('like' or 'dislike').
 
     Returns:
-        bool: True if the update was successful, False otherwise.
+        bool: True if the update was applied, or attached to the entry's
+        queued or spilled insert; False otherwise.
     """
     if feedback not in ["like", "dislike"]:
         return False
-        
-    df = _get_log_df()
-    
-    # Find the row with the matching ID
-    if log_id in df['id'].values:
-        df.loc[df['id'] == log_id, 'feedback'] = feedback
-        df.to_csv(config.AUDIT_LOG_FILE, index=False)
-        # update_feedback_in_firebase(log_id, feedback) # Example call
+
+    if _writer.defer_feedback(log_id, feedback):
+        # The entry is not written yet; the update is applied with its insert
         return True
-    
-    return False
\ No newline at end of file
+
+    with _conn_lock:
+        conn = _get_connection()
+        with conn:
+            cursor = conn.execute(_FEEDBACK_SQL, (feedback, log_id))
+
+    # update_feedback_in_firebase(log_id, feedback) # Example call
+    return cursor.rowcount > 0
+
+
+def flush():
+    """Blocks until all queued audit records are written to disk."""
+    _writer.flush()
+
+
+def get_metrics() -> dict:
+    """Returns audit writer metrics (queue depth, drops, spills, flush latency)."""
+    return _writer.metrics()
+
+
+def export_csv(path: str = None) -> str:
+    """
+    Exports the audit log to CSV (same columns as the legacy audit_log.csv).
+
+    Args:
+        path (str): Destination file. Defaults to config.AUDIT_LOG_FILE.
+
+    Returns:
+        str: The path that was written.
+    """
+    path = path or config.AUDIT_LOG_FILE
+    flush()
+    with _conn_lock:
+        rows = _get_connection().execute(
+            "SELECT id, timestamp, prompt, response, feedback, trace_id FROM audit_log ORDER BY timestamp"
+        ).fetchall()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(_COLUMNS)
+        writer.writerows(rows)
+    return path
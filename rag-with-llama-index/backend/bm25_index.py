@@ -0,0 +1,456 @@
+import os
+import re
+import json
+import math
+import uuid
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Segment table (JSON): parameters, chunk count and the segment files in order
+SEGMENTS_FNAME = "bm25_segments.json"
+# Posting lists and chunks (ids, lengths) of a range of ordinals
+SEGMENT_FNAME = "bm25-{}.npz"
+_SEGMENT_RE = re.compile(r"^bm25-[0-9a-f]+\.npz$")
+# Ordinals of removed chunks (uint64)
+DELETED_FNAME = "bm25_deleted.bin"
+# Single compacted file written before segments (still loaded)
+BM25_FNAME = "bm25_index.npz"
+
+# Keeps identifiers such as "AB-1234", "v2.1" or "part_no_7" as single tokens
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+# In-memory segments kept before the newest ones are merged
+_MAX_SEGMENTS = 8
+# Renumber the chunks on persist once this share of them is removed
+_COMPACT_RATIO = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    # Also index the parts of compound identifiers so "1234" finds "AB-1234"
+    parts = [p for t in tokens if not t.isalnum() for p in re.split(r"[-_./]", t) if p]
+    return tokens + parts
+
+
+class _Segment:
+    """
+    Immutable posting lists of the chunks with ordinals start..end-1. Every
+    list is delta-encoded into one shared uint32 array (with uint16 term
+    frequencies and an offset table), the same layout as on disk. `name`
+    is the file the segment was persisted to, if any.
+    """
+
+    __slots__ = ("terms", "offsets", "deltas", "tfs", "start", "end", "name")
+
+    def __init__(self, terms: Dict[str, int], offsets: np.ndarray, deltas: np.ndarray, tfs: np.ndarray,
+                 start: int, end: int, name: Optional[str] = None):
+        self.terms = terms
+        self.offsets = offsets
+        self.deltas = deltas
+        self.tfs = tfs
+        self.start = start
+        self.end = end
+        self.name = name
+
+    @classmethod
+    def build(cls, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], start: int, end: int) -> "_Segment":
+        """postings: term -> (increasing ordinals, term frequencies)."""
+        terms, offsets, deltas, tfs = {}, [0], [], []
+        for term in sorted(postings):
+            ords, term_tfs = postings[term]
+            if not len(ords):
+                continue
+            terms[term] = len(terms)
+            deltas.append(np.diff(ords, prepend=0).astype(np.uint32))
+            tfs.append(np.asarray(term_tfs, dtype=np.uint16))
+            offsets.append(offsets[-1] + len(ords))
+        return cls(
+            terms,
+            np.asarray(offsets, dtype=np.int64),
+            np.concatenate(deltas) if deltas else np.zeros(0, dtype=np.uint32),
+            np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.uint16),
+            start,
+            end,
+        )
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.deltas.nbytes + self.tfs.nbytes
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        slot = self.terms.get(term)
+        if slot is None:
+            return None
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        return np.cumsum(self.deltas[start:end], dtype=np.int64), self.tfs[start:end]
+
+
+def _postings(segments: Sequence[_Segment], term: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Ordinals (increasing: later segments hold later chunks) and tfs of a term."""
+    found = [p for p in (segment.postings(term) for segment in segments) if p is not None]
+    if not found:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+    if len(found) == 1:
+        return found[0]
+    return np.concatenate([ords for ords, _ in found]), np.concatenate([tfs for _, tfs in found])
+
+
+def _merge(segments: Sequence[_Segment], alive: np.ndarray, remap: Optional[np.ndarray] = None) -> _Segment:
+    """
+    One segment with the postings of live chunks of adjacent segments, or of
+    all segments renumbered through `remap`.
+    """
+    merged = {}
+    for term in sorted(set().union(*(segment.terms for segment in segments))):
+        ords, tfs = _postings(segments, term)
+        keep = alive[ords]
+        ords = ords[keep]
+        merged[term] = (remap[ords] if remap is not None else ords, tfs[keep])
+    if remap is not None:
+        return _Segment.build(merged, 0, int(alive.sum()))
+    return _Segment.build(merged, segments[0].start, segments[-1].end)
+
+
+class _Snapshot:
+    """What searches read; replaced as a whole, never modified."""
+
+    __slots__ = ("node_ids", "doc_len", "alive", "total_len", "alive_count", "segments")
+
+    def __init__(self, node_ids: List[str], doc_len: np.ndarray, alive: np.ndarray, total_len: int,
+                 alive_count: int, segments: Tuple[_Segment, ...]):
+        # Shared with the index, which only appends past this snapshot's chunks
+        self.node_ids = node_ids
+        self.doc_len = doc_len
+        self.alive = alive
+        self.total_len = total_len
+        self.alive_count = alive_count
+        self.segments = segments
+
+
+class BM25Index:
+    """
+    Persisted BM25 inverted index over the chunks in the docstore.
+
+    Every chunk gets an ordinal when added; posting lists hold ordinals in
+    increasing order, so new chunks are simply appended. The lists are kept
+    in segments of consecutive ordinals; in each, every list is
+    delta-encoded into one shared uint32 array (with uint16 term
+    frequencies and an offset table), so loading is one np.load per
+    segment and lists are only decoded for the query terms.
+
+    Each segment is persisted to its own file together with the ids and
+    lengths of its chunks, so a persist only writes the segments created
+    (or merged) since the last one, plus the ordinals of removed chunks.
+    Once a quarter of the chunks is removed, a persist renumbers the live
+    ones into a single segment.
+
+    Searches read an immutable snapshot (posting segments plus per-chunk
+    arrays), so they can run while another thread adds, removes or persists.
+    Changes made inside a `batch()` block are published together when it
+    ends, as one new segment.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.node_ids: List[Optional[str]] = []
+        self.ref_doc_ids: List[Optional[str]] = []
+        self.doc_len = array("I")
+        self._alive = array("b")
+        self._total_len = 0
+        self._alive_count = 0
+        # Published postings, oldest chunks first; they cover ordinals 0.._published-1
+        self._segments: List[_Segment] = []
+        self._published = 0
+        # Postings added since the last publish: term -> (ordinals, tfs)
+        self._pending: Dict[str, Tuple[array, array]] = {}
+        self._by_ref: Dict[str, List[int]] = {}
+        self._batch_depth = 0
+        self._snapshot = _Snapshot([], np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool), 0, 0, ())
+        # Changed since the last load/persist
+        self._dirty = False
+        # Removed chunks recorded by the last load/persist
+        self._dead_on_disk = 0
+
+    def __len__(self) -> int:
+        return self._snapshot.alive_count
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the posting lists and per-chunk arrays."""
+        total = sum(segment.nbytes() for segment in self._snapshot.segments)
+        total += self.doc_len.itemsize * len(self.doc_len) + len(self._alive)
+        total += self._snapshot.doc_len.nbytes + self._snapshot.alive.nbytes
+        return total
+
+    # ------------------------- Updates -------------------------
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups changes: searches see none of them until the outermost block
+        ends. Changes outside a block are published right away.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._publish()
+
+    def _publish(self):
+        n = len(self.node_ids)
+        if n > self._published:
+            pending = {term: (np.frombuffer(ords, dtype=np.uint32).astype(np.int64), np.array(tfs, dtype=np.uint16))
+                       for term, (ords, tfs) in self._pending.items()}
+            self._segments.append(_Segment.build(pending, self._published, n))
+            self._pending = {}
+            self._published = n
+        alive = np.frombuffer(self._alive, dtype=np.int8)[:n].astype(bool)
+        while len(self._segments) > _MAX_SEGMENTS:
+            # Fold the two smallest neighbours together, dropping removed chunks
+            i = min(range(len(self._segments) - 1),
+                    key=lambda j: len(self._segments[j]) + len(self._segments[j + 1]))
+            self._segments[i:i + 2] = [_merge(self._segments[i:i + 2], alive)]
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)[:n].astype(np.float32)
+        self._snapshot = _Snapshot(self.node_ids, doc_len, alive, self._total_len, self._alive_count,
+                                   tuple(self._segments))
+
+    def add(self, node_id: str, ref_doc_id: Optional[str], text: str):
+        with self.batch():
+            self._add(node_id, ref_doc_id, Counter(tokenize(text)))
+
+    def _add(self, node_id: str, ref_doc_id: Optional[str], counts: Counter):
+        ordinal = len(self.node_ids)
+        length = sum(counts.values())
+        self.node_ids.append(node_id)
+        self.ref_doc_ids.append(ref_doc_id)
+        self.doc_len.append(length)
+        self._alive.append(1)
+        self._total_len += length
+        self._alive_count += 1
+        self._by_ref.setdefault(ref_doc_id, []).append(ordinal)
+        self._dirty = True
+        for term, tf in counts.items():
+            ords, tfs = self._pending.setdefault(term, (array("I"), array("H")))
+            ords.append(ordinal)
+            tfs.append(min(tf, 65535))
+
+    @staticmethod
+    def term_counts(nodes: Iterable) -> List[Tuple[str, Optional[str], Counter]]:
+        """Tokenizes nodes ahead of add_nodes, e.g. outside a lock."""
+        return [(node.node_id, node.ref_doc_id, Counter(tokenize(node.get_content()))) for node in nodes]
+
+    def add_nodes(self, nodes: Iterable = (), term_counts: Optional[List[Tuple[str, Optional[str], Counter]]] = None):
+        """Adds nodes, or the output of term_counts() for them."""
+        with self.batch():
+            for node_id, ref_doc_id, counts in term_counts if term_counts is not None else self.term_counts(nodes):
+                self._add(node_id, ref_doc_id, counts)
+
+    def remove_document(self, ref_doc_id: str):
+        with self.batch():
+            for ordinal in self._by_ref.pop(ref_doc_id, []):
+                if self._alive[ordinal]:
+                    self._alive[ordinal] = 0
+                    self._total_len -= self.doc_len[ordinal]
+                    self._alive_count -= 1
+                    self._dirty = True
+
+    # ------------------------- Search -------------------------
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Returns up to top_k (node_id, score) pairs, best first."""
+        snapshot = self._snapshot
+        if not snapshot.alive_count:
+            return []
+        n = len(snapshot.alive)
+        alive = snapshot.alive
+        avg_len = snapshot.total_len / snapshot.alive_count or 1.0
+        norm = self.k1 * (1 - self.b + self.b * snapshot.doc_len / avg_len)
+
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            ords, tfs = _postings(snapshot.segments, term)
+            if not len(ords):
+                continue
+            df = int(alive[ords].sum())
+            if not df:
+                continue
+            idf = math.log(1 + (snapshot.alive_count - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            scores[ords] += idf * tf * (self.k1 + 1) / (tf + norm[ords])
+
+        scores[~alive] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(snapshot.node_ids[i], float(scores[i])) for i in hits]
+
+    # ------------------------- Persistence -------------------------
+
+    def _on_disk(self, persist_dir: str) -> Optional[dict]:
+        """The segment table in the directory if it is the one this index last loaded or wrote."""
+        try:
+            with open(os.path.join(persist_dir, SEGMENTS_FNAME), "r", encoding="utf-8") as f:
+                table = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if table.get("segments") != [segment.name for segment in self._segments] \
+                or table.get("deleted") != self._dead_on_disk:
+            return None
+        if not all(os.path.exists(os.path.join(persist_dir, name)) for name in table["segments"]):
+            return None
+        return table
+
+    def persist(self, persist_dir: str):
+        """
+        Writes the segments not yet in the directory, the removed ordinals and
+        the segment table; segment files no longer used are deleted. Does
+        nothing if the index has not changed since it was loaded or saved.
+        """
+        on_disk = self._on_disk(persist_dir) is not None
+        if not self._dirty and on_disk:
+            return
+        self._publish()
+        n = len(self.node_ids)
+        dead = n - self._alive_count
+        if dead > _COMPACT_RATIO * max(n, 1):
+            self._compact()
+            n, dead = len(self.node_ids), 0
+        os.makedirs(persist_dir, exist_ok=True)
+
+        for segment in self._segments:
+            if segment.name is None or not os.path.exists(os.path.join(persist_dir, segment.name)):
+                self._write_segment(persist_dir, segment)
+        deleted_path = os.path.join(persist_dir, DELETED_FNAME)
+        if not on_disk or dead != self._dead_on_disk:
+            if dead:
+                removed = np.flatnonzero(np.frombuffer(self._alive, dtype=np.int8)[:n] == 0).astype("<u8")
+                removed.tofile(deleted_path + ".tmp")
+                os.replace(deleted_path + ".tmp", deleted_path)
+            elif os.path.exists(deleted_path):
+                os.remove(deleted_path)
+            self._dead_on_disk = dead
+
+        names = [segment.name for segment in self._segments]
+        table = {"version": 2, "k1": self.k1, "b": self.b, "chunks": n, "deleted": dead, "segments": names}
+        table_path = os.path.join(persist_dir, SEGMENTS_FNAME)
+        with open(table_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        os.replace(table_path + ".tmp", table_path)
+        # Drop merged segments and the single file of older versions (linked from the previous generation)
+        for name in os.listdir(persist_dir):
+            if (_SEGMENT_RE.match(name) and name not in names) or name == BM25_FNAME:
+                os.remove(os.path.join(persist_dir, name))
+        self._dirty = False
+
+    def _write_segment(self, persist_dir: str, segment: _Segment):
+        name = SEGMENT_FNAME.format(uuid.uuid4().hex[:16])
+        path = os.path.join(persist_dir, name)
+        meta = {
+            "start": segment.start,
+            "terms": sorted(segment.terms, key=segment.terms.get),
+            "node_ids": self.node_ids[segment.start:segment.end],
+            "ref_doc_ids": self.ref_doc_ids[segment.start:segment.end],
+        }
+        doc_len = np.array(self.doc_len[segment.start:segment.end], dtype=np.uint32)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+                offsets=segment.offsets,
+                deltas=segment.deltas,
+                tfs=segment.tfs,
+                doc_len=doc_len,
+            )
+        os.replace(path + ".tmp", path)
+        segment.name = name
+
+    def _compact(self):
+        """Renumbers the live chunks into one segment."""
+        n = len(self.node_ids)
+        alive = np.frombuffer(self._alive, dtype=np.int8)[:n].astype(bool)
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[alive] = np.arange(int(alive.sum()))
+        segment = _merge(self._segments, alive, remap)
+        keep_idx = np.flatnonzero(alive)
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)[:n][alive]
+        self._reset([self.node_ids[i] for i in keep_idx], [self.ref_doc_ids[i] for i in keep_idx],
+                    doc_len, [segment] if segment.end > segment.start else [], ())
+
+    def _reset(self, node_ids: List[str], ref_doc_ids: List[str], doc_len: np.ndarray,
+               segments: List[_Segment], removed: Sequence[int]):
+        # New lists: published snapshots keep the old numbering
+        self.node_ids = list(node_ids)
+        self.ref_doc_ids = list(ref_doc_ids)
+        self._segments = segments
+        self._published = len(self.node_ids)
+        self.doc_len = array("I", doc_len.astype(np.uint32).tobytes())
+        self._alive = array("b", [1]) * len(self.node_ids)
+        self._total_len = int(doc_len.sum())
+        for ordinal in removed:
+            self._alive[ordinal] = 0
+            self._total_len -= self.doc_len[ordinal]
+        self._alive_count = len(self.node_ids) - len(removed)
+        self._pending = {}
+        self._by_ref = {}
+        for ordinal, ref_doc_id in enumerate(self.ref_doc_ids):
+            if self._alive[ordinal]:
+                self._by_ref.setdefault(ref_doc_id, []).append(ordinal)
+        self._publish()
+
+    @staticmethod
+    def _read_segment(path: str, start: int):
+        """Returns (meta, segment) of a segment file (or of the single file of older versions)."""
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta.get("start", 0) != start or len(meta["node_ids"]) != len(data["doc_len"]):
+                raise ValueError(f"{path} does not match the BM25 segment table")
+            terms = {term: slot for slot, term in enumerate(meta["terms"])}
+            end = start + len(meta["node_ids"])
+            segment = _Segment(terms, data["offsets"], data["deltas"], data["tfs"], start, end)
+            meta["doc_len"] = data["doc_len"]
+        return meta, segment
+
+    @classmethod
+    def load(cls, persist_dir: str) -> Optional["BM25Index"]:
+        """Loads the index, or returns None if none was persisted."""
+        table_path = os.path.join(persist_dir, SEGMENTS_FNAME)
+        legacy_path = os.path.join(persist_dir, BM25_FNAME)
+        if os.path.exists(table_path):
+            with open(table_path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            names = table["segments"]
+        elif os.path.exists(legacy_path):
+            table, names = None, [BM25_FNAME]
+        else:
+            return None
+        index = cls()
+        node_ids, ref_doc_ids, doc_lens, segments = [], [], [], []
+        for name in names:
+            meta, segment = cls._read_segment(os.path.join(persist_dir, name), len(node_ids))
+            if table is not None:
+                segment.name = name
+            index.k1, index.b = meta.get("k1", index.k1), meta.get("b", index.b)
+            node_ids += meta["node_ids"]
+            ref_doc_ids += meta["ref_doc_ids"]
+            doc_lens.append(meta["doc_len"])
+            segments.append(segment)
+        removed = ()
+        if table is not None:
+            index.k1, index.b = table["k1"], table["b"]
+            deleted_path = os.path.join(persist_dir, DELETED_FNAME)
+            if os.path.exists(deleted_path):
+                removed = np.fromfile(deleted_path, dtype="<u8").tolist()
+            index._dead_on_disk = len(removed)
+        doc_len = np.concatenate(doc_lens) if doc_lens else np.zeros(0, dtype=np.uint32)
+        index._reset(node_ids, ref_doc_ids, doc_len, [s for s in segments if s.end > s.start], removed)
+        index._dirty = False
+        return index
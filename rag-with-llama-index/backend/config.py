@@ -11,21 +11,162 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 LLM_MODEL = "gpt-4o-mini"
 # Specifies the Hugging Face model for generating embeddings
 EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+# Maximum number of concurrent requests to OpenAI per process (sync and async clients combined)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+# Alternative API endpoint, e.g. a local mock server (python-scripts/mock_openai_server.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# Timeout (seconds) of a single OpenAI request
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+# Retries of a request answered with 429/5xx or failing to connect
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+# First retry waits up to this many seconds; the wait doubles with every retry
+OPENAI_BACKOFF_BASE_SECONDS = float(os.getenv("OPENAI_BACKOFF_BASE_SECONDS", "0.5"))
+# Upper bound (seconds) of a single backoff wait, including Retry-After
+OPENAI_BACKOFF_MAX_SECONDS = float(os.getenv("OPENAI_BACKOFF_MAX_SECONDS", "8"))
+# Size of the keep-alive connection pool to the API
+OPENAI_POOL_CONNECTIONS = int(os.getenv("OPENAI_POOL_CONNECTIONS", "20"))
+# Idle time (seconds) after which a pooled connection is closed
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "30"))
+# How long (seconds) the /health/openai result is reused before probing again
+OPENAI_HEALTH_TTL_SECONDS = float(os.getenv("OPENAI_HEALTH_TTL_SECONDS", "30"))
+# Timeout (seconds) of the /health/openai probe, which is never retried
+OPENAI_HEALTH_TIMEOUT_SECONDS = float(os.getenv("OPENAI_HEALTH_TIMEOUT_SECONDS", "5"))
+# Let identical prompts in flight at the same time share one answer
+COALESCE_QUERIES = os.getenv("COALESCE_QUERIES", "true").lower() == "true"
 
 # --- RAG Configuration ---
-# The size of text chunks for indexing
-CHUNK_SIZE = 512
-# The amount of overlap between adjacent chunks
-CHUNK_OVERLAP = 64
+# The size of text chunks for indexing, in tokens
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "512"))
+# The amount of overlap between adjacent chunks, in tokens
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+# On-disk precision of persisted embeddings: "float32" or "float16" (half the size)
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")
+# Retrieval scoring: "none" (exact) or "int8" (quantized scan + exact re-rank)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+# With int8 scoring, re-rank this many times top-k candidates exactly
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+# Number of chunks passed to the LLM per query
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "2"))
+# Fuse BM25 keyword results with vector results (reciprocal rank fusion)
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+# Candidates taken from each retriever before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+# Rank constant of reciprocal rank fusion
+RRF_K = 60
+# Pack the retrieved chunks into CONTEXT_TOKEN_BUDGET (re-ranked first when RERANK_MODEL is set)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+# Candidates retrieved for the cross-encoder to re-rank
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+# Maximum number of chunks sent to the LLM after packing (at most SIMILARITY_TOP_K by default)
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", str(SIMILARITY_TOP_K)))
+# Token budget for the retrieved context sent to the LLM
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Optional cross-encoder (e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2", needs
+# sentence-transformers); empty keeps the retrieval (or fusion) order
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+# Number of chunks embedded per call to the embedding model
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Worker processes that parse and split documents when (re)indexing files (1 = in-process)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Refreshes with fewer files than this are parsed in-process instead of in the pool
+INGEST_PARALLEL_MIN_FILES = int(os.getenv("INGEST_PARALLEL_MIN_FILES", "4"))
+
+# --- Batch Queries ---
+# Maximum number of prompts accepted by one /chat/batch request
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "5000"))
+# LLM calls of a batch running at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(OPENAI_MAX_CONCURRENCY)))
+# LLM calls per second started by batch queries, across all batches (0 disables the limit)
+BATCH_REQUESTS_PER_SECOND = float(os.getenv("BATCH_REQUESTS_PER_SECOND", "10"))
+
+# --- Startup ---
+# Load the embedding model and index in the background so the server can bind
+# its port immediately; /health reports readiness once loading has finished
+LAZY_INIT = os.getenv("LAZY_INIT", "true").lower() == "true"
+
+# --- Observability ---
+# Attach a trace ID to every request (taken from TRACE_ID_HEADER or generated),
+# return it to the client and store it with the audit log entry
+TRACE_IDS_ENABLED = os.getenv("TRACE_IDS_ENABLED", "true").lower() == "true"
+# Request/response header carrying the trace ID
+TRACE_ID_HEADER = os.getenv("TRACE_ID_HEADER", "X-Trace-Id")
+
+# --- Embedding Cache ---
+# Reuse embeddings of chunks whose text has not changed (keyed by model + text hash)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+# Maximum number of cached chunk embeddings (least recently used are evicted first)
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+# --- Sync ---
+# Threads used to hash new or modified files during a sync
+SYNC_HASH_WORKERS = int(os.getenv("SYNC_HASH_WORKERS", "8"))
+# Block size (bytes) used when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# --- Watch Mode ---
+# Keep the index in sync with DATA_DIR while the API is running
+WATCH_DATA_DIR = os.getenv("WATCH_DATA_DIR", "false").lower() == "true"
+# Quiet period (seconds) after the last change before a batch of changes is applied
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "2"))
+# Interval (seconds) at which applied changes are persisted to STORAGE_DIR
+WATCH_PERSIST_INTERVAL = float(os.getenv("WATCH_PERSIST_INTERVAL", "60"))
+# Interval (seconds) between directory scans when inotify (watchdog) is unavailable
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "5"))
+
+# --- Index Storage ---
+# Committed index generations kept on disk (the newest is served; older ones allow rolling back)
+STORAGE_KEEP_GENERATIONS = int(os.getenv("STORAGE_KEEP_GENERATIONS", "2"))
+# fsync new index files and the CURRENT pointer before a commit counts as durable
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "true").lower() == "true"
+
+# --- Response Cache ---
+# Enables the exact + semantic answer cache in front of the query engine
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+# Maximum number of cached answers (least recently used are evicted first)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# Time to live of a cached answer in seconds (0 disables expiry)
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+# Minimum cosine similarity for a semantic cache hit (1.0 disables the semantic tier)
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# --- Collections ---
+# Collection served when a request does not name one (uses DATA_DIR / STORAGE_DIR)
+DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "default")
+# Approximate memory (MB) the loaded collection indexes may use before the
+# least recently used ones are unloaded
+COLLECTION_MEMORY_BUDGET_MB = float(os.getenv("COLLECTION_MEMORY_BUDGET_MB", "4096"))
+# Maximum number of collections kept loaded at the same time
+MAX_LOADED_COLLECTIONS = int(os.getenv("MAX_LOADED_COLLECTIONS", "32"))
 
 # --- File Paths ---
 # Directory where source documents are stored
 DATA_DIR = "./backend/files/data"
 # Directory to persist the vector index
 STORAGE_DIR = "./backend/files/storage"
+# Directory holding one <name>/data and <name>/storage pair per additional collection
+COLLECTIONS_DIR = "./backend/files/collections"
 # Directory for log files
 LOG_DIR = "./backend/files/logs"
-# Path for the audit log CSV file
+# Directory for caches that can be rebuilt (kept out of STORAGE_DIR)
+CACHE_DIR = "./backend/files/cache"
+# Path for the chunk embedding cache database
+EMBED_CACHE_FILE = os.path.join(CACHE_DIR, "embedding_cache.db")
+# Path for the legacy audit log CSV file (imported into AUDIT_DB_FILE on first start)
 AUDIT_LOG_FILE = os.path.join(LOG_DIR, "audit_log.csv")
-# Path for the index state manifest (tracks file versions)
+# Path for the append-only audit log database (SQLite, WAL mode)
+AUDIT_DB_FILE = os.path.join(LOG_DIR, "audit_log.db")
+
+# --- Audit Writer ---
+# Maximum number of audit records waiting to be written
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+# Maximum number of records committed in one transaction
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+# Maximum time (seconds) a record waits before its batch is committed
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+# What to do when the queue is full: "block", "drop" or "spill"
+AUDIT_BACKPRESSURE = os.getenv("AUDIT_BACKPRESSURE", "block")
+# File that receives records when the queue is full and AUDIT_BACKPRESSURE is "spill"
+AUDIT_SPILL_FILE = os.path.join(LOG_DIR, "audit_spill.jsonl")
+# Path for the index state manifest (tracks file versions); committed inside
+# each storage generation, this path is only read for the legacy flat layout
 INDEX_MANIFEST_FILE = os.path.join(STORAGE_DIR, "index_manifest.json")
\ No newline at end of file
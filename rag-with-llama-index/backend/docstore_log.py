@@ -0,0 +1,129 @@
+import os
+import re
+import json
+from typing import List, Optional, Set, Tuple
+
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+
+# Rewrite the base file once the change logs reach this share of its size
+_COMPACT_RATIO = 0.5
+# ... or once there are this many logs
+_MAX_LOGS = 16
+
+
+def _log_re(persist_path: str):
+    stem = os.path.splitext(os.path.basename(persist_path))[0]
+    return re.compile(rf"^{re.escape(stem)}\.log-(\d{{6,}})\.jsonl$")
+
+
+def log_files(persist_path: str) -> List[str]:
+    """
+    Change logs of a base file (docstore.json -> docstore.log-000001.jsonl,
+    ...) in the order they are replayed.
+    """
+    directory = os.path.dirname(persist_path) or "."
+    pattern = _log_re(persist_path)
+    if not os.path.isdir(directory):
+        return []
+    found = [(int(m.group(1)), name) for name in os.listdir(directory) for m in [pattern.match(name)] if m]
+    return [os.path.join(directory, name) for _, name in sorted(found)]
+
+
+class LogKVStore(SimpleKVStore):
+    """
+    SimpleKVStore persisted as a base file plus change logs.
+
+    The base file has the format of SimpleKVStore (so docstore.json stays
+    readable by LlamaIndex and the docstore tools). A persist that finds the
+    files it last loaded or wrote only writes the keys changed since then,
+    as one JSON line per key ([collection, key, value or null]) in a new
+    log file. The base is rewritten, and the logs dropped, when the logs
+    grow past half its size, or when the directory holds other files (e.g.
+    a fresh storage directory). Files are written to a temp name and
+    renamed, so they can be hard-linked between storage generations.
+    """
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        # (collection, key) changed since the last load or persist
+        self._changed: Set[Tuple[str, str]] = set()
+        # Size of the base file and the logs last loaded or written
+        self._synced: Optional[Tuple[int, Tuple[str, ...]]] = None
+        self._log_bytes = 0
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        super().put(key, val, collection=collection)
+        self._changed.add((collection, key))
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        deleted = super().delete(key, collection=collection)
+        if deleted:
+            self._changed.add((collection, key))
+        return deleted
+
+    @staticmethod
+    def _files(persist_path: str) -> Optional[Tuple[int, Tuple[str, ...]]]:
+        if not os.path.isfile(persist_path):
+            return None
+        return os.path.getsize(persist_path), tuple(os.path.basename(p) for p in log_files(persist_path))
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """Appends a change log next to `persist_path`, or rewrites it (see class docstring)."""
+        directory = os.path.dirname(persist_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        synced = self._synced
+        if synced is None or self._files(persist_path) != synced or len(synced[1]) >= _MAX_LOGS \
+                or self._log_bytes > _COMPACT_RATIO * synced[0]:
+            self._write_base(persist_path)
+        elif self._changed:
+            self._write_log(persist_path)
+
+    def _write_base(self, persist_path: str):
+        with open(persist_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(self._collections_mappings))
+        os.replace(persist_path + ".tmp", persist_path)
+        # Folded into the base (these are links of an older generation, or stale)
+        for path in log_files(persist_path):
+            os.remove(path)
+        self._synced = (os.path.getsize(persist_path), ())
+        self._log_bytes = 0
+        self._changed = set()
+
+    def _write_log(self, persist_path: str):
+        base_size, logs = self._synced
+        number = int(_log_re(persist_path).match(logs[-1]).group(1)) + 1 if logs else 1
+        stem = os.path.splitext(os.path.basename(persist_path))[0]
+        name = f"{stem}.log-{number:06d}.jsonl"
+        path = os.path.join(os.path.dirname(persist_path) or ".", name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for collection, key in sorted(self._changed):
+                value = self._collections_mappings.get(collection, {}).get(key)
+                f.write(json.dumps([collection, key, value]) + "\n")
+        os.replace(path + ".tmp", path)
+        self._synced = (base_size, logs + (name,))
+        self._log_bytes += os.path.getsize(path)
+        self._changed = set()
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs=None) -> "LogKVStore":
+        """Loads the base file and replays its change logs."""
+        with open(persist_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        logs = log_files(persist_path)
+        log_bytes = 0
+        for path in logs:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    collection, key, value = json.loads(line)
+                    if value is None:
+                        data.get(collection, {}).pop(key, None)
+                    else:
+                        data.setdefault(collection, {})[key] = value
+            log_bytes += os.path.getsize(path)
+        store = cls(data)
+        store._synced = (os.path.getsize(persist_path), tuple(os.path.basename(p) for p in logs))
+        store._log_bytes = log_bytes
+        return store
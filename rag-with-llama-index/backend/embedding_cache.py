@@ -0,0 +1,105 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent chunk embedding cache keyed by (model name, SHA-256 of the text).
+
+    Vectors are stored as float32 blobs in SQLite. Every hit refreshes the
+    entry's `last_used` time, and once the table grows past `max_entries`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 500_000):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Returns the cached embedding for each text, or None where there is none."""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    (self.model_name, *batch),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                        [(now, self.model_name, k) for k in found],
+                    )
+            self.stats["hits"] += sum(1 for k in keys if k in found)
+            self.stats["misses"] += sum(1 for k in keys if k not in found)
+        return [
+            np.frombuffer(found[k], dtype=np.float32).tolist() if k in found else None
+            for k in keys
+        ]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Stores embeddings and evicts the least recently used entries beyond max_entries."""
+        now = time.time()
+        rows = [
+            (self.model_name, self._key(t), np.asarray(e, dtype=np.float32).tobytes(), now)
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                # Upper bound: replaced rows are counted as changes as well
+                self._count += self._conn.total_changes - before
+                if self._count > self.max_entries:
+                    self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE rowid IN "
+                        "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (self._count - self.max_entries,),
+                    )
+                    self._count = self.max_entries
+
+    def __len__(self) -> int:
+        return self._count
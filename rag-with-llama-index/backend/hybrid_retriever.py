@@ -0,0 +1,58 @@
+from typing import Dict, List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from bm25_index import BM25Index
+from timings import stage
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense (vector) and BM25 keyword results with reciprocal rank fusion.
+
+    Each list contributes 1 / (rrf_k + rank) per node, so exact identifier
+    matches that the embedding misses still make it into the context, while
+    the scores of the two retrievers never have to be calibrated.
+    """
+
+    def __init__(self, vector_retriever: BaseRetriever, bm25: BM25Index, docstore,
+                 top_k: int = 2, keyword_top_k: int = 10, rrf_k: int = 60):
+        super().__init__()
+        self.vector_retriever = vector_retriever
+        self.bm25 = bm25
+        self.docstore = docstore
+        self.top_k = top_k
+        self.keyword_top_k = keyword_top_k
+        self.rrf_k = rrf_k
+
+    def fuse(self, vector_hits: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        """Fuses ranked vector hits with BM25 results for the query (also used for batch queries)."""
+        fused: Dict[str, float] = {}
+        nodes = {}
+        for rank, hit in enumerate(vector_hits):
+            nodes[hit.node.node_id] = hit.node
+            fused[hit.node.node_id] = fused.get(hit.node.node_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        with stage("keyword_search"):
+            keyword_hits = self.bm25.search(query_str, self.keyword_top_k)
+        for rank, (node_id, _) in enumerate(keyword_hits):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        results = []
+        for node_id, score in sorted(fused.items(), key=lambda item: item[1], reverse=True):
+            node = nodes.get(node_id) or self.docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+            if len(results) >= self.top_k:
+                break
+        return results
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with stage("vector_search"):
+            vector_hits = self.vector_retriever.retrieve(query_bundle)
+        return self.fuse(vector_hits, query_bundle.query_str)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        with stage("vector_search"):
+            vector_hits = await self.vector_retriever.aretrieve(query_bundle)
+        return self.fuse(vector_hits, query_bundle.query_str)
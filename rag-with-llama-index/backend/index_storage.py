@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import config
+
+# --- Layout ---
+#
+# storage/
+#     CURRENT          name of the committed generation, replaced atomically
+#     gen-000012/      complete snapshot: index files, bm25, index_manifest.json, COMMIT.json
+#     gen-000013/      being written; ignored (and later removed) until CURRENT names it
+#
+# Files that did not change since the previous generation are hard links to
+# it, so a commit only writes the changed components. Writers must replace
+# files (write a temp file + os.replace) or only append to them, never
+# modify them in place, since the same inode may belong to older
+# generations. An older generation reads just the prefix its commit record
+# covers, so bytes appended for a newer one do not disturb it.
+
+CURRENT_FNAME = "CURRENT"
+COMMIT_FNAME = "COMMIT.json"
+MANIFEST_FNAME = os.path.basename(config.INDEX_MANIFEST_FILE)
+_GENERATION_RE = re.compile(r"^gen-(\d{6,})$")
+
+# Files of the flat layout used before generations (loaded, then migrated)
+_LEGACY_MARKER = "docstore.json"
+
+
+def _generation_number(name: str) -> Optional[int]:
+    match = _GENERATION_RE.match(name)
+    return int(match.group(1)) if match else None
+
+
+def _generations(storage_dir: str) -> Dict[int, str]:
+    """Generation number -> directory, for every gen-* directory."""
+    if not os.path.isdir(storage_dir):
+        return {}
+    found = {}
+    for name in os.listdir(storage_dir):
+        number = _generation_number(name)
+        if number is not None and os.path.isdir(os.path.join(storage_dir, name)):
+            found[number] = os.path.join(storage_dir, name)
+    return found
+
+
+def _fsync_path(path: str):
+    if not config.STORAGE_FSYNC:
+        return
+    flags = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) if os.path.isdir(path) else os.O_RDONLY
+    try:
+        fd = os.open(path, flags)
+    except OSError:
+        return  # e.g. directories cannot be opened on Windows
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def is_committed(generation_dir: str) -> bool:
+    """
+    True if the generation has a commit record and all its files are intact.
+    A file may have grown since (appended to by a newer generation), but
+    not shrunk.
+    """
+    try:
+        with open(os.path.join(generation_dir, COMMIT_FNAME), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return False
+    for name, size in record.get("files", {}).items():
+        path = os.path.join(generation_dir, name)
+        if not os.path.isfile(path) or os.path.getsize(path) < size:
+            return False
+    return True
+
+
+def current_generation(storage_dir: str) -> Optional[str]:
+    """
+    Returns the directory of the committed generation, or None.
+
+    Normally this is the one named by CURRENT. Should CURRENT be missing or
+    point at a damaged generation, the newest intact generation is used.
+    """
+    try:
+        with open(os.path.join(storage_dir, CURRENT_FNAME), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        name = ""
+    if _generation_number(name) is not None:
+        path = os.path.join(storage_dir, name)
+        if is_committed(path):
+            return path
+        print(f"Storage generation '{name}' named by CURRENT is incomplete; looking for an older one.")
+    generations = _generations(storage_dir)
+    for number in sorted(generations, reverse=True):
+        if is_committed(generations[number]):
+            return generations[number]
+    return None
+
+
+def resolve(storage_dir: str) -> Optional[str]:
+    """
+    The directory to load an index from: the committed generation, else a
+    legacy flat storage directory, else None (nothing persisted yet).
+    """
+    generation = current_generation(storage_dir)
+    if generation is not None:
+        return generation
+    if os.path.isfile(os.path.join(storage_dir, _LEGACY_MARKER)):
+        return storage_dir
+    return None
+
+
+def recover(storage_dir: str):
+    """
+    Removes generations a crash left behind: incomplete ones, and ones newer
+    than the committed generation (written, but CURRENT never switched to them).
+    """
+    committed = current_generation(storage_dir)
+    committed_number = _generation_number(os.path.basename(committed)) if committed else 0
+    for number, path in _generations(storage_dir).items():
+        if path != committed and (number > committed_number or not is_committed(path)):
+            print(f"Removing uncommitted storage generation {os.path.basename(path)}.")
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# --- Writing ---
+
+class Generation:
+    """
+    A new generation being written. Use as a context manager: the generation
+    is committed when the block succeeds and discarded when it raises.
+
+        with Generation(storage_dir) as generation:
+            generation.link_unchanged(exclude=[...])
+            ... write changed files into generation.path ...
+    """
+
+    def __init__(self, storage_dir: str):
+        self.storage_dir = storage_dir
+        self.previous = resolve(storage_dir)
+        numbers = _generations(storage_dir)
+        self.number = max(numbers, default=0) + 1
+        self.path = os.path.join(storage_dir, f"gen-{self.number:06d}")
+        # Linked file -> its size when linked
+        self._linked: Dict[str, int] = {}
+        # Files of the previous generation that the caller replaces (or drops)
+        self._superseded = set()
+
+    def __enter__(self) -> "Generation":
+        os.makedirs(self.storage_dir, exist_ok=True)
+        os.mkdir(self.path)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return False
+        self.commit()
+        return False
+
+    def link_unchanged(self, exclude: Iterable[str] = ()):
+        """Hard-links (or copies, where links are unsupported) the previous generation's files."""
+        if self.previous is None:
+            return
+        exclude = set(exclude) | {COMMIT_FNAME, CURRENT_FNAME}
+        for name in os.listdir(self.previous):
+            source = os.path.join(self.previous, name)
+            if not os.path.isfile(source) or name.endswith(".tmp"):
+                continue
+            if name in exclude:
+                self._superseded.add(name)
+                continue
+            try:
+                os.link(source, os.path.join(self.path, name))
+            except OSError:
+                shutil.copy2(source, os.path.join(self.path, name))
+            self._linked[name] = os.path.getsize(source)
+
+    def commit(self):
+        """Records the generation's files, then atomically points CURRENT at it."""
+        files = {}
+        for name in sorted(os.listdir(self.path)):
+            path = os.path.join(self.path, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            files[name] = os.path.getsize(path)
+            # New files, and linked ones appended to since
+            if self._linked.get(name) != files[name]:
+                _fsync_path(path)
+        record_path = os.path.join(self.path, COMMIT_FNAME)
+        with open(record_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": self.number, "created": datetime.now().isoformat(), "files": files}, f)
+        _fsync_path(record_path)
+        _fsync_path(self.path)
+
+        pointer = os.path.join(self.storage_dir, CURRENT_FNAME)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(os.path.basename(self.path) + "\n")
+        _fsync_path(pointer + ".tmp")
+        os.replace(pointer + ".tmp", pointer)
+        _fsync_path(self.storage_dir)
+
+        if self.previous == self.storage_dir:
+            _remove_legacy_files(self.storage_dir, set(files) | set(self._linked) | self._superseded)
+        self._prune()
+
+    def _prune(self):
+        """Keeps the newest STORAGE_KEEP_GENERATIONS committed generations, drops older ones."""
+        generations = _generations(self.storage_dir)
+        kept = 1
+        for number in sorted((n for n in generations if n < self.number), reverse=True):
+            if kept < config.STORAGE_KEEP_GENERATIONS and is_committed(generations[number]):
+                kept += 1
+                continue
+            # Memory-mapped files of a dropped generation stay readable until unmapped
+            shutil.rmtree(generations[number], ignore_errors=True)
+
+
+def _remove_legacy_files(storage_dir: str, names: Iterable[str]):
+    """After migrating a flat storage directory, removes the files now held by the first generation."""
+    for name in names:
+        if name in (COMMIT_FNAME, CURRENT_FNAME):
+            continue
+        try:
+            os.remove(os.path.join(storage_dir, name))
+        except OSError:
+            pass
+    print(f"Migrated {storage_dir} to generation-based storage.")
+
+
+def write_json(path: str, data):
+    """Writes a JSON file atomically (temp file + rename)."""
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    os.replace(path + ".tmp", path)
+
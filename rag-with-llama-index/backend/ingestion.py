@@ -0,0 +1,117 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+import config
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode
+
+# --- Parsing and Splitting ---
+
+# One splitter per process; building it loads the tokenizer
+_splitters = {}
+
+
+def get_splitter(chunk_size: int = None, chunk_overlap: int = None) -> SentenceSplitter:
+    """
+    Returns the splitter for the given sizes, creating it on first use.
+
+    Chunk sizes are counted in tokens of LlamaIndex's default tokenizer
+    (tiktoken), and the node metadata is included in the count.
+    """
+    chunk_size = config.CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    key = (chunk_size, chunk_overlap)
+    if key not in _splitters:
+        _splitters[key] = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return _splitters[key]
+
+
+def parse_file(file_path: str, chunk_size: int = None, chunk_overlap: int = None) -> List[BaseNode]:
+    """
+    Loads one file and splits it into chunk nodes.
+
+    Module-level (and free of service state) so it can run in a worker process.
+
+    Args:
+        file_path (str): The file to parse.
+        chunk_size (int): Maximum tokens per chunk (default CHUNK_SIZE).
+        chunk_overlap (int): Tokens shared by adjacent chunks (default CHUNK_OVERLAP).
+
+    Returns:
+        list: The chunk nodes, with the file path as their ref doc id.
+    """
+    documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    for doc in documents:
+        doc.id_ = file_path  # Use file path as the unique document ID
+    return get_splitter(chunk_size, chunk_overlap).get_nodes_from_documents(documents)
+
+
+# --- Process Pool ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    The shared ingestion process pool, or None when INGEST_WORKERS is 1.
+
+    Workers are never forked from this process: it runs threads (queries,
+    the watcher, background persists) whose locks a fork could copy in a
+    held state. They are forked from a fork server instead, or spawned
+    where there is none. The fork server preloads only this module, so
+    workers start with just the parsing dependencies; like any spawned
+    process they also import the main script as __mp_main__, which must
+    not do any work on import (see api.py).
+    """
+    global _pool
+    if config.INGEST_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=config.INGEST_WORKERS, mp_context=context)
+        return _pool
+
+
+def shutdown_pool():
+    """Stops the worker processes (they are started again on next use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def parse_files(file_paths: Sequence[str], chunk_size: int = None, chunk_overlap: int = None) -> List[BaseNode]:
+    """
+    Loads and splits many files, in parallel worker processes when there are
+    at least INGEST_PARALLEL_MIN_FILES of them.
+
+    Small refreshes (e.g. a single file changed under the watcher) are parsed
+    in-process, where starting a pool would cost more than it saves.
+
+    Returns:
+        list: The chunk nodes of all files, in the order of `file_paths`.
+    """
+    file_paths = list(file_paths)
+    pool = get_pool() if len(file_paths) >= config.INGEST_PARALLEL_MIN_FILES else None
+    if pool is None:
+        return [node for path in file_paths for node in parse_file(path, chunk_size, chunk_overlap)]
+
+    # Several files per task keeps pickling overhead low for many small files
+    chunksize = max(1, len(file_paths) // (config.INGEST_WORKERS * 4))
+    results = pool.map(
+        parse_file, file_paths,
+        [chunk_size] * len(file_paths), [chunk_overlap] * len(file_paths),
+        chunksize=chunksize,
+    )
+    return [node for nodes in results for node in nodes]
+
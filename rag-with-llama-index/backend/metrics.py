@@ -0,0 +1,168 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Prometheus text exposition format without external dependencies.
+# Histograms and counters are updated on the hot path; values owned by other
+# components (queue depth, cache statistics, token counts) are read through
+# callbacks at scrape time so they cost nothing per request.
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][slot] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """Metric whose samples are produced by a function at scrape time."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str,
+                 labelnames: Sequence[str], collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            samples = list(self.collect())
+        except Exception:
+            samples = []
+        for key, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_duration_seconds", "Duration of RAG pipeline, audit and sync stages.", ["stage"]
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "rag_http_request_duration_seconds", "HTTP request latency by endpoint and status.", ["endpoint", "status"]
+))
+AUDIT_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    "rag_audit_flush_duration_seconds", "Time to commit one batch of audit records.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+))
+
+LLM_TOKENS = REGISTRY.register(Counter(
+    "rag_llm_tokens_total", "Tokens sent to and generated by the LLM.", ["kind"]
+))
+EMBEDDING_TOKENS = REGISTRY.register(Counter(
+    "rag_embedding_tokens_total", "Tokens sent to the embedding model."
+))
+
+OPENAI_RETRIES = REGISTRY.register(Counter(
+    "rag_openai_retries_total", "OpenAI requests retried, by status code or \"connect\".", ["reason"]
+))
+COALESCED_QUERIES = REGISTRY.register(Counter(
+    "rag_coalesced_queries_total", "Queries answered by an identical query already in flight."
+))
+
+COLLECTION_LOADS = REGISTRY.register(Counter(
+    "rag_collection_loads_total", "Collections loaded on demand."
+))
+COLLECTION_EVICTIONS = REGISTRY.register(Counter(
+    "rag_collection_evictions_total", "Collections unloaded to stay within the memory budget."
+))
+
+
+def register_callback(name: str, documentation: str, metric_type: str, labelnames: Sequence[str],
+                      collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]):
+    """Registers (or replaces) a metric read from `collect` at scrape time."""
+    return REGISTRY.register(CallbackMetric(name, documentation, metric_type, labelnames, collect))
+
+
+def render() -> str:
+    return REGISTRY.render()
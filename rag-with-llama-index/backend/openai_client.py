@@ -0,0 +1,521 @@
+import time
+import random
+import asyncio
+import collections
+import weakref
+import threading
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+import config
+from metrics import OPENAI_RETRIES, COALESCED_QUERIES
+from timings import stage
+
+# --- Shared OpenAI Client ---
+# One pair of pooled HTTP clients per process, used by the LLM and the health
+# check. Connections are kept alive between requests, the number of requests
+# in flight is bounded (one limit shared by the sync and the async client),
+# and 429/5xx responses are retried with exponential backoff here, in the
+# transport (the SDK's and LlamaIndex's own retries are disabled so retries
+# do not multiply).
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_lock = threading.Lock()
+_slots = None
+_http_client = None
+_async_http_client = None
+_client = None
+_probe_client = None
+
+
+def _backoff_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before retry `attempt` (Retry-After wins when the server sends it)."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), config.OPENAI_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Exponential backoff with full jitter
+    ceiling = min(config.OPENAI_BACKOFF_BASE_SECONDS * (2 ** attempt), config.OPENAI_BACKOFF_MAX_SECONDS)
+    return random.uniform(0, ceiling)
+
+
+class _Slots:
+    """
+    Counting semaphore that threads and coroutines (on any event loop) can
+    share, so the sync and the async client draw from one limit. Slots are
+    handed over to waiters in arrival order.
+    """
+
+    def __init__(self, limit: int):
+        self._free = max(limit, 1)
+        self._waiters = collections.deque()  # (loop, future) or (None, threading.Event)
+        self._lock = threading.Lock()
+
+    @property
+    def free(self) -> int:
+        return self._free
+
+    def _take(self) -> bool:
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return True
+        return False
+
+    def acquire(self):
+        with self._lock:
+            if self._take():
+                return
+            event = threading.Event()
+            self._waiters.append((None, event))
+        event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._take():
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # A slot handed over to a cancelled future is passed on by _wake;
+            # one that arrived just before the cancellation is ours to free
+            if not queued and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Frees a slot (safe to call from any thread, e.g. a finalizer)."""
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._free += 1
+                    return
+                loop, waiter = self._waiters.popleft()
+            if loop is None:
+                waiter.set()
+                return
+            try:
+                loop.call_soon_threadsafe(self._wake, waiter)
+                return
+            except RuntimeError:  # loop closed, hand the slot to the next waiter
+                continue
+
+    def _wake(self, future: asyncio.Future):
+        if future.done():  # cancelled after the slot was handed to it
+            self.release()
+        else:
+            future.set_result(None)
+
+
+def _get_slots() -> _Slots:
+    global _slots
+    if _slots is None:
+        with _lock:
+            if _slots is None:
+                _slots = _Slots(config.OPENAI_MAX_CONCURRENCY)
+    return _slots
+
+
+class _SlotStream(httpx.SyncByteStream):
+    """
+    Response body that frees its concurrency slot once it is read to the
+    end or closed, or else when it is garbage collected (a caller that
+    drops the response unclosed must not hold the slot forever).
+    """
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        weakref.finalize(self, release)
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self._release()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncSlotStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        weakref.finalize(self, release)
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        finally:
+            self._release()
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(fn: Callable[[], None]) -> Callable[[], None]:
+    lock = threading.Lock()
+    done = []
+
+    def wrapper():
+        with lock:
+            if done:
+                return
+            done.append(True)
+        fn()
+    return wrapper
+
+
+class _RetryTransport(httpx.HTTPTransport):
+    """
+    Transport that retries 429/5xx responses and connection errors, and caps
+    the requests in flight at OPENAI_MAX_CONCURRENCY. A slot is held until
+    the response body is read or closed, so streamed completions count as well.
+    """
+
+    def __init__(self, slots: Optional[_Slots] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._slots = slots or _Slots(config.OPENAI_MAX_CONCURRENCY)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._slots.acquire()
+        release = _once(self._slots.release)
+        try:
+            response = self._send(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_SlotStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(config.OPENAI_MAX_RETRIES + 1):
+            last = attempt == config.OPENAI_MAX_RETRIES
+            try:
+                response = super().handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if last:
+                    raise
+                OPENAI_RETRIES.inc(reason="connect")
+                time.sleep(_backoff_delay(attempt))
+                continue
+            if response.status_code not in _RETRY_STATUS or last:
+                return response
+            OPENAI_RETRIES.inc(reason=str(response.status_code))
+            response.close()
+            time.sleep(_backoff_delay(attempt, response))
+
+
+class _AsyncRetryTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of _RetryTransport."""
+
+    def __init__(self, slots: Optional[_Slots] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._slots = slots or _Slots(config.OPENAI_MAX_CONCURRENCY)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self._slots.acquire_async()
+        release = _once(self._slots.release)
+        try:
+            response = await self._send(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncSlotStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(config.OPENAI_MAX_RETRIES + 1):
+            last = attempt == config.OPENAI_MAX_RETRIES
+            try:
+                response = await super().handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if last:
+                    raise
+                OPENAI_RETRIES.inc(reason="connect")
+                await asyncio.sleep(_backoff_delay(attempt))
+                continue
+            if response.status_code not in _RETRY_STATUS or last:
+                return response
+            OPENAI_RETRIES.inc(reason=str(response.status_code))
+            await response.aclose()
+            await asyncio.sleep(_backoff_delay(attempt, response))
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.OPENAI_POOL_CONNECTIONS,
+        max_keepalive_connections=config.OPENAI_POOL_CONNECTIONS,
+        keepalive_expiry=config.OPENAI_KEEPALIVE_SECONDS,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(config.OPENAI_TIMEOUT_SECONDS, connect=min(10.0, config.OPENAI_TIMEOUT_SECONDS))
+
+
+def get_http_client() -> httpx.Client:
+    """Returns the process-wide pooled HTTP client for OpenAI requests."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    transport=_RetryTransport(slots=_get_slots(), limits=_limits()), timeout=_timeout()
+                )
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Returns the process-wide pooled async HTTP client for OpenAI requests."""
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(
+                    transport=_AsyncRetryTransport(slots=_get_slots(), limits=_limits()), timeout=_timeout()
+                )
+    return _async_http_client
+
+
+def get_client() -> openai.OpenAI:
+    """Returns the shared OpenAI SDK client."""
+    global _client
+    if _client is None:
+        client = openai.OpenAI(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            http_client=get_http_client(),
+            max_retries=0,
+            timeout=config.OPENAI_TIMEOUT_SECONDS,
+        )
+        with _lock:
+            if _client is None:
+                _client = client
+    return _client
+
+
+def llm_kwargs() -> dict:
+    """Client settings for llama_index's OpenAI LLM so it uses the shared pool."""
+    return {
+        "api_base": config.OPENAI_BASE_URL,
+        "timeout": config.OPENAI_TIMEOUT_SECONDS,
+        "max_retries": 0,
+        "http_client": get_http_client(),
+        "async_http_client": get_async_http_client(),
+    }
+
+
+# --- Cached Health Check ---
+# Load balancers poll /health/openai frequently; the result of models.list()
+# is reused for OPENAI_HEALTH_TTL_SECONDS and only one caller refreshes it.
+# The probe has its own client: it is not retried, waits for no concurrency
+# slot and gives up after OPENAI_HEALTH_TIMEOUT_SECONDS, so a slow or busy
+# API is reported as such instead of stalling the health endpoint.
+
+_health = {"result": None, "checked_at": 0.0}
+_health_lock = threading.Lock()
+
+
+def _get_probe_client() -> openai.OpenAI:
+    global _probe_client
+    if _probe_client is None:
+        with _lock:
+            if _probe_client is None:
+                timeout = httpx.Timeout(config.OPENAI_HEALTH_TIMEOUT_SECONDS)
+                _probe_client = openai.OpenAI(
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL,
+                    http_client=httpx.Client(timeout=timeout, limits=httpx.Limits(max_connections=1)),
+                    max_retries=0,
+                    timeout=timeout,
+                )
+    return _probe_client
+
+
+def _probe() -> dict:
+    try:
+        _get_probe_client().models.list()
+        return {"status": "ok", "message": "OpenAI API is accessible."}
+    except openai.AuthenticationError:
+        return {"status": "error", "details": "OpenAI API authentication failed. Check your API key."}
+    except Exception as e:
+        return {"status": "error", "details": str(e)}
+
+
+def check_health() -> dict:
+    """
+    Returns the OpenAI reachability status, probing the API at most once per TTL.
+
+    Returns:
+        dict: "status" ("ok" or "error"), a "message" or "details" string,
+        "checked_at" (epoch seconds of the probe) and "cached".
+    """
+    def fresh():
+        return _health["result"] is not None and \
+            time.time() - _health["checked_at"] < config.OPENAI_HEALTH_TTL_SECONDS
+
+    def cached():
+        return {**_health["result"], "checked_at": _health["checked_at"], "cached": True}
+
+    if fresh():
+        return cached()
+    # One caller probes; the others get the previous result meanwhile
+    # (only the very first callers wait for the probe)
+    if not _health_lock.acquire(blocking=_health["result"] is None):
+        return cached()
+    try:
+        if fresh():  # probed by the caller we waited for
+            return cached()
+        result, checked_at = _probe(), time.time()
+        _health["result"], _health["checked_at"] = result, checked_at
+        return {**result, "checked_at": checked_at, "cached": False}
+    finally:
+        _health_lock.release()
+
+
+# --- Rate Limiting ---
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second (bursts up to `burst`)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent (returns at once when rate <= 0)."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- Request Coalescing ---
+# Identical prompts that arrive while the first one is still being answered
+# wait for that answer instead of running retrieval and the LLM again.
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], object]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_QUERIES.inc()
+            with stage("coalesced_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines running on one event loop.
+
+    The call runs as a task of its own that every caller, the first one
+    included, awaits through asyncio.shield: a cancelled caller (e.g. a
+    disconnected client) only stops waiting, and the call is cancelled
+    once no caller is left waiting for it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _AsyncCall] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[object]]):
+        call = self._calls.get(key)
+        follower = call is not None
+        if follower:
+            COALESCED_QUERIES.inc()
+        else:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        call.waiters += 1
+        try:
+            if follower:
+                with stage("coalesced_wait"):
+                    return await asyncio.shield(call.task)
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody wants the answer any more; later callers start afresh
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _AsyncCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
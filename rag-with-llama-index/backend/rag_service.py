@@ -1,57 +1,696 @@
 import os
+import re
+import asyncio
+import threading
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
 import config
 from llama_index.core import (
     VectorStoreIndex,
-    SimpleDirectoryReader,
     StorageContext,
-    Settings,
     load_index_from_storage,
-    Document
+    QueryBundle
 )
+from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from llama_index.core.data_structs.data_structs import IndexDict
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.embeddings.huggingface.utils import format_query, get_text_instruct_for_model_name
+from response_cache import ResponseCache, normalize_prompt
+from embedding_cache import EmbeddingCache
+from vector_store import MmapVectorStore, LEGACY_FNAME as VECTOR_STORE_FNAME
+from docstore_log import LogKVStore
+import index_storage
+from bm25_index import BM25Index
+from ingestion import parse_files
+from hybrid_retriever import HybridRetriever
+from reranker import BudgetedReranker
+from timings import stage
+from metrics import LLM_TOKENS, EMBEDDING_TOKENS
+from openai_client import SingleFlight, AsyncSingleFlight, RateLimiter, llm_kwargs
+
+
+class _TokenMetricsHandler(TokenCountingHandler):
+    """Feeds LLM and embedding token counts into the Prometheus counters."""
+
+    def on_event_end(self, event_type, payload=None, event_id="", **kwargs):
+        super().on_event_end(event_type, payload=payload, event_id=event_id, **kwargs)
+        # Move the counts into the counters instead of keeping one record per
+        # call; pop() is atomic, so concurrent requests are neither lost nor
+        # counted twice
+        while self.llm_token_counts:
+            count = self.llm_token_counts.pop()
+            LLM_TOKENS.inc(count.prompt_token_count, kind="prompt")
+            LLM_TOKENS.inc(count.completion_token_count, kind="completion")
+        while self.embedding_token_counts:
+            EMBEDDING_TOKENS.inc(self.embedding_token_counts.pop().total_token_count)
+
+# --- Shared Models ---
+# The embedding model, LLM, callback manager, embedding cache and optional
+# cross-encoder are created once per process and handed to every RAGService
+# explicitly, instead of through LlamaIndex's global Settings, so services
+# for different collections never overwrite each other's configuration.
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_resource(name: str, factory):
+    if name not in _shared:
+        with _shared_lock:
+            if name not in _shared:
+                _shared[name] = factory()
+    return _shared[name]
+
+
+def get_callback_manager() -> CallbackManager:
+    return _shared_resource("callback_manager", lambda: CallbackManager([_TokenMetricsHandler()]))
+
+
+def get_embed_model():
+    return _shared_resource("embed_model", lambda: HuggingFaceEmbedding(
+        model_name = config.EMBED_MODEL,
+        embed_batch_size = config.EMBED_BATCH_SIZE,
+        callback_manager = get_callback_manager(),
+    ))
+
+
+def get_llm():
+    # Shares the process-wide pooled client (timeouts, retries, concurrency limit)
+    return _shared_resource("llm", lambda: OpenAI(
+        model = config.LLM_MODEL,
+        api_key = config.OPENAI_API_KEY,
+        callback_manager = get_callback_manager(),
+        **llm_kwargs(),
+    ))
+
+
+def get_embedding_cache():
+    """Chunk embedding cache shared by all collections (None when disabled)."""
+    if not config.EMBED_CACHE_ENABLED:
+        return None
+    return _shared_resource("embedding_cache", lambda: EmbeddingCache(
+        config.EMBED_CACHE_FILE, config.EMBED_MODEL, max_entries=config.EMBED_CACHE_MAX_ENTRIES
+    ))
+
+
+def get_cross_encoder():
+    """Re-ranking cross-encoder shared by all collections (None when not configured)."""
+    if not config.RERANK_MODEL:
+        return None
+
+    def load():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(config.RERANK_MODEL)
+    return _shared_resource("cross_encoder", load)
+
+
+def get_batch_rate_limiter() -> RateLimiter:
+    """Paces the LLM calls of all batch queries in this process together."""
+    return _shared_resource("batch_rate_limiter", lambda: RateLimiter(
+        config.BATCH_REQUESTS_PER_SECOND, burst=config.BATCH_CONCURRENCY
+    ))
+
+
+DOCSTORE_FNAME = "docstore.json"
+INDEX_STORE_FNAME = "index_store.json"
+
+
+class _ReadWriteLock:
+    """
+    Lock held shared by queries and exclusively by index updates. A waiting
+    writer holds back new readers, so a steady stream of queries cannot
+    starve an update. Not reentrant.
+    """
 
-class RAGService:
     def __init__(self):
-        print("Initializing RAG Service...")
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+# Collection names double as directory names
+_COLLECTION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
 
-        #Configure global settings for LlamaIndex
-        Settings.llm = OpenAI(model = config.LLM_MODEL, api_key = config.OPENAI_API_KEY)
-        Settings.embed_model = HuggingFaceEmbedding(model_name = config.EMBED_MODEL)
-        Settings.chink_size = config.CHUNK_SIZE
-        Settings.chunk_overlap = config.CHUNK_OVERLAP
+def collection_dirs(collection: str):
+    """
+    Returns the data and storage directories of a collection.
+
+    The default collection keeps using DATA_DIR and STORAGE_DIR; every other
+    collection lives in COLLECTIONS_DIR/<name>/data and .../storage.
+
+    Raises:
+        ValueError: If the name is not a valid collection name.
+    """
+    if collection == config.DEFAULT_COLLECTION:
+        return config.DATA_DIR, config.STORAGE_DIR
+    if not _COLLECTION_RE.match(collection or ""):
+        raise ValueError(f"Invalid collection name: {collection!r}")
+    root = os.path.join(config.COLLECTIONS_DIR, collection)
+    return os.path.join(root, "data"), os.path.join(root, "storage")
+
+
+class RAGService:
+    def __init__(self, collection: str = config.DEFAULT_COLLECTION):
+        print(f"Initializing RAG Service for collection '{collection}'...")
+        self.collection = collection
+        self.data_dir, self.storage_dir = collection_dirs(collection)
+
+        self.callback_manager = get_callback_manager()
+        self.llm = get_llm()
+        self.embed_model = get_embed_model()
+        self.embedding_cache = get_embedding_cache()
+
+        # Serializes index mutations (queries do not take this lock)
+        self._write_lock = threading.Lock()
+        # Held shared while a query retrieves, and exclusively while an update
+        # applies its already parsed and embedded nodes, so retrieval never
+        # sees vector hits whose nodes are not (or no longer) in the docstore
+        self._index_lock = _ReadWriteLock()
+        # Files indexed by a fresh build in this process (see sync_service)
+        self.built_files = set()
+        self.cache = None
+        # Identical prompts in flight share one retrieval + LLM call
+        self._inflight = SingleFlight() if config.COALESCE_QUERIES else None
+        self._ainflight = AsyncSingleFlight() if config.COALESCE_QUERIES else None
+        # Keyword index over the same chunks (None when hybrid search is off)
+        self.bm25 = None
+        # Chunk text bytes per ref doc id and their total, kept up to date
+        # by refresh and delete so memory_bytes() never walks the docstore
+        self._text_bytes: Dict[str, int] = {}
+        self._text_bytes_total = 0
 
         self._load_index()
-        self.query_engine = self.index.as_query_engine()
+        self.reranker = None
+        if config.RERANK_ENABLED:
+            self.reranker = BudgetedReranker(
+                cross_encoder=get_cross_encoder(),
+                token_budget=config.CONTEXT_TOKEN_BUDGET,
+                top_n=config.RERANK_TOP_N,
+                model_name=config.RERANK_MODEL or None,
+            )
+        self.query_engine = self._build_query_engine()
+        self.streaming_query_engine = self._build_query_engine(streaming=True)
+
+        if config.RESPONSE_CACHE_ENABLED:
+            self.cache = ResponseCache(
+                self.embed_model,
+                max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS,
+                similarity_threshold=config.RESPONSE_CACHE_SIMILARITY,
+            )
+
+    @property
+    def manifest_file(self) -> str:
+        """The file manifest committed with the index (see sync_service)."""
+        return os.path.join(index_storage.resolve(self.storage_dir) or self.storage_dir, index_storage.MANIFEST_FNAME)
 
     def _load_index(self):
         "Loads the index from storage or builds a new one if it doesn't exists."
-        if os.path.exists(config.STORAGE_DIR) and os.listdir(config.STORAGE_DIR):
-            print("Loading index from storage...")
-            storage_context = StorageContext.from_defaults(persist_dir=config.STORAGE_DIR)
-            self.index = load_index_from_storage(storage_context)
+        index_storage.recover(self.storage_dir)
+        load_dir = index_storage.resolve(self.storage_dir)
+        if load_dir is not None:
+            print(f"Loading index from {load_dir}...")
+            # Embeddings are memory-mapped from vectors.bin instead of parsed from JSON
+            vector_store = MmapVectorStore.from_persist_dir(
+                load_dir,
+                dtype=config.VECTOR_DTYPE,
+                quantization=config.VECTOR_QUANTIZATION,
+                rerank_factor=config.VECTOR_RERANK_FACTOR,
+            )
+            # The docstore is its base file plus the change logs of later commits
+            docstore = SimpleDocumentStore(LogKVStore.from_persist_path(os.path.join(load_dir, DOCSTORE_FNAME)))
+            storage_context = StorageContext.from_defaults(
+                persist_dir=load_dir, vector_store=vector_store, docstore=docstore
+            )
+            self.index = load_index_from_storage(
+                storage_context, embed_model=self.embed_model, callback_manager=self.callback_manager
+            )
+            # index_store.json is written without the node id map (see persist_index):
+            # with stores_text=False the vector ids are the node ids
+            self.index.index_struct.nodes_dict = {node_id: node_id for node_id in vector_store.node_ids()}
+            self._count_text_bytes(self.index.docstore.docs.values())
+            if config.HYBRID_SEARCH_ENABLED:
+                self.bm25 = BM25Index.load(load_dir)
+                if self.bm25 is None:
+                    print("Building keyword index from the docstore...")
+                    self.bm25 = BM25Index()
+                    self.bm25.add_nodes(self.index.docstore.docs.values())
+                    self.persist_index()
         else:
             print("No existing index found. Buiding a new one...")
-            os.makedirs(config.STORAGE_DIR, exist_ok=True)
-            documents = SimpleDirectoryReader(config.DATA_DIR).load_data()
-            if not documents:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            file_paths = [
+                os.path.join(self.data_dir, name)
+                for name in sorted(os.listdir(self.data_dir))
+                if os.path.isfile(os.path.join(self.data_dir, name))
+            ] if os.path.isdir(self.data_dir) else []
+            if not file_paths:
                 print("No documents found in the data directory. The index will be empty.")
-            self.index = VectorStoreIndex.from_documents(documents)
-            self.index.storage_context.persist(persist_dir=config.STORAGE_DIR)
+            storage_context = StorageContext.from_defaults(
+                vector_store=MmapVectorStore(
+                    dtype=config.VECTOR_DTYPE,
+                    quantization=config.VECTOR_QUANTIZATION,
+                    rerank_factor=config.VECTOR_RERANK_FACTOR,
+                ),
+                docstore=SimpleDocumentStore(LogKVStore()),
+            )
+            self.index = VectorStoreIndex(
+                nodes=[], storage_context=storage_context,
+                embed_model=self.embed_model, callback_manager=self.callback_manager,
+            )
+            if config.HYBRID_SEARCH_ENABLED:
+                self.bm25 = BM25Index()
+            self.refresh_documents(file_paths)
+            # Not persisted here: the first sync commits the build together
+            # with its file manifest, as one generation (see sync_service)
+            self.built_files = set(file_paths)
+
+    def _candidate_counts(self) -> Tuple[int, int]:
+        """(chunks handed to the reranker / LLM, vector hits fetched per query)."""
+        # With a cross-encoder, over-fetch cheaply and let it pick the chunks
+        rescoring = self.reranker is not None and self.reranker.rescores
+        candidates = config.RERANK_CANDIDATES if rescoring else config.SIMILARITY_TOP_K
+        fetch = max(config.HYBRID_CANDIDATES, candidates) if self.bm25 is not None else candidates
+        return candidates, fetch
+
+    def _vector_retriever(self, top_k: int) -> VectorIndexRetriever:
+        # index.as_retriever() pins the node ids indexed so far, which would hide
+        # every chunk a later refresh adds from this long-lived engine
+        return VectorIndexRetriever(
+            self.index,
+            similarity_top_k=top_k,
+            callback_manager=self.callback_manager,
+        )
+
+    def _build_query_engine(self, streaming: bool = False):
+        candidates, fetch = self._candidate_counts()
+        if self.bm25 is None:
+            retriever = self._vector_retriever(candidates)
+        else:
+            retriever = HybridRetriever(
+                self._vector_retriever(fetch),
+                self.bm25,
+                self.index.docstore,
+                top_k=candidates,
+                keyword_top_k=fetch,
+                rrf_k=config.RRF_K,
+            )
+        postprocessors = [self.reranker] if self.reranker is not None else []
+        return RetrieverQueryEngine.from_args(
+            retriever,
+            llm=self.llm,
+            node_postprocessors=postprocessors,
+            callback_manager=self.callback_manager,
+            streaming=streaming,
+        )
+
+    def _lookup(self, prompt: str):
+        """(cached answer, query embedding, cache generation to pass to _remember)."""
+        if self.cache is None:
+            return None, None, None
+        # Read before retrieving, so an update in between keeps the answer out of the cache
+        generation = self.cache.generation
+        with stage("cache_lookup"):
+            return (*self.cache.lookup(prompt), generation)
+
+    def _remember(self, prompt: str, answer: str, nodes, embedding, generation):
+        if self.cache is not None:
+            doc_ids = {n.node.ref_doc_id for n in nodes if n.node.ref_doc_id}
+            self.cache.put(prompt, answer, doc_ids, embedding, generation=generation)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieves and re-ranks the context of a query. Only the retrieval
+        holds the index lock; the query is embedded before and the
+        candidates are re-ranked after it.
+        """
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        with stage("retrieve"):
+            with self._index_lock.shared():
+                nodes = self.query_engine.retriever.retrieve(query_bundle)
+            if self.reranker is not None:
+                nodes = self.reranker.postprocess_nodes(nodes, query_bundle=query_bundle)
+        return nodes
 
     def query(self, prompt: str) -> str:
-        response = self.query_engine.query(prompt)
-        return str(response)
+        if self._inflight is None:
+            return self._query(prompt)
+        return self._inflight.do(normalize_prompt(prompt), lambda: self._query(prompt))
+
+    def _query(self, prompt: str) -> str:
+        answer, embedding, generation = self._lookup(prompt)
+        if answer is not None:
+            return answer
+
+        # Reuse the embedding computed for the cache lookup for retrieval
+        query_bundle = QueryBundle(prompt, embedding=embedding)
+        nodes = self._retrieve(query_bundle)
+        with stage("generate"):
+            answer = str(self.query_engine.synthesize(query_bundle, nodes))
+        self._remember(prompt, answer, nodes, embedding, generation)
+        return answer
+
+    async def aquery(self, prompt: str) -> str:
+        """Async variant of query; the LLM and retrieval calls are awaited."""
+        if self._ainflight is None:
+            return await self._aquery(prompt)
+        return await self._ainflight.do(normalize_prompt(prompt), lambda: self._aquery(prompt))
+
+    async def _aquery(self, prompt: str) -> str:
+        # Embedding the prompt is CPU-bound, keep it off the event loop
+        answer, embedding, generation = await asyncio.to_thread(self._lookup, prompt)
+        if answer is not None:
+            return answer
+
+        query_bundle = QueryBundle(prompt, embedding=embedding)
+        # CPU-bound and waits for the index lock: keep it off the event loop too
+        nodes = await asyncio.to_thread(self._retrieve, query_bundle)
+        with stage("generate"):
+            answer = str(await self.query_engine.asynthesize(query_bundle, nodes))
+        self._remember(prompt, answer, nodes, embedding, generation)
+        return answer
+
+    def stream_query(self, prompt: str):
+        """Yields the answer token by token (a cached answer is yielded at once)."""
+        answer, embedding, generation = self._lookup(prompt)
+        if answer is not None:
+            yield answer
+            return
+
+        query_bundle = QueryBundle(prompt, embedding=embedding)
+        nodes = self._retrieve(query_bundle)
+        parts = []
+        with stage("generate"):
+            response = self.streaming_query_engine.synthesize(query_bundle, nodes)
+            for token in response.response_gen:
+                parts.append(token)
+                yield token
+        self._remember(prompt, "".join(parts), nodes, embedding, generation)
     
+    def _embed_queries(self, prompts: List[str]) -> np.ndarray:
+        """Unit-length query embeddings of many prompts, computed in batches."""
+        model = self.embed_model
+        with stage("embed_query"):
+            if isinstance(model, HuggingFaceEmbedding) and \
+                    not (model.text_instruction or get_text_instruct_for_model_name(model.model_name)):
+                # The model adds no text instruction, so prepending the query
+                # instruction gives the query embeddings, EMBED_BATCH_SIZE
+                # prompts per forward pass
+                texts = [format_query(prompt, model.model_name, model.query_instruction) for prompt in prompts]
+                vectors = model.get_text_embedding_batch(texts)
+            else:
+                vectors = [model.get_query_embedding(prompt) for prompt in prompts]
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _context_nodes(self, query_bundle: QueryBundle, result) -> List[NodeWithScore]:
+        """Builds the LLM context of one query from its precomputed vector hits."""
+        candidates, _ = self._candidate_counts()
+        docstore = self.index.docstore
+        hits = []
+        for node_id, score in zip(result.ids, result.similarities):
+            node = docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                hits.append(NodeWithScore(node=node, score=score))
+        if self.bm25 is not None:
+            nodes = self.query_engine.retriever.fuse(hits, query_bundle.query_str)
+        else:
+            nodes = hits[:candidates]
+        if self.reranker is not None:
+            nodes = self.reranker.postprocess_nodes(nodes, query_bundle=query_bundle)
+        return nodes
+
+    def query_many(self, prompts: List[str], max_workers: Optional[int] = None
+                   ) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Answers many prompts, yielding each result as soon as it is ready.
+
+        Prompts are embedded in batches and retrieved with one vectorized
+        search over the vector store; duplicate prompts are answered once.
+        LLM calls run on up to `max_workers` threads (BATCH_CONCURRENCY) and
+        are paced by the process-wide BATCH_REQUESTS_PER_SECOND limiter.
+
+        Yields:
+            tuple: (index, answer, error) per prompt, in completion order;
+            exactly one of answer and error is None.
+        """
+        prompts = list(prompts)
+        groups: Dict[str, List[int]] = {}
+        for i, prompt in enumerate(prompts):
+            groups.setdefault(normalize_prompt(prompt), []).append(i)
+        indices = list(groups.values())
+        unique = [prompts[group[0]] for group in indices]
+        if not unique:
+            return
+
+        generation = self.cache.generation if self.cache is not None else None
+        embeddings = self._embed_queries(unique)
+        pending = []
+        for j, prompt in enumerate(unique):
+            answer = None
+            if self.cache is not None:
+                with stage("cache_lookup"):
+                    answer, _ = self.cache.lookup(prompt, embedding=embeddings[j])
+            if answer is None:
+                pending.append(j)
+                continue
+            for i in indices[j]:
+                yield i, answer, None
+        if not pending:
+            return
+
+        _, fetch = self._candidate_counts()
+        with stage("vector_search"):
+            results = self.index.vector_store.query_many(embeddings[pending], fetch)
+        limiter = get_batch_rate_limiter()
+
+        def answer_one(j: int, result) -> str:
+            query_bundle = QueryBundle(unique[j], embedding=embeddings[j].tolist())
+            nodes = self._context_nodes(query_bundle, result)
+            limiter.acquire()
+            with stage("generate"):
+                answer = str(self.query_engine.synthesize(query_bundle, nodes))
+            self._remember(unique[j], answer, nodes, query_bundle.embedding, generation)
+            return answer
+
+        pool = ThreadPoolExecutor(max_workers=max_workers or config.BATCH_CONCURRENCY)
+        try:
+            futures = {pool.submit(answer_one, j, result): j for j, result in zip(pending, results)}
+            for future in as_completed(futures):
+                j = futures[future]
+                try:
+                    answer, error = future.result(), None
+                except Exception as e:
+                    answer, error = None, str(e)
+                for i in indices[j]:
+                    yield i, answer, error
+        finally:
+            # Stop dispatching LLM calls if the consumer went away
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def refresh_document(self, file_path: str):
-        doc = SimpleDirectoryReader(input_files=[file_path]).load_data()[0]
-        doc.id_ = file_path # Use file path as the unique document ID
+        self.refresh_documents([file_path])
+
+    def _embed_nodes(self, nodes):
+        """
+        Embeds all nodes in large batches (EMBED_BATCH_SIZE per model call).
+        Chunks whose text is in the embedding cache are not sent to the model.
+        """
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.get_many(texts)
+        else:
+            embeddings = [None] * len(texts)
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self.embed_model.get_text_embedding_batch([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many([texts[i] for i in missing], computed)
+
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
+
+    def _ref_doc_ids_for(self, file_paths: Iterable[str]) -> List[str]:
+        """
+        Existing ref doc ids for the given files. Besides ids equal to the file
+        path this also finds documents from indexes built before file paths
+        were used as ids, through their file_path metadata.
+        """
+        wanted = set(file_paths)
+        found = []
+        for ref_doc_id, info in (self.index.ref_doc_info or {}).items():
+            metadata = getattr(info, "metadata", None) or {}
+            if ref_doc_id in wanted or metadata.get("file_path") in wanted:
+                found.append(ref_doc_id)
+        return found
+
+    def refresh_documents(self, file_paths: Iterable[str]):
+        """
+        (Re)indexes a set of files in bulk.
+
+        Files are loaded and split into CHUNK_SIZE-token chunks across the
+        ingestion process pool, then embedded in large batches and tokenized
+        for the keyword index, all outside the locks. The old nodes of every
+        file are then replaced with the new ones in a single step that holds
+        the index lock exclusively; its vector and keyword changes become
+        visible to queries together when the step ends.
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return
 
-        self.index.insert(doc)
+        with stage("ingest_parse"):
+            nodes = parse_files(file_paths)
+        with stage("ingest_embed"):
+            self._embed_nodes(nodes)
+        term_counts = BM25Index.term_counts(nodes) if self.bm25 is not None else None
+
+        with self._write_lock, self._index_lock.exclusive(), self._index_batch(), stage("index_update"):
+            replaced = self._ref_doc_ids_for(file_paths)
+            for ref_doc_id in replaced:
+                self._delete_ref_doc(ref_doc_id)
+            self.index.insert_nodes(nodes)
+            if self.bm25 is not None:
+                self.bm25.add_nodes(term_counts=term_counts)
+            self._count_text_bytes(nodes)
+        self._invalidate_cache(set(replaced) | set(file_paths))
 
 
     def delete_document(self, file_path: str):
-        self.index.delete_ref_doc(file_path, delete_from_docstore=True)
+        with self._write_lock, self._index_lock.exclusive(), self._index_batch():
+            deleted = self._ref_doc_ids_for([file_path]) or [file_path]
+            for ref_doc_id in deleted:
+                self._delete_ref_doc(ref_doc_id)
+        self._invalidate_cache(deleted)
+
+    @contextmanager
+    def _index_batch(self):
+        """Publishes the vector and keyword changes of the block at its end (see MmapVectorStore.batch)."""
+        with ExitStack() as stack:
+            stack.enter_context(self.index.vector_store.batch())
+            if self.bm25 is not None:
+                stack.enter_context(self.bm25.batch())
+            yield
+
+    def _delete_ref_doc(self, ref_doc_id: str):
+        self.index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        if self.bm25 is not None:
+            self.bm25.remove_document(ref_doc_id)
+        self._text_bytes_total -= self._text_bytes.pop(ref_doc_id, 0)
+
+    def _count_text_bytes(self, nodes):
+        for node in nodes:
+            # Text plus a rough per-node overhead for the node object
+            size = len(node.get_content()) + 1024
+            self._text_bytes[node.ref_doc_id] = self._text_bytes.get(node.ref_doc_id, 0) + size
+            self._text_bytes_total += size
+
+    def _invalidate_cache(self, doc_ids):
+        """Drops cached answers built from these ref doc ids (the ids actually replaced or deleted)."""
+        if self.cache is not None:
+            self.cache.invalidate_documents(doc_ids)
     
-    def persist_index(self):
-        self.index.storage_context.persist(persist_dir=config.STORAGE_DIR)
\ No newline at end of file
+    def persist_index(self, manifest: Optional[dict] = None):
+        """
+        Commits the index, and the file manifest if given, as a new storage
+        generation (see index_storage).
+
+        The previous generation's files are hard-linked and every store
+        writes only what changed since: the docstore appends a change log,
+        the vector store appends its new rows and the keyword index writes
+        its new segments. The new generation only becomes visible through an
+        atomic rename of CURRENT, so a crash at any point leaves the previous
+        index and its matching manifest in place.
+
+        Args:
+            manifest (dict): File manifest describing the indexed files
+                (see sync_service); the previous one is kept when omitted.
+        """
+        with self._write_lock, stage("persist"):
+            with index_storage.Generation(self.storage_dir) as generation:
+                rewrite = {index_storage.MANIFEST_FNAME} if manifest is not None else set()
+                generation.link_unchanged(exclude=rewrite)
+                self._persist_stores(generation.path)
+                if self.bm25 is not None:
+                    self.bm25.persist(generation.path)
+                if manifest is not None:
+                    index_storage.write_json(os.path.join(generation.path, index_storage.MANIFEST_FNAME), manifest)
+
+    def _persist_stores(self, path: str):
+        """Writes the LlamaIndex stores into a generation directory holding links to the previous one."""
+        storage_context = self.index.storage_context
+        storage_context.docstore.persist(os.path.join(path, DOCSTORE_FNAME))
+        self.index.vector_store.persist(os.path.join(path, VECTOR_STORE_FNAME))
+        # Without the node id map, which changes with every update, the index
+        # struct never changes: written once, then linked
+        index_store_path = os.path.join(path, INDEX_STORE_FNAME)
+        if not os.path.exists(index_store_path):
+            struct = self.index.index_struct
+            index_store = SimpleIndexStore()
+            index_store.add_index_struct(IndexDict(index_id=struct.index_id, summary=struct.summary))
+            index_store.persist(index_store_path)
+        # Stores this service leaves empty, kept for the usual directory layout
+        for name, store in (("graph_store.json", storage_context.graph_store),
+                            ("image__vector_store.json", storage_context.vector_stores.get("image"))):
+            if store is not None and not os.path.exists(os.path.join(path, name)):
+                store.persist(os.path.join(path, name))
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate memory held by this collection's index: the embedding
+        matrix, the keyword index and the chunk texts in the docstore.
+
+        Cheap enough to call under the registry lock: the array sizes come
+        from the published snapshots and the text size is a running total.
+        """
+        total = self.index.vector_store.memory_bytes() + self._text_bytes_total
+        if self.bm25 is not None:
+            total += self.bm25.memory_bytes()
+        return total
\ No newline at end of file
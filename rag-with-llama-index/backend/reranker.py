@@ -0,0 +1,74 @@
+from typing import List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+from timings import stage
+
+
+class BudgetedReranker(BaseNodePostprocessor):
+    """
+    Packs the retrieved chunks into a token budget, re-ranking them first
+    when a cross-encoder is configured.
+
+    With a cross-encoder (`model_name`, requires sentence-transformers) an
+    over-fetched candidate list is scored against the query. Without one
+    the retriever's order (dense, or fused with BM25) is kept: scoring by
+    embedding similarity would only repeat dense retrieval and push out
+    keyword-only hits. Chunks are then taken best first until
+    `token_budget` or `top_n` is hit.
+    """
+
+    token_budget: int = 1500
+    top_n: int = 2
+    model_name: Optional[str] = None
+
+    _cross_encoder = PrivateAttr(default=None)
+    _tokenizer = PrivateAttr()
+
+    def __init__(self, cross_encoder=None, **kwargs):
+        super().__init__(**kwargs)
+        self._tokenizer = get_tokenizer()
+        if cross_encoder is not None:
+            # Already loaded model shared with other rerankers
+            self._cross_encoder = cross_encoder
+        elif self.model_name:
+            from sentence_transformers import CrossEncoder
+            self._cross_encoder = CrossEncoder(self.model_name)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BudgetedReranker"
+
+    @property
+    def rescores(self) -> bool:
+        """True when candidates are re-scored (worth over-fetching them)."""
+        return self._cross_encoder is not None
+
+    def _rerank(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> List[NodeWithScore]:
+        texts = [n.node.get_content(metadata_mode=MetadataMode.LLM) for n in nodes]
+        scores = np.asarray(self._cross_encoder.predict([(query_bundle.query_str, t) for t in texts]))
+        return [NodeWithScore(node=nodes[i].node, score=float(scores[i]))
+                for i in np.argsort(-scores, kind="stable")]
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+        with stage("rerank"):
+            if self.rescores and query_bundle is not None:
+                nodes = self._rerank(nodes, query_bundle)
+            packed, used = [], 0
+            for node in nodes:
+                tokens = len(self._tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+                # Always keep the best chunk, even if it alone exceeds the budget
+                if packed and used + tokens > self.token_budget:
+                    continue
+                packed.append(node)
+                used += tokens
+                if len(packed) >= self.top_n:
+                    break
+        return packed
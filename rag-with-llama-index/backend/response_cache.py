@@ -0,0 +1,180 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from timings import stage
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case- and whitespace-insensitive cache key for a prompt."""
+    return " ".join(prompt.lower().split())
+
+
+class _Entry:
+    __slots__ = ("answer", "doc_ids", "embedding", "created")
+
+    def __init__(self, answer: str, doc_ids: frozenset, embedding: Optional[np.ndarray]):
+        self.answer = answer
+        self.doc_ids = doc_ids
+        self.embedding = embedding
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache in front of the query engine.
+
+    Tier 1 is an exact-match LRU on the normalized prompt. Tier 2 compares the
+    prompt embedding against all cached prompts and returns the best answer
+    whose cosine similarity is above the threshold. Entries expire after
+    `ttl_seconds`, the least recently used entry is evicted beyond
+    `max_entries`, and entries can be invalidated per source document.
+
+    Every invalidation starts a new generation. An answer is only stored if
+    no invalidation happened since the caller read `generation` (before it
+    retrieved), so an answer built from replaced content is not cached
+    after that content's invalidation has already run.
+    """
+
+    def __init__(self, embed_model, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95):
+        self.embed_model = embed_model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Stacked embeddings of all entries, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Number of invalidations so far; read it before retrieving and pass it to put()."""
+        return self._generation
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - entry.created > self.ttl_seconds
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _semantic_lookup(self, embedding: np.ndarray) -> Optional[str]:
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            if not self._matrix_keys:
+                return None
+            self._matrix = np.stack([self._entries[k].embedding for k in self._matrix_keys])
+        if not self._matrix_keys:
+            return None
+        scores = self._matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._matrix_keys[best]
+
+    def embed(self, prompt: str) -> np.ndarray:
+        """Returns the unit-length query embedding for a prompt."""
+        with stage("embed_query"):
+            vector = np.asarray(self.embed_model.get_query_embedding(prompt), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, prompt: str, embedding: Optional[np.ndarray] = None) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Looks up a cached answer for the prompt.
+
+        Args:
+            prompt (str): The user's query.
+            embedding (np.ndarray): Unit-length query embedding computed by
+                the caller (e.g. for a whole batch); embedded here if omitted.
+
+        Returns:
+            tuple: (answer or None, query embedding or None). On a semantic-tier
+            miss the computed embedding is returned so the caller can reuse it
+            for retrieval instead of embedding the prompt a second time.
+        """
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._entries.move_to_end(key)
+                    self.stats["exact_hits"] += 1
+                    return entry.answer, None
+                self._remove(key)
+            has_candidates = any(e.embedding is not None for e in self._entries.values())
+
+        if self.similarity_threshold >= 1 or self.embed_model is None:
+            embedding = None
+        elif embedding is None:
+            embedding = self.embed(prompt)
+
+        with self._lock:
+            if embedding is not None and has_candidates:
+                match = self._semantic_lookup(embedding)
+                if match is not None:
+                    entry = self._entries.get(match)
+                    if entry is not None and not self._expired(entry):
+                        self._entries.move_to_end(match)
+                        self.stats["semantic_hits"] += 1
+                        return entry.answer, embedding.tolist()
+                    self._remove(match)
+            self.stats["misses"] += 1
+        return None, embedding.tolist() if embedding is not None else None
+
+    def put(self, prompt: str, answer: str, doc_ids: Iterable[str], embedding: Optional[List[float]] = None,
+            generation: Optional[int] = None) -> bool:
+        """
+        Stores an answer together with the ids of the documents it was built from.
+
+        Args:
+            generation (int): `generation` read before the answer's context
+                was retrieved; the answer is dropped if an invalidation ran since.
+
+        Returns:
+            bool: False if the answer was dropped as possibly stale.
+        """
+        key = normalize_prompt(prompt)
+        vector = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[key] = _Entry(answer, frozenset(doc_ids), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+        return True
+
+    def invalidate_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Drops every answer built from one of the given documents. Answers that
+        had no sources at all are dropped too, since a new or changed document
+        may now be able to answer them.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        doc_ids = set(doc_ids)
+        with self._lock:
+            self._generation += 1
+            stale = [k for k, e in self._entries.items() if not e.doc_ids or e.doc_ids & doc_ids]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
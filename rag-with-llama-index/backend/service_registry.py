@@ -0,0 +1,146 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import config
+from metrics import COLLECTION_LOADS, COLLECTION_EVICTIONS
+from rag_service import RAGService, collection_dirs
+from sync_service import sync_data_directory
+
+
+class UnknownCollectionError(KeyError):
+    """Raised for a collection that has neither a data nor a storage directory."""
+
+
+class ServiceRegistry:
+    """
+    One RAGService per collection, loaded on first use.
+
+    Loaded services are kept in least-recently-used order. After a load, the
+    coldest services are unloaded until the estimated index memory fits
+    COLLECTION_MEMORY_BUDGET_MB and at most MAX_LOADED_COLLECTIONS remain.
+    Pinned services (e.g. one kept in sync by a watcher) are never unloaded.
+    Requests still holding an unloaded service finish normally; its memory is
+    released once the last reference is gone.
+    """
+
+    def __init__(self, memory_budget_bytes: Optional[int] = None, max_loaded: Optional[int] = None):
+        if memory_budget_bytes is None:
+            memory_budget_bytes = int(config.COLLECTION_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_loaded = max_loaded if max_loaded is not None else config.MAX_LOADED_COLLECTIONS
+        self._services: "OrderedDict[str, RAGService]" = OrderedDict()
+        self._pinned = set()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(collection: str) -> bool:
+        """True if the collection has a data or storage directory (raises ValueError for bad names)."""
+        data_dir, storage_dir = collection_dirs(collection)
+        return os.path.isdir(data_dir) or os.path.isdir(storage_dir)
+
+    @staticmethod
+    def available() -> List[str]:
+        """Names of all collections on disk, default first."""
+        names = [config.DEFAULT_COLLECTION]
+        if os.path.isdir(config.COLLECTIONS_DIR):
+            for name in sorted(os.listdir(config.COLLECTIONS_DIR)):
+                try:
+                    if name != config.DEFAULT_COLLECTION and ServiceRegistry.exists(name):
+                        names.append(name)
+                except ValueError:
+                    continue
+        return names
+
+    def add(self, service: RAGService, pinned: bool = False):
+        """Registers an already built service."""
+        with self._lock:
+            self._services[service.collection] = service
+            self._services.move_to_end(service.collection)
+            if pinned:
+                self._pinned.add(service.collection)
+            self._enforce_budget(keep=service.collection)
+
+    def loaded(self) -> List[RAGService]:
+        with self._lock:
+            return list(self._services.values())
+
+    def get(self, collection: str) -> RAGService:
+        """
+        Returns the service of a collection, loading (and syncing) it on first use.
+
+        Raises:
+            ValueError: If the collection name is invalid.
+            UnknownCollectionError: If the collection does not exist.
+        """
+        with self._lock:
+            service = self._services.get(collection)
+            if service is not None:
+                self._services.move_to_end(collection)
+                return service
+        # Checked before a load lock is created, so unknown names leave nothing behind
+        if not self.exists(collection):
+            raise UnknownCollectionError(collection)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(collection, threading.Lock())
+
+        # Concurrent first requests for the same collection load it only once
+        with load_lock:
+            with self._lock:
+                service = self._services.get(collection)
+                if service is not None:
+                    self._services.move_to_end(collection)
+                    return service
+            try:
+                service = RAGService(collection)
+                sync_data_directory(service)
+            except BaseException:
+                with self._lock:
+                    self._load_locks.pop(collection, None)
+                raise
+            COLLECTION_LOADS.inc()
+            with self._lock:
+                self._services[collection] = service
+                self._enforce_budget(keep=collection)
+        return service
+
+    def evict(self, collection: str) -> bool:
+        """Unloads a collection; returns False if it was not loaded or is pinned."""
+        with self._lock:
+            if collection in self._pinned or collection not in self._services:
+                return False
+            del self._services[collection]
+        COLLECTION_EVICTIONS.inc()
+        print(f"Unloaded collection '{collection}'.")
+        return True
+
+    def _enforce_budget(self, keep: str):
+        """Unloads least recently used services until the limits hold (caller holds the lock)."""
+        def over_budget():
+            total = sum(s.memory_bytes() for s in self._services.values())
+            return len(self._services) > self.max_loaded or total > self.memory_budget_bytes
+
+        while over_budget():
+            victim = next(
+                (name for name in self._services if name != keep and name not in self._pinned), None
+            )
+            if victim is None:
+                break
+            del self._services[victim]
+            COLLECTION_EVICTIONS.inc()
+            print(f"Unloaded collection '{victim}' to stay within the memory budget.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            services = list(self._services.items())
+            pinned = set(self._pinned)
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "max_loaded": self.max_loaded,
+            "loaded": [
+                {"collection": name, "memory_bytes": s.memory_bytes(), "pinned": name in pinned}
+                for name, s in services
+            ],
+        }
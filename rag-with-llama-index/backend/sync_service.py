@@ -2,64 +2,154 @@ import os
 import time
 import json
 import hashlib
-import sync_service
+from concurrent.futures import ThreadPoolExecutor
 import config
 from rag_service import RAGService
+from timings import stage
 
 def get_file_hash(file_path: str) -> str:
-    """Computes the SHA-256 hash of a file's content."""
+    """Computes the SHA-256 hash of a file's content, reading it in fixed-size blocks."""
     hasher = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        buf = f.read()
-        hasher.update(buf)
+        for block in iter(lambda: f.read(config.HASH_CHUNK_SIZE), b''):
+            hasher.update(block)
     return hasher.hexdigest()
 
-def sync_data_directory():
-    print("Starting data synchronization job...")
+def _stat_entry(st: os.stat_result) -> dict:
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "inode": st.st_ino}
+
+def _is_unchanged(entry, st: os.stat_result) -> bool:
+    """True when the manifest entry's mtime, size and inode all match the file."""
+    if not isinstance(entry, dict):
+        return False  # Legacy manifest entry (hash only), needs hashing once
+    return (
+        entry.get("mtime_ns") == st.st_mtime_ns
+        and entry.get("size") == st.st_size
+        and entry.get("inode") == st.st_ino
+    )
+
+def _entry_hash(entry) -> str:
+    return entry.get("hash") if isinstance(entry, dict) else entry
+
+def scan_data_directory(manifest: dict, data_dir: str = config.DATA_DIR):
+    """
+    Compares a data directory (DATA_DIR by default) against the manifest.
+
+    Files whose mtime, size and inode match the manifest are skipped without
+    being read; the remaining files are hashed in parallel.
+
+    Returns:
+        tuple: (current, changed) where `current` maps every file on disk to
+        its new manifest entry and `changed` lists files whose content hash
+        differs from the manifest (new or modified files).
+
+    Raises:
+        FileNotFoundError: the data directory does not exist. An absent
+            directory (e.g. an unmounted volume) is not an empty one: treating
+            it as empty would delete every indexed document.
+    """
+    current = {}
+    to_hash = []
+    with os.scandir(data_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(".txt") or not entry.is_file():
+                continue
+            file_path = os.path.join(data_dir, entry.name)
+            st = entry.stat()
+            old = manifest.get(file_path)
+            if _is_unchanged(old, st):
+                current[file_path] = old
+            else:
+                to_hash.append((file_path, st))
+
+    changed = []
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=config.SYNC_HASH_WORKERS) as pool:
+            hashes = pool.map(lambda item: get_file_hash(item[0]), to_hash)
+            for (file_path, st), file_hash in zip(to_hash, hashes):
+                current[file_path] = {"hash": file_hash, **_stat_entry(st)}
+                if _entry_hash(manifest.get(file_path)) != file_hash:
+                    changed.append(file_path)
+    return current, changed
+
+def load_manifest(path: str = config.INDEX_MANIFEST_FILE) -> dict:
+    """Loads the manifest of currently indexed files."""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
 
-    rag = RAGService()
+def apply_changes(rag: RAGService, manifest: dict):
+    """
+    Applies new, modified and deleted files in the service's data directory
+    to its index without persisting anything.
 
-    # Load the manifest of currently indexed files
-    manifest = {}
-    if os.path.exists(config.INDEX_MANIFEST_FILE):
-        with open(config.INDEX_MANIFEST_FILE, 'r') as f:
-            manifest = json.load(f)
-    
+    Returns:
+        tuple: (new_manifest, changed_files, deleted_files)
+
+    Raises:
+        FileNotFoundError: the data directory does not exist (nothing is changed).
+    """
     # Get the current state of files in the data directory
-    current_files = {}
-    for filename in os.listdir(config.DATA_DIR):
-        file_path = os.path.join(config.DATA_DIR, filename)
-        if os.path.isfile(file_path) and filename.endswith(".txt"):
-            current_files[file_path] = get_file_hash(file_path)
-    
-    indexed_files = set(manifest.keys())
-    disk_files = set(current_files.keys())  
+    with stage("sync_scan"):
+        current_files, changed_files = scan_data_directory(manifest, rag.data_dir)
 
     # --- Step 1: Handle deleted files ---
-    deleted_files = indexed_files - disk_files
-    for file_path in deleted_files:
-        rag.delete_document(file_path)
-        del manifest[file_path]  
+    deleted_files = set(manifest.keys()) - set(current_files.keys())
+    with stage("sync_delete"):
+        for file_path in deleted_files:
+            rag.delete_document(file_path)
 
     # --- Step 2: Handle new or modified files ---
-    for file_path, file_hash in current_files.items():
-        # Check if the file is new or if its content has changed
-        if file_path not in manifest or manifest[file_path] != file_hash:
-            rag.refresh_document(file_path)
-            manifest[file_path] = file_hash
+    # Files just indexed by a fresh build of this service are already current
+    changed_files = [fp for fp in changed_files if fp not in rag.built_files]
+    rag.built_files.clear()
+    with stage("sync_index"):
+        rag.refresh_documents(changed_files)
+
+    return current_files, changed_files, deleted_files
+
+def sync_data_directory(rag: RAGService = None):
+    """
+    Brings the index in line with the files in its collection's data directory.
+
+    Args:
+        rag (RAGService): Service whose index is updated. Pass the running
+            instance to avoid loading the embedding model and index twice;
+            a new one is created when omitted.
+    """
+    print("Starting data synchronization job...")
+    started = time.perf_counter()
+
+    if rag is None:
+        rag = RAGService()
+
+    # Storage-only collections, or a DATA_DIR that is not mounted: keep the
+    # persisted index as it is rather than deleting everything it contains
+    if not os.path.isdir(rag.data_dir):
+        print(f"Data directory {rag.data_dir} does not exist; skipping synchronization.")
+        return
+
+    manifest = load_manifest(rag.manifest_file)
+    current_files, changed_files, deleted_files = apply_changes(rag, manifest)
 
     # --- Step 3: Persist changes ---
-    if deleted_files or (disk_files - indexed_files) or any(current_files[fp] != manifest.get(fp) for fp in disk_files):
-        rag.persist_index()
-        # Save the updated manifest
-        with open(config.INDEX_MANIFEST_FILE, 'w') as f:
-            json.dump(manifest, f, indent=4)
-        print("Data synchronization complete. Changes were made.")
+    # The index and the updated manifest (which also records new mtimes of
+    # touched-but-unchanged files) are committed together
+    if deleted_files or changed_files or current_files != manifest:
+        rag.persist_index(manifest=current_files)
+    if deleted_files or changed_files:
+        print(f"Data synchronization complete. {len(changed_files)} new or modified, "
+              f"{len(deleted_files)} deleted.")
     else:
         print("Data synchronization complete. No changes detected.")
 
-    print("Data synchronization job completed.")
+    print(f"Data synchronization job completed in {time.perf_counter() - started:.2f}s.")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Sync a collection's index with its data directory.")
+    parser.add_argument("--collection", default=config.DEFAULT_COLLECTION)
+    args = parser.parse_args()
     # Run the sync job once immediately on startup
-    sync_data_directory()
+    sync_data_directory(RAGService(args.collection))
@@ -0,0 +1,63 @@
+import os
+import re
+import sys
+import zlib
+
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+# The backend modules import each other by their flat names (as api.py does)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WordEmbedding(BaseEmbedding):
+    """Bag-of-words embedding: texts sharing words are similar (no model download)."""
+
+    @staticmethod
+    def _vector(text: str):
+        vector = [0.0] * 64
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+    def _get_query_embedding(self, query: str):
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str):
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str):
+        return self._vector(text)
+
+
+@pytest.fixture
+def rag_env(tmp_path, monkeypatch):
+    """
+    Points the data, storage, log and cache paths at a temp directory and
+    gives RAGService models that need no download or API key.
+
+    Returns:
+        The data directory of the default collection.
+    """
+    # rag_service imports the OpenAI and HuggingFace integrations
+    pytest.importorskip("llama_index.llms.openai")
+    pytest.importorskip("llama_index.embeddings.huggingface")
+    from llama_index.core.llms import MockLLM
+
+    import config
+    import rag_service
+
+    files = tmp_path / "files"
+    for name in ("DATA_DIR", "STORAGE_DIR", "COLLECTIONS_DIR", "LOG_DIR", "CACHE_DIR"):
+        monkeypatch.setattr(config, name, str(files / name[:-4].lower()))
+    monkeypatch.setattr(config, "INDEX_MANIFEST_FILE", str(files / "storage" / "index_manifest.json"))
+    monkeypatch.setattr(config, "EMBED_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "INGEST_WORKERS", 1)
+    monkeypatch.setattr(config, "RERANK_MODEL", "")
+    monkeypatch.setattr(rag_service, "_shared", {
+        "embed_model": WordEmbedding(embed_batch_size=8),
+        "llm": MockLLM(max_tokens=8),
+    })
+    data_dir = files / "data"
+    data_dir.mkdir(parents=True)
+    return data_dir
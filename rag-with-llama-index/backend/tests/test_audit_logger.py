@@ -0,0 +1,48 @@
+import pytest
+
+import config
+import audit_logger
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """A writer with a one-slot queue that spills, not started until the test starts it."""
+    monkeypatch.setattr(config, "AUDIT_DB_FILE", str(tmp_path / "audit_log.db"))
+    monkeypatch.setattr(config, "AUDIT_LOG_FILE", str(tmp_path / "audit_log.csv"))
+    monkeypatch.setattr(config, "AUDIT_SPILL_FILE", str(tmp_path / "audit_spill.jsonl"))
+    monkeypatch.setattr(config, "AUDIT_BACKPRESSURE", "spill")
+    monkeypatch.setattr(config, "AUDIT_QUEUE_SIZE", 1)
+    monkeypatch.setattr(audit_logger, "_conn", None)
+    writer = audit_logger._AuditWriter()
+    writer._ensure_started = lambda: None
+    monkeypatch.setattr(audit_logger, "_writer", writer)
+    yield writer
+    writer.shutdown()
+    audit_logger._conn.close()
+
+
+def start(writer):
+    del writer._ensure_started
+    writer._ensure_started()
+
+
+def feedback_of(log_id):
+    row = audit_logger._conn.execute("SELECT feedback FROM audit_log WHERE id = ?", (log_id,)).fetchone()
+    return row and row[0]
+
+
+def test_feedback_on_queued_and_spilled_entries_lands_after_their_inserts(writer):
+    queued = audit_logger.log_query("first", "answer")
+    spilled = audit_logger.log_query("second", "answer")
+    assert writer.metrics()["spilled"] == 1
+    assert audit_logger.log_feedback(queued, "like")
+    assert audit_logger.log_feedback(spilled, "dislike")
+    start(writer)
+    audit_logger.flush()
+    assert (feedback_of(queued), feedback_of(spilled)) == ("like", "dislike")
+
+
+def test_feedback_on_unknown_entry_is_reported(writer):
+    start(writer)
+    assert not audit_logger.log_feedback("no-such-id", "like")
+    assert not audit_logger.log_feedback(audit_logger.log_query("prompt", "answer"), "meh")
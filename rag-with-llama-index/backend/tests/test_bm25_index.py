@@ -0,0 +1,217 @@
+import os
+import math
+import threading
+
+import pytest
+
+from bm25_index import BM25_FNAME, DELETED_FNAME, SEGMENTS_FNAME, BM25Index, tokenize
+
+
+def build(docs):
+    """docs: (node_id, ref_doc_id, text) triples."""
+    index = BM25Index()
+    for node_id, ref_doc_id, text in docs:
+        index.add(node_id, ref_doc_id, text)
+    return index
+
+
+DOCS = [
+    ("n1", "a.txt", "The invoice AB-1234 was paid in March."),
+    ("n2", "a.txt", "Refunds are processed within five days."),
+    ("n3", "b.txt", "Part_no_7 replaces part number 6 in version v2.1."),
+    ("n4", "c.txt", "Invoices and refunds: see the finance handbook."),
+]
+
+
+# --- Tokenization ---
+
+def test_tokenize_lowercases_and_keeps_identifiers_whole():
+    tokens = tokenize("Invoice AB-1234 for v2.1")
+    assert tokens[:3] == ["invoice", "ab-1234", "for"]
+    assert "v2.1" in tokens
+
+
+def test_tokenize_also_indexes_identifier_parts():
+    tokens = tokenize("part_no_7 and AB-1234")
+    assert {"part_no_7", "ab-1234", "part", "no", "7", "ab", "1234"} <= set(tokens)
+    # Plain words are not split again
+    assert tokens.count("and") == 1
+
+
+def test_tokenize_drops_punctuation():
+    assert tokenize("Hello, world!?") == ["hello", "world"]
+
+
+# --- Scoring ---
+
+def test_search_finds_identifier_and_its_parts():
+    index = build(DOCS)
+    assert index.search("AB-1234", top_k=1)[0][0] == "n1"
+    assert index.search("1234", top_k=1)[0][0] == "n1"
+    assert index.search("part_no_7", top_k=1)[0][0] == "n3"
+
+
+def test_idf_matches_bm25_formula():
+    index = build([("n1", "a", "apple banana"), ("n2", "b", "apple cherry"), ("n3", "c", "date")])
+    (node_id, score), = index.search("banana", top_k=5)
+    assert node_id == "n1"
+    n, df, tf, length = 3, 1, 1, 2
+    avg_len = (2 + 2 + 1) / 3
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    norm = index.k1 * (1 - index.b + index.b * length / avg_len)
+    assert score == pytest.approx(idf * tf * (index.k1 + 1) / (tf + norm), rel=1e-5)
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = build([("n1", "a", "common rare"), ("n2", "b", "common"), ("n3", "c", "common")])
+    scores = dict(index.search("common rare", top_k=3))
+    assert max(scores, key=scores.get) == "n1"
+    assert scores["n1"] > 2 * scores["n2"]
+
+
+def test_search_respects_top_k_and_orders_by_score():
+    index = build(DOCS)
+    hits = index.search("invoice refunds finance", top_k=2)
+    assert len(hits) == 2
+    assert hits[0][1] >= hits[1][1]
+    assert index.search("nothing matches this", top_k=5) == []
+
+
+def test_remove_document_drops_its_chunks_from_results_and_statistics():
+    index = build(DOCS)
+    index.remove_document("a.txt")
+    assert len(index) == 2
+    assert all(node_id not in ("n1", "n2") for node_id, _ in index.search("invoice refunds", top_k=10))
+    # IDF only counts live chunks: the same as an index built without a.txt
+    fresh = build(DOCS[2:])
+    assert index.search("refunds", top_k=5) == pytest.approx(fresh.search("refunds", top_k=5))
+
+
+def test_empty_index_returns_nothing():
+    assert BM25Index().search("anything") == []
+
+
+# --- Persistence ---
+
+def test_persist_load_round_trip(tmp_path):
+    index = build(DOCS)
+    index.persist(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded) == len(index)
+    for query in ("AB-1234", "refunds", "part number", "v2.1 finance"):
+        assert loaded.search(query, top_k=10) == pytest.approx(index.search(query, top_k=10))
+
+
+def test_persist_compacts_removed_chunks(tmp_path):
+    index = build(DOCS)
+    index.remove_document("a.txt")
+    expected = index.search("refunds invoices part", top_k=10)
+    index.persist(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded) == 2
+    assert loaded.search("refunds invoices part", top_k=10) == pytest.approx(expected)
+    assert loaded.search("AB-1234") == []
+
+
+def test_adds_after_load_are_searchable_and_persisted(tmp_path):
+    index = build(DOCS[:2])
+    index.persist(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    loaded.add("n5", "d.txt", "Quarterly invoice summary")
+    loaded.remove_document("a.txt")
+    assert [node_id for node_id, _ in loaded.search("invoice")] == ["n5"]
+    loaded.persist(str(tmp_path))
+    again = BM25Index.load(str(tmp_path))
+    assert [node_id for node_id, _ in again.search("invoice")] == ["n5"]
+    assert len(again) == 1
+
+
+def test_load_without_index_returns_none(tmp_path):
+    assert BM25Index.load(str(tmp_path)) is None
+
+
+def test_unchanged_index_is_not_rewritten(tmp_path):
+    index = build(DOCS)
+    index.persist(str(tmp_path))
+    before = {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()}
+    loaded = BM25Index.load(str(tmp_path))
+    loaded.persist(str(tmp_path))
+    assert {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()} == before
+
+
+def segment_files(directory):
+    return {path.name for path in directory.iterdir() if path.name.startswith("bm25-")}
+
+
+def test_persist_writes_only_new_segments(tmp_path):
+    index = build(DOCS)
+    index.persist(str(tmp_path))
+    first = segment_files(tmp_path)
+    loaded = BM25Index.load(str(tmp_path))
+    loaded.add("n9", "d.txt", "a fresh invoice")
+    loaded.remove_document("b.txt")
+    loaded.persist(str(tmp_path))
+    assert first < segment_files(tmp_path)
+    assert (tmp_path / DELETED_FNAME).exists()
+    again = BM25Index.load(str(tmp_path))
+    assert again.search("invoice") == loaded.search("invoice")
+    assert len(again) == len(loaded)
+
+
+def test_index_is_renumbered_once_many_chunks_are_removed(tmp_path):
+    index = build([(f"n{i}", f"doc{i % 4}.txt", f"word{i} shared") for i in range(40)])
+    index.persist(str(tmp_path))
+    index.remove_document("doc0.txt")
+    index.remove_document("doc1.txt")
+    index.persist(str(tmp_path))
+    assert len(segment_files(tmp_path)) == 1
+    assert not (tmp_path / DELETED_FNAME).exists()
+    loaded = BM25Index.load(str(tmp_path))
+    assert len(loaded.node_ids) == 20
+    assert {node_id for node_id, _ in loaded.search("shared", top_k=40)} == \
+        {f"n{i}" for i in range(40) if i % 4 > 1}
+
+
+def test_single_file_of_older_versions_is_loaded_and_replaced(tmp_path):
+    index = BM25Index()
+    with index.batch():  # one segment, laid out like the single file
+        for node_id, ref_doc_id, text in DOCS:
+            index.add(node_id, ref_doc_id, text)
+    index.persist(str(tmp_path))
+    segment = next(iter(segment_files(tmp_path)))
+    os.replace(tmp_path / segment, tmp_path / BM25_FNAME)
+    os.remove(tmp_path / SEGMENTS_FNAME)
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.search("invoice") == index.search("invoice")
+    loaded.persist(str(tmp_path))
+    assert not (tmp_path / BM25_FNAME).exists() and (tmp_path / SEGMENTS_FNAME).exists()
+
+
+def test_searches_see_whole_batches_while_another_thread_updates(tmp_path):
+    index = build([(f"n{i}", f"doc{i % 4}.txt", f"shared word{i}") for i in range(40)])
+    stop, errors, seen = threading.Event(), [], set()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                seen.add(len(index.search("shared", top_k=100)))
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for round_ in range(200):
+        ref_doc_id = f"doc{round_ % 4}.txt"
+        with index.batch():
+            index.remove_document(ref_doc_id)
+            for i in range(10):
+                index.add(f"r{round_}-{i}", ref_doc_id, f"shared round{round_}")
+        if round_ % 20 == 0:
+            index.persist(str(tmp_path))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert seen == {40}
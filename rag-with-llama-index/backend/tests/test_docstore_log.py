@@ -0,0 +1,70 @@
+import os
+
+from llama_index.core.schema import TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+import docstore_log
+from docstore_log import LogKVStore, log_files
+
+
+def docstore(path=None):
+    return SimpleDocumentStore(LogKVStore.from_persist_path(path) if path else LogKVStore())
+
+
+def nodes(*ids):
+    return [TextNode(id_=node_id, text=f"text of {node_id} " * 20) for node_id in ids]
+
+
+def test_changes_are_appended_as_logs_and_replayed(tmp_path):
+    path = str(tmp_path / "docstore.json")
+    store = docstore()
+    store.add_documents(nodes("a", "b", "c"))
+    store.persist(path)
+    base = os.stat(path).st_mtime_ns
+
+    loaded = docstore(path)
+    loaded.add_documents(nodes("d"))
+    loaded.delete_document("b")
+    loaded.persist(path)
+    assert os.stat(path).st_mtime_ns == base
+    assert [os.path.basename(p) for p in log_files(path)] == ["docstore.log-000001.jsonl"]
+
+    again = docstore(path)
+    assert set(again.docs) == {"a", "c", "d"}
+    assert again.get_node("d").get_content() == nodes("d")[0].get_content()
+
+
+def test_unchanged_store_writes_nothing(tmp_path):
+    path = str(tmp_path / "docstore.json")
+    store = docstore()
+    store.add_documents(nodes("a"))
+    store.persist(path)
+    before = sorted(os.listdir(tmp_path))
+    docstore(path).persist(path)
+    assert sorted(os.listdir(tmp_path)) == before
+
+
+def test_logs_are_folded_into_the_base_once_large(tmp_path, monkeypatch):
+    monkeypatch.setattr(docstore_log, "_MAX_LOGS", 3)
+    path = str(tmp_path / "docstore.json")
+    store = docstore()
+    store.add_documents(nodes(*[f"n{i}" for i in range(50)]))
+    store.persist(path)
+    for i in range(3):
+        store.add_documents(nodes(f"extra{i}"))
+        store.persist(path)
+    assert len(log_files(path)) == 3
+    store.add_documents(nodes("last"))
+    store.persist(path)
+    assert log_files(path) == []
+    assert len(docstore(path).docs) == 54
+
+
+def test_other_directory_gets_a_full_base(tmp_path):
+    store = docstore()
+    store.add_documents(nodes("a"))
+    store.persist(str(tmp_path / "one" / "docstore.json"))
+    store.add_documents(nodes("b"))
+    store.persist(str(tmp_path / "two" / "docstore.json"))
+    assert log_files(str(tmp_path / "two" / "docstore.json")) == []
+    assert set(docstore(str(tmp_path / "two" / "docstore.json")).docs) == {"a", "b"}
@@ -0,0 +1,102 @@
+import asyncio
+from typing import List
+
+import pytest
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from bm25_index import BM25Index
+from hybrid_retriever import HybridRetriever
+
+RRF_K = 60
+
+
+class FixedRetriever(BaseRetriever):
+    """Returns the same ranked nodes for every query."""
+
+    def __init__(self, nodes: List[TextNode]):
+        super().__init__()
+        self.nodes = nodes
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return [NodeWithScore(node=node, score=1.0 - i * 0.1) for i, node in enumerate(self.nodes)]
+
+
+@pytest.fixture
+def nodes():
+    texts = {
+        "v1": "Semantic match about payment terms.",
+        "v2": "Another semantic match about billing.",
+        "k1": "Error code E-4711 means the disk is full.",
+        "both": "Payment failed with error code E-4711.",
+    }
+    return {node_id: TextNode(id_=node_id, text=text) for node_id, text in texts.items()}
+
+
+def make_retriever(nodes, vector_order, top_k=4, docstore_ids=None):
+    docstore = SimpleDocumentStore()
+    docstore.add_documents([nodes[i] for i in (docstore_ids or nodes)])
+    bm25 = BM25Index()
+    for node in nodes.values():
+        bm25.add(node.node_id, None, node.get_content())
+    vector = FixedRetriever([nodes[i] for i in vector_order])
+    return HybridRetriever(vector, bm25, docstore, top_k=top_k, keyword_top_k=10, rrf_k=RRF_K)
+
+
+def test_node_found_by_both_retrievers_ranks_first(nodes):
+    retriever = make_retriever(nodes, ["v1", "v2", "both"])
+    results = retriever.retrieve("E-4711")
+    assert results[0].node.node_id == "both"
+
+
+def test_scores_are_reciprocal_rank_sums(nodes):
+    retriever = make_retriever(nodes, ["v1", "both"])
+    keyword_ranks = [node_id for node_id, _ in retriever.bm25.search("E-4711", 10)]
+    scores = {hit.node.node_id: hit.score for hit in retriever.retrieve("E-4711")}
+
+    def expected(node_id, vector_rank):
+        score = 1.0 / (RRF_K + vector_rank) if vector_rank else 0.0
+        if node_id in keyword_ranks:
+            score += 1.0 / (RRF_K + keyword_ranks.index(node_id) + 1)
+        return score
+
+    assert scores["v1"] == pytest.approx(expected("v1", 1))
+    assert scores["both"] == pytest.approx(expected("both", 2))
+    assert scores["k1"] == pytest.approx(expected("k1", 0))
+
+
+def test_keyword_only_hits_are_loaded_from_the_docstore(nodes):
+    retriever = make_retriever(nodes, ["v1"])
+    results = retriever.retrieve("disk full")
+    k1 = next(hit for hit in results if hit.node.node_id == "k1")
+    assert k1.node.get_content() == nodes["k1"].get_content()
+
+
+def test_keyword_hits_missing_from_the_docstore_are_skipped(nodes):
+    retriever = make_retriever(nodes, ["v1"], docstore_ids=["v1", "v2", "both"])
+    assert "k1" not in [hit.node.node_id for hit in retriever.retrieve("disk full")]
+
+
+def test_results_are_cut_to_top_k(nodes):
+    retriever = make_retriever(nodes, ["v1", "v2", "both", "k1"], top_k=2)
+    assert len(retriever.retrieve("payment E-4711")) == 2
+
+
+def test_fuse_accepts_precomputed_vector_hits(nodes):
+    retriever = make_retriever(nodes, [])
+    hits = [NodeWithScore(node=nodes["v2"], score=0.9)]
+    fused = retriever.fuse(hits, "billing")
+    assert fused[0].node.node_id == "v2"
+    assert fused[0].score == pytest.approx(2.0 / (RRF_K + 1))
+
+
+async def _aretrieve(retriever, query):
+    return await retriever.aretrieve(query)
+
+
+def test_async_retrieve_matches_sync(nodes):
+    retriever = make_retriever(nodes, ["v1", "v2", "both"])
+    sync = [(hit.node.node_id, hit.score) for hit in retriever.retrieve("E-4711 payment")]
+    result = asyncio.run(_aretrieve(retriever, "E-4711 payment"))
+    assert [(hit.node.node_id, hit.score) for hit in result] == sync
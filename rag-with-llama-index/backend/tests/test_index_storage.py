@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+import config
+import index_storage
+from index_storage import COMMIT_FNAME, CURRENT_FNAME, Generation
+
+
+def commit(storage_dir, files, exclude=()):
+    """Commits a generation holding `files` (name -> content) on top of linked unchanged ones."""
+    with Generation(storage_dir) as generation:
+        generation.link_unchanged(exclude=set(exclude) | set(files))
+        for name, content in files.items():
+            with open(os.path.join(generation.path, name), "w", encoding="utf-8") as f:
+                f.write(content)
+    return generation.path
+
+
+def read(directory, name):
+    with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_commit_switches_current_and_links_unchanged_files(tmp_path):
+    storage = str(tmp_path)
+    first = commit(storage, {"a.json": "a1", "b.json": "b1"})
+    second = commit(storage, {"b.json": "b2"})
+    assert index_storage.current_generation(storage) == second
+    assert read(tmp_path, CURRENT_FNAME).strip() == os.path.basename(second)
+    assert os.stat(os.path.join(first, "a.json")).st_ino == os.stat(os.path.join(second, "a.json")).st_ino
+    assert (read(first, "b.json"), read(second, "b.json")) == ("b1", "b2")
+    with open(os.path.join(second, COMMIT_FNAME), "r", encoding="utf-8") as f:
+        assert set(json.load(f)["files"]) == {"a.json", "b.json"}
+
+
+def test_failed_generation_is_discarded(tmp_path):
+    storage = str(tmp_path)
+    first = commit(storage, {"a.json": "a1"})
+    with pytest.raises(RuntimeError):
+        with Generation(storage) as generation:
+            generation.link_unchanged()
+            raise RuntimeError("crash while writing")
+    assert not os.path.exists(generation.path)
+    assert index_storage.current_generation(storage) == first
+
+
+def test_recover_removes_uncommitted_and_newer_generations(tmp_path):
+    storage = str(tmp_path)
+    committed = commit(storage, {"a.json": "a1"})
+    incomplete = tmp_path / "gen-000007"
+    incomplete.mkdir()
+    (incomplete / "a.json").write_text("{")
+    index_storage.recover(storage)
+    assert not incomplete.exists()
+    assert index_storage.resolve(storage) == committed
+
+
+def test_damaged_current_falls_back_to_previous_generation(tmp_path):
+    storage = str(tmp_path)
+    first = commit(storage, {"a.json": "a1"})
+    second = commit(storage, {"a.json": "a2-longer"})
+    with open(os.path.join(second, "a.json"), "w", encoding="utf-8") as f:
+        f.write("a")  # truncated
+    assert index_storage.current_generation(storage) == first
+
+
+def test_files_appended_by_a_newer_generation_keep_older_ones_intact(tmp_path):
+    storage = str(tmp_path)
+    first = commit(storage, {"vectors.bin": "0123"})
+    with Generation(storage) as generation:
+        generation.link_unchanged()
+        with open(os.path.join(generation.path, "vectors.bin"), "a", encoding="utf-8") as f:
+            f.write("4567")
+    assert index_storage.is_committed(first) and index_storage.is_committed(generation.path)
+    assert read(first, "vectors.bin") == "01234567"
+
+
+def test_prune_keeps_the_newest_generations(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_KEEP_GENERATIONS", 2)
+    storage = str(tmp_path)
+    paths = [commit(storage, {"a.json": f"a{i}"}) for i in range(4)]
+    assert sorted(os.listdir(tmp_path)) == [CURRENT_FNAME] + [os.path.basename(p) for p in paths[2:]]
+    assert read(paths[3], "a.json") == "a3"
+
+
+def test_legacy_flat_directory_is_migrated(tmp_path):
+    storage = str(tmp_path)
+    (tmp_path / "docstore.json").write_text("{}")
+    (tmp_path / "index_store.json").write_text("{}")
+    assert index_storage.resolve(storage) == storage
+    generation = commit(storage, {"index_manifest.json": "{}"})
+    assert sorted(os.listdir(tmp_path)) == [CURRENT_FNAME, os.path.basename(generation)]
+    assert read(generation, "docstore.json") == "{}"
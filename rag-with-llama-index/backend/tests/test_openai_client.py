@@ -0,0 +1,149 @@
+import gc
+import asyncio
+import threading
+
+import httpx
+
+import config
+import openai_client
+from openai_client import AsyncSingleFlight, _AsyncRetryTransport, _RetryTransport, _Slots
+
+
+# --- Request Coalescing ---
+
+def test_followers_get_the_answer_when_the_first_caller_is_cancelled():
+    async def scenario():
+        flight, calls = AsyncSingleFlight(), []
+
+        async def answer():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.do("q", answer))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("q", answer))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "answer"
+        assert leader.cancelled() and calls == [1]
+
+    asyncio.run(scenario())
+
+
+def test_call_is_cancelled_once_every_caller_left():
+    async def scenario():
+        flight, finished = AsyncSingleFlight(), []
+
+        async def answer():
+            await asyncio.sleep(10)
+            finished.append(1)
+
+        callers = [asyncio.ensure_future(flight.do("q", answer)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        assert flight._calls == {} and finished == []
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError, ValueError]
+
+    asyncio.run(scenario())
+
+
+# --- Concurrency Slots ---
+
+def test_slot_is_freed_when_a_response_is_dropped_unclosed(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_MAX_CONCURRENCY", 1)
+    transport = _RetryTransport()
+    monkeypatch.setattr(transport, "_send", lambda request: httpx.Response(200, content=b"{}"))
+    request = httpx.Request("GET", "http://api.invalid/v1/models")
+    response = transport.handle_request(request)
+    del response
+    gc.collect()
+    assert transport._slots.free == 1
+
+
+def test_slot_is_freed_once_the_body_is_read(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_MAX_CONCURRENCY", 1)
+    transport = _RetryTransport()
+    monkeypatch.setattr(transport, "_send", lambda request: httpx.Response(200, content=b"{}"))
+    response = transport.handle_request(httpx.Request("GET", "http://api.invalid/v1/models"))
+    assert response.read() == b"{}"
+    assert transport._slots.free == 1
+
+
+def test_sync_and_async_clients_share_one_limit(monkeypatch):
+    slots = _Slots(1)
+    sync, async_ = _RetryTransport(slots=slots), _AsyncRetryTransport(slots=slots)
+    monkeypatch.setattr(sync, "_send", lambda request: httpx.Response(200, content=b"{}"))
+
+    async def send(request):
+        return httpx.Response(200, content=b"{}")
+
+    monkeypatch.setattr(async_, "_send", send)
+    request = httpx.Request("GET", "http://api.invalid/v1/models")
+    held = sync.handle_request(request)
+
+    async def scenario():
+        waiting = asyncio.ensure_future(async_.handle_async_request(request))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()  # the sync request holds the only slot
+        await asyncio.to_thread(held.read)
+        response = await asyncio.wait_for(waiting, 1)
+        await response.aread()
+
+    asyncio.run(scenario())
+    assert slots.free == 1
+
+
+def test_cancelled_waiters_do_not_take_a_slot():
+    slots = _Slots(1)
+
+    async def scenario():
+        await slots.acquire_async()
+        waiters = [asyncio.ensure_future(slots.acquire_async()) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        slots.release()  # handed to the first waiter, already cancelled
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert slots.free == 1
+
+
+# --- Cached Health Check ---
+
+def test_health_probe_runs_once_and_others_get_the_previous_result(monkeypatch):
+    monkeypatch.setattr(openai_client, "_health", {"result": {"status": "ok"}, "checked_at": 0.0})
+    started, release = threading.Event(), threading.Event()
+
+    def slow_probe():
+        started.set()
+        release.wait(5)
+        return {"status": "error", "details": "timed out"}
+
+    monkeypatch.setattr(openai_client, "_probe", slow_probe)
+    results = []
+    prober = threading.Thread(target=lambda: results.append(openai_client.check_health()))
+    prober.start()
+    assert started.wait(5)
+    # Served from the previous result while the probe is in flight
+    assert openai_client.check_health()["status"] == "ok"
+    release.set()
+    prober.join()
+    assert (results[0]["status"], results[0]["cached"]) == ("error", False)
+    assert openai_client.check_health()["cached"] is True
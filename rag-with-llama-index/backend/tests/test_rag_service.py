@@ -0,0 +1,171 @@
+import pytest
+from llama_index.core.schema import MetadataMode, NodeRelationship, QueryBundle, RelatedNodeInfo, TextNode
+
+# rag_service imports the OpenAI and HuggingFace integrations
+pytest.importorskip("llama_index.llms.openai")
+pytest.importorskip("llama_index.embeddings.huggingface")
+
+from rag_service import RAGService  # noqa: E402
+
+
+def write(data_dir, name, text):
+    path = data_dir / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def doc_ids(service):
+    return {node.ref_doc_id for node in service.index.docstore.docs.values()}
+
+
+# --- Retrieval ---
+
+@pytest.mark.parametrize("hybrid", [False, True])
+def test_engine_retrieves_chunks_indexed_after_it_was_built(rag_env, monkeypatch, hybrid):
+    monkeypatch.setattr("config.HYBRID_SEARCH_ENABLED", hybrid)
+    write(rag_env, "a.txt", "Invoices are paid within thirty days.")
+    service = RAGService()
+    b = write(rag_env, "b.txt", "Refunds take five business days.")
+    service.refresh_documents([b])
+    hits = service.query_engine.retrieve(QueryBundle("How long do refunds take?"))
+    assert hits[0].node.ref_doc_id == b
+
+
+# --- Memory Accounting ---
+
+def test_memory_estimate_follows_refreshes_and_deletes(rag_env):
+    a = write(rag_env, "a.txt", "Invoices are paid within thirty days. " * 40)
+    b = write(rag_env, "b.txt", "Refunds take five business days. " * 40)
+    service = RAGService()
+
+    def recomputed():
+        total = service.index.vector_store.memory_bytes() + service.bm25.memory_bytes()
+        return total + sum(len(n.get_content()) + 1024 for n in service.index.docstore.docs.values())
+
+    assert service.memory_bytes() == recomputed()
+    write(rag_env, "a.txt", "Invoices are now paid within ten days. " * 80)
+    service.refresh_documents([a])
+    assert service.memory_bytes() == recomputed()
+    service.delete_document(b)
+    assert service.memory_bytes() == recomputed()
+    assert doc_ids(service) == {a}
+
+
+# --- Response Cache ---
+
+def test_answer_of_a_query_overtaken_by_a_refresh_is_not_cached(rag_env):
+    path = write(rag_env, "a.txt", "Invoices are paid within thirty days. " * 20)
+    service = RAGService()
+    synthesize = service.query_engine.synthesize
+
+    def refresh_then_answer(query_bundle, nodes):
+        # The file changes after the context was retrieved, before the answer is stored
+        write(rag_env, "a.txt", "Invoices are paid within ten days. " * 20)
+        service.refresh_documents([path])
+        return synthesize(query_bundle, nodes)
+
+    service.query_engine.synthesize = refresh_then_answer
+    service.query("When are invoices paid?")
+    assert len(service.cache) == 0
+    del service.query_engine.synthesize
+    service.query("When are invoices paid?")
+    assert len(service.cache) == 1
+
+
+def test_refresh_invalidates_answers_built_from_legacy_document_ids(rag_env):
+    path = write(rag_env, "a.txt", "Invoices are paid within thirty days.")
+    service = RAGService()
+    # As indexed before file paths were used as document ids
+    service.delete_document(path)
+    node = TextNode(text="Invoices are paid within thirty days.", metadata={"file_path": path})
+    node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id="legacy-doc-1")
+    node.embedding = service.embed_model.get_text_embedding(node.get_content(metadata_mode=MetadataMode.EMBED))
+    service.index.insert_nodes([node])
+    service.query("When are invoices paid?")
+    assert [entry.doc_ids for entry in service.cache._entries.values()] == [{"legacy-doc-1"}]
+
+    service.refresh_documents([path])
+    assert len(service.cache) == 0
+    assert doc_ids(service) == {path}
+
+
+# --- Bulk Refresh ---
+
+def chunk_texts(service, path):
+    return sorted(n.get_content() for n in service.index.docstore.docs.values() if n.ref_doc_id == path)
+
+
+def test_bulk_refresh_replaces_the_chunks_of_every_file(rag_env):
+    a = write(rag_env, "a.txt", "Invoices are paid within thirty days. " * 200)
+    b = write(rag_env, "b.txt", "Refunds take five business days. " * 200)
+    service = RAGService()
+    write(rag_env, "a.txt", "Invoices are paid within ten days. " * 100)
+    write(rag_env, "b.txt", "Refunds take two business days.")
+    c = write(rag_env, "c.txt", "Shipping is free above fifty euros.")
+    service.refresh_documents([a, b, c])
+
+    rebuilt = RAGService()
+    assert doc_ids(service) == {a, b, c}
+    for path in (a, b, c):
+        assert chunk_texts(service, path) == chunk_texts(rebuilt, path)
+    # No chunk of the old content is left behind in the vector or keyword index
+    chunks = len(service.index.docstore.docs)
+    assert len(service.index.vector_store.node_ids()) == chunks == len(service.bm25)
+
+
+def test_failed_refresh_leaves_the_index_unchanged(rag_env):
+    a = write(rag_env, "a.txt", "Invoices are paid within thirty days.")
+    service = RAGService()
+    before = chunk_texts(service, a)
+    write(rag_env, "a.txt", "Invoices are paid within ten days.")
+    with pytest.raises(ValueError):
+        service.refresh_documents([a, str(rag_env / "missing.txt")])
+    assert chunk_texts(service, a) == before
+
+
+# --- Batched Queries ---
+
+@pytest.fixture
+def batch_service(rag_env, monkeypatch):
+    """A service over two documents whose LLM calls are recorded as (prompt, context node ids)."""
+    write(rag_env, "a.txt", "Invoices are paid within thirty days.")
+    write(rag_env, "b.txt", "Refunds take five business days.")
+    service = RAGService()
+    synthesize = service.query_engine.synthesize
+    service.calls = []
+
+    def record(query_bundle, nodes):
+        service.calls.append((query_bundle.query_str, [n.node.node_id for n in nodes]))
+        if "fail" in query_bundle.query_str:
+            raise RuntimeError("LLM unavailable")
+        return synthesize(query_bundle, nodes)
+
+    monkeypatch.setattr(service.query_engine, "synthesize", record)
+    return service
+
+
+def test_batch_uses_the_same_context_as_single_queries(batch_service):
+    prompts = ["When are invoices paid?", "How long do refunds take?"]
+    list(batch_service.query_many(prompts))
+    batched = sorted(batch_service.calls)
+    batch_service.cache.clear()
+    batch_service.calls.clear()
+    for prompt in prompts:
+        batch_service.query(prompt)
+    assert batched == sorted(batch_service.calls)
+
+
+def test_batch_answers_duplicates_once_and_every_prompt_exactly_once(batch_service):
+    prompts = ["When are invoices paid?", "How long do refunds take?", "  when are INVOICES paid? "]
+    results = sorted(batch_service.query_many(prompts))
+    assert [i for i, _, _ in results] == [0, 1, 2]
+    assert results[0][1] == results[2][1] and all(error is None for _, _, error in results)
+    assert len(batch_service.calls) == 2
+
+
+def test_batch_reports_errors_per_prompt_and_skips_cached_answers(batch_service):
+    cached = batch_service.query("When are invoices paid?")
+    batch_service.calls.clear()
+    results = sorted(batch_service.query_many(["When are invoices paid?", "fail: refunds?"]))
+    assert results == [(0, cached, None), (1, None, "LLM unavailable")]
+    assert [prompt for prompt, _ in batch_service.calls] == ["fail: refunds?"]
@@ -0,0 +1,50 @@
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from reranker import BudgetedReranker
+
+
+def hits(*texts):
+    """Retrieval results in rank order (scores descending)."""
+    return [NodeWithScore(node=TextNode(id_=f"n{i}", text=text), score=1.0 - i * 0.1)
+            for i, text in enumerate(texts)]
+
+
+def ids(nodes):
+    return [n.node.node_id for n in nodes]
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how often the query's first word occurs in the text."""
+
+    def predict(self, pairs):
+        return [text.count(query.split()[0]) for query, text in pairs]
+
+
+QUERY = QueryBundle("invoice AB-1234")
+
+
+def test_without_cross_encoder_the_retrieval_order_is_kept():
+    # n0 stands for a keyword-only (BM25) hit ranked first by fusion
+    nodes = hits("AB-1234", "semantically close text about billing", "more billing text")
+    reranker = BudgetedReranker(token_budget=1000, top_n=2)
+    assert not reranker.rescores
+    assert ids(reranker.postprocess_nodes(nodes, query_bundle=QUERY)) == ["n0", "n1"]
+
+
+def test_packing_skips_chunks_over_the_budget_but_keeps_the_best_one():
+    long_text = "word " * 300
+    nodes = hits(long_text, long_text, "short chunk")
+    reranker = BudgetedReranker(token_budget=310, top_n=3)
+    assert ids(reranker.postprocess_nodes(nodes, query_bundle=QUERY)) == ["n0", "n2"]
+    # The best chunk is kept even if it alone exceeds the budget
+    tight = BudgetedReranker(token_budget=10, top_n=3)
+    assert ids(tight.postprocess_nodes(nodes[:2], query_bundle=QUERY)) == ["n0"]
+
+
+def test_cross_encoder_reorders_candidates_before_packing():
+    nodes = hits("nothing relevant", "invoice", "invoice invoice")
+    reranker = BudgetedReranker(cross_encoder=FakeCrossEncoder(), token_budget=1000, top_n=2)
+    assert reranker.rescores
+    packed = reranker.postprocess_nodes(nodes, query_bundle=QUERY)
+    assert ids(packed) == ["n2", "n1"]
+    assert [n.score for n in packed] == [2.0, 1.0]
@@ -0,0 +1,65 @@
+import numpy as np
+
+from response_cache import ResponseCache, normalize_prompt
+
+
+class AxisEmbedding:
+    """Embeds a prompt onto the axis named by its first word."""
+
+    AXES = {"invoice": 0, "refund": 1, "shipping": 2}
+
+    def get_query_embedding(self, prompt):
+        vector = np.zeros(3)
+        vector[self.AXES[prompt.split()[0].lower()]] = 1.0
+        return vector
+
+
+def cache(**kwargs):
+    return ResponseCache(AxisEmbedding(), **kwargs)
+
+
+def test_exact_hits_ignore_case_and_whitespace():
+    responses = cache(similarity_threshold=1.0)
+    responses.put("Invoice  due date?", "30 days", {"a.txt"})
+    assert responses.lookup("invoice due DATE?")[0] == "30 days"
+    assert normalize_prompt("  A  b ") == "a b"
+
+
+def test_semantic_hit_reuses_an_answer_for_a_similar_prompt():
+    responses = cache(similarity_threshold=0.9)
+    _, embedding = responses.lookup("invoice terms")
+    responses.put("invoice terms", "30 days", {"a.txt"}, embedding)
+    assert responses.lookup("invoice payment period")[0] == "30 days"
+    assert responses.lookup("refund policy")[0] is None
+
+
+def test_invalidation_drops_answers_of_the_documents_and_sourceless_ones():
+    responses = cache(similarity_threshold=1.0)
+    responses.put("invoice terms", "30 days", {"a.txt"})
+    responses.put("refund policy", "5 days", {"b.txt"})
+    responses.put("shipping", "I don't know", set())
+    assert responses.invalidate_documents({"a.txt"}) == 2
+    assert [responses.lookup(p)[0] for p in ("invoice terms", "refund policy", "shipping")] == \
+        [None, "5 days", None]
+
+
+def test_answer_retrieved_before_an_invalidation_is_not_stored():
+    responses = cache(similarity_threshold=1.0)
+    generation = responses.generation  # read before retrieving
+    responses.invalidate_documents({"a.txt"})  # an update lands meanwhile
+    assert responses.put("invoice terms", "stale", {"a.txt"}, generation=generation) is False
+    assert responses.lookup("invoice terms")[0] is None
+    assert responses.put("invoice terms", "fresh", {"a.txt"}, generation=responses.generation)
+    assert responses.lookup("invoice terms")[0] == "fresh"
+
+
+def test_expired_and_evicted_entries_are_gone(monkeypatch):
+    responses = cache(similarity_threshold=1.0, max_entries=2, ttl_seconds=10)
+    clock = [100.0]
+    monkeypatch.setattr("response_cache.time.monotonic", lambda: clock[0])
+    for prompt in ("invoice", "refund", "shipping"):
+        responses.put(prompt, prompt.upper(), {"a.txt"})
+    assert responses.lookup("invoice")[0] is None  # least recently used, evicted
+    assert responses.lookup("shipping")[0] == "SHIPPING"
+    clock[0] += 11
+    assert responses.lookup("shipping")[0] is None
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+# service_registry imports rag_service, which needs the OpenAI and HuggingFace integrations
+pytest.importorskip("llama_index.llms.openai")
+pytest.importorskip("llama_index.embeddings.huggingface")
+
+import service_registry  # noqa: E402
+from service_registry import ServiceRegistry, UnknownCollectionError  # noqa: E402
+
+
+class FakeService:
+    """Stands in for a loaded RAGService of a given size."""
+
+    def __init__(self, collection, size=0):
+        self.collection = collection
+        self.size = size
+
+    def memory_bytes(self):
+        return self.size
+
+
+@pytest.fixture
+def collections(rag_env, monkeypatch):
+    """Creates collection directories on demand and loads them as FakeServices."""
+    sizes, loads = {}, []
+
+    def create(name, size=0):
+        sizes[name] = size
+        (rag_env.parent / "collections" / name / "data").mkdir(parents=True)
+
+    def load(collection):
+        loads.append(collection)
+        return FakeService(collection, sizes.get(collection, 0))
+
+    monkeypatch.setattr(service_registry, "RAGService", load)
+    monkeypatch.setattr(service_registry, "sync_data_directory", lambda service: None)
+    create.loads = loads
+    return create
+
+
+def loaded(registry):
+    return [service.collection for service in registry.loaded()]
+
+
+def test_least_recently_used_collection_is_unloaded_first(collections):
+    for name in ("a", "b", "c"):
+        collections(name)
+    registry = ServiceRegistry(memory_budget_bytes=10**9, max_loaded=2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now the coldest
+    registry.get("c")
+    assert loaded(registry) == ["a", "c"]
+
+
+def test_memory_budget_unloads_until_it_fits_and_keeps_pinned(collections):
+    collections("a", size=60)
+    collections("c", size=50)
+    registry = ServiceRegistry(memory_budget_bytes=100, max_loaded=10)
+    registry.add(FakeService("watched", size=30), pinned=True)
+    registry.get("a")
+    registry.get("c")
+    assert loaded(registry) == ["watched", "c"]
+    assert registry.evict("watched") is False
+
+
+def test_unknown_and_invalid_names_leave_no_load_lock(collections):
+    registry = ServiceRegistry()
+    with pytest.raises(UnknownCollectionError):
+        registry.get("missing")
+    with pytest.raises(ValueError):
+        registry.get("../escape")
+    assert registry._load_locks == {}
+
+
+def test_failed_load_drops_its_lock_and_can_be_retried(collections, monkeypatch):
+    collections("a")
+
+    def broken(collection):
+        raise RuntimeError("index is damaged")
+
+    registry = ServiceRegistry()
+    with monkeypatch.context() as m:
+        m.setattr(service_registry, "RAGService", broken)
+        with pytest.raises(RuntimeError):
+            registry.get("a")
+    assert registry._load_locks == {}
+    assert registry.get("a").collection == "a"
+
+
+def test_concurrent_first_requests_load_a_collection_once(collections):
+    collections("a")
+    registry = ServiceRegistry()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert collections.loads == ["a"]
+    assert len({id(service) for service in results}) == 1
+
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+# sync_service imports rag_service, which needs the OpenAI and HuggingFace integrations
+pytest.importorskip("llama_index.llms.openai")
+pytest.importorskip("llama_index.embeddings.huggingface")
+
+import sync_service  # noqa: E402
+from sync_service import get_file_hash, scan_data_directory  # noqa: E402
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Records the files hashed by scan_data_directory."""
+    files = []
+
+    def record(file_path):
+        files.append(os.path.basename(file_path))
+        return get_file_hash(file_path)
+
+    monkeypatch.setattr(sync_service, "get_file_hash", record)
+    return files
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+# --- Scan Prefilter ---
+
+def test_files_with_matching_mtime_size_and_inode_are_not_read(tmp_path, hashed):
+    a = write(tmp_path, "a.txt", "Invoices are paid within thirty days.")
+    write(tmp_path, "b.txt", "Refunds take five business days.")
+    write(tmp_path, "notes.md", "Not indexed.")
+    manifest, changed = scan_data_directory({}, str(tmp_path))
+    assert sorted(hashed) == ["a.txt", "b.txt"] and len(changed) == 2
+
+    hashed.clear()
+    assert scan_data_directory(manifest, str(tmp_path)) == (manifest, [])
+    assert hashed == []
+
+    write(tmp_path, "a.txt", "Invoices are paid within ten days.")
+    current, changed = scan_data_directory(manifest, str(tmp_path))
+    assert hashed == ["a.txt"] and changed == [a]
+    assert current[a]["hash"] != manifest[a]["hash"]
+
+
+def test_touched_file_is_hashed_once_but_not_reported_changed(tmp_path, hashed):
+    a = write(tmp_path, "a.txt", "Invoices are paid within thirty days.")
+    manifest, _ = scan_data_directory({}, str(tmp_path))
+    st = os.stat(a)
+    os.utime(a, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    hashed.clear()
+    current, changed = scan_data_directory(manifest, str(tmp_path))
+    assert hashed == ["a.txt"] and changed == []
+    # The new mtime is recorded, so the next scan skips the file again
+    assert current[a]["mtime_ns"] == st.st_mtime_ns + 10**9
+    hashed.clear()
+    scan_data_directory(current, str(tmp_path))
+    assert hashed == []
+
+
+def test_legacy_hash_only_entries_are_upgraded_without_a_reindex(tmp_path, hashed):
+    a = write(tmp_path, "a.txt", "Invoices are paid within thirty days.")
+    current, changed = scan_data_directory({a: get_file_hash(a)}, str(tmp_path))
+    assert changed == []
+    assert current[a]["size"] == os.path.getsize(a)
+
+
+def test_missing_data_directory_is_not_treated_as_empty(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        scan_data_directory({}, str(tmp_path / "unmounted"))
+
+
+# --- Synchronization ---
+
+def test_sync_reindexes_only_changed_and_deleted_files(rag_env, monkeypatch):
+    from rag_service import RAGService
+
+    a = write(rag_env, "a.txt", "Invoices are paid within thirty days.")
+    b = write(rag_env, "b.txt", "Refunds take five business days.")
+    service = RAGService()
+    sync_service.sync_data_directory(service)
+    assert set(sync_service.load_manifest(service.manifest_file)) == {a, b}
+
+    refreshed, deleted = [], []
+    refresh, delete = service.refresh_documents, service.delete_document
+    monkeypatch.setattr(service, "refresh_documents", lambda paths: (refreshed.extend(paths), refresh(paths)))
+    monkeypatch.setattr(service, "delete_document", lambda path: (deleted.append(path), delete(path)))
+
+    sync_service.sync_data_directory(service)
+    assert refreshed == [] and deleted == []
+
+    write(rag_env, "a.txt", "Invoices are paid within ten days.")
+    os.remove(b)
+    sync_service.sync_data_directory(service)
+    assert refreshed == [a] and deleted == [b]
+    assert set(sync_service.load_manifest(service.manifest_file)) == {a}
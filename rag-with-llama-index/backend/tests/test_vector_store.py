@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from vector_store import (
+    DELETED_FNAME,
+    LEGACY_FNAME,
+    SEGMENTS_FNAME,
+    VECTORS_FNAME,
+    VECTORS_INDEX_FNAME,
+    MmapVectorStore,
+    stored_node_ids,
+)
+
+DIM = 8
+
+
+def make_node(node_id, ref_doc_id, vector, **metadata):
+    node = TextNode(id_=node_id, text=f"text of {node_id}", embedding=list(map(float, vector)), metadata=metadata)
+    node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+    return node
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(7)
+    return rng.standard_normal((40, DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def store(vectors):
+    store = MmapVectorStore()
+    store.add([make_node(f"n{i}", f"doc{i % 4}.txt", v, page=i) for i, v in enumerate(vectors)])
+    return store
+
+
+def query(store, vector, k=5, **kwargs):
+    result = store.query(VectorStoreQuery(query_embedding=list(map(float, vector)), similarity_top_k=k, **kwargs))
+    return result.ids, result.similarities
+
+
+def exact_top_k(vectors, ids, vector, k):
+    scores = vectors @ vector / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(vector))
+    order = np.argsort(-scores)[:k]
+    return [ids[i] for i in order], scores[order]
+
+
+def test_query_returns_exact_cosine_top_k(store, vectors):
+    ids, scores = query(store, vectors[3], k=5)
+    expected_ids, expected_scores = exact_top_k(vectors, [f"n{i}" for i in range(40)], vectors[3], 5)
+    assert ids == expected_ids
+    assert scores == pytest.approx(expected_scores, rel=1e-5)
+
+
+def test_delete_removes_all_rows_of_a_document(store, vectors):
+    store.delete("doc1.txt")
+    ids, _ = query(store, vectors[1], k=40)
+    assert len(ids) == 30
+    assert not any(int(node_id[1:]) % 4 == 1 for node_id in ids)
+
+
+def test_delete_nodes_and_re_adding_a_node_replaces_its_row(store, vectors):
+    store.delete_nodes(["n0", "n5"])
+    store.add([make_node("n6", "doc2.txt", vectors[0])])  # n6 now has n0's vector
+    ids, scores = query(store, vectors[0], k=40)
+    assert "n0" not in ids and "n5" not in ids
+    assert ids[0] == "n6" and scores[0] == pytest.approx(1.0)
+    assert len(ids) == 38
+
+
+def test_compaction_keeps_results(store, vectors):
+    before = query(store, vectors[10], k=40)
+    store.delete("doc0.txt")
+    store.delete("doc1.txt")  # over the compaction threshold
+    assert store.matrix.shape[0] == 20
+    ids, scores = query(store, vectors[10], k=40)
+    expected = [(i, s) for i, s in zip(*before) if int(i[1:]) % 4 in (2, 3)]
+    assert ids == [i for i, _ in expected]
+    assert scores == pytest.approx([s for _, s in expected])
+
+
+def test_metadata_filters(store, vectors):
+    filters = MetadataFilters(filters=[MetadataFilter(key="page", value=30, operator=FilterOperator.GTE)])
+    ids, _ = query(store, vectors[0], k=40, filters=filters)
+    assert sorted(ids, key=lambda n: int(n[1:])) == [f"n{i}" for i in range(30, 40)]
+
+
+def test_persist_and_load_round_trip(tmp_path, store, vectors):
+    store.delete("doc3.txt")
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    for i in (0, 1, 2, 17):
+        assert query(loaded, vectors[i], k=10) == pytest.approx(query(store, vectors[i], k=10))
+    assert sorted(stored_node_ids(str(tmp_path))) == sorted(f"n{i}" for i in range(40) if i % 4 != 3)
+    filters = MetadataFilters(filters=[MetadataFilter(key="page", value=2)])
+    assert query(loaded, vectors[0], k=40, filters=filters)[0] == ["n2"]
+
+
+def test_loaded_store_accepts_updates_and_persists_them(tmp_path, store, vectors):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    loaded.delete("doc0.txt")
+    loaded.add([make_node("new", "doc9.txt", vectors[8], page=99)])
+    loaded.persist(str(tmp_path / LEGACY_FNAME))
+    again = MmapVectorStore.from_persist_dir(str(tmp_path))
+    ids, scores = query(again, vectors[8], k=2)
+    assert ids[0] == "new" and scores[0] == pytest.approx(1.0)
+    assert "n8" not in query(again, vectors[8], k=40)[0]
+    again.delete("doc9.txt")
+    assert "new" not in query(again, vectors[8], k=40)[0]
+
+
+def test_unchanged_store_is_not_rewritten(tmp_path, store):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    before = {name: os.stat(tmp_path / name).st_mtime_ns for name in os.listdir(tmp_path)}
+    MmapVectorStore.from_persist_dir(str(tmp_path)).persist(str(tmp_path / LEGACY_FNAME))
+    assert {name: os.stat(tmp_path / name).st_mtime_ns for name in os.listdir(tmp_path)} == before
+
+
+def test_persist_appends_new_rows_and_keeps_old_segments(tmp_path, store, vectors):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    first_segments = set(os.listdir(tmp_path)) - {SEGMENTS_FNAME, VECTORS_FNAME}
+    vectors_inode = os.stat(tmp_path / VECTORS_FNAME).st_ino
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    loaded.add([make_node(f"new{i}", "doc9.txt", vectors[i], page=100 + i) for i in range(5)])
+    loaded.delete("doc1.txt")
+    loaded.persist(str(tmp_path / LEGACY_FNAME))
+    # The first segment is untouched; vectors.bin grew in place
+    assert first_segments < set(os.listdir(tmp_path))
+    assert os.stat(tmp_path / VECTORS_FNAME).st_ino == vectors_inode
+    assert os.path.getsize(tmp_path / VECTORS_FNAME) == 45 * DIM * 4
+    assert (tmp_path / DELETED_FNAME).exists()
+    again = MmapVectorStore.from_persist_dir(str(tmp_path))
+    assert sorted(again.node_ids()) == sorted(loaded.node_ids())
+    assert again.get("new2") == pytest.approx(vectors[2].tolist())
+    filters = MetadataFilters(filters=[MetadataFilter(key="page", value=102)])
+    assert query(again, vectors[2], k=45, filters=filters)[0] == ["new2"]
+    assert "n1" not in query(again, vectors[1], k=45)[0]
+
+
+def test_small_persists_are_merged_into_few_segments(tmp_path, store, vectors):
+    for i in range(64):
+        store.add([make_node(f"new{i}", "doc9.txt", vectors[i % 40])])
+        store.persist(str(tmp_path / LEGACY_FNAME))
+    with open(tmp_path / SEGMENTS_FNAME, "r", encoding="utf-8") as f:
+        segments = json.load(f)["segments"]
+    assert sum(rows for _, rows in segments) == 104
+    assert len(segments) <= 8
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("vectors_rows-")]) == len(segments)
+    assert len(MmapVectorStore.from_persist_dir(str(tmp_path)).node_ids()) == 104
+
+
+def test_rows_appended_after_a_failed_persist_are_dropped(tmp_path, store, vectors):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    with open(tmp_path / VECTORS_FNAME, "ab") as f:
+        f.write(b"\xff" * (DIM * 4 * 3))  # a crash after appending, before the commit
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    loaded.add([make_node("new", "doc9.txt", vectors[3])])
+    loaded.persist(str(tmp_path / LEGACY_FNAME))
+    again = MmapVectorStore.from_persist_dir(str(tmp_path))
+    assert again.get("new") == pytest.approx(vectors[3].tolist())
+
+
+def test_compaction_rewrites_all_files(tmp_path, store):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    for doc in ("doc0.txt", "doc1.txt"):
+        loaded.delete(doc)
+    loaded.persist(str(tmp_path / LEGACY_FNAME))
+    assert os.path.getsize(tmp_path / VECTORS_FNAME) == 20 * DIM * 4
+    assert not (tmp_path / DELETED_FNAME).exists()
+    assert sorted(stored_node_ids(str(tmp_path))) == sorted(f"n{i}" for i in range(40) if i % 4 > 1)
+
+
+def test_json_row_table_is_loaded_and_replaced(tmp_path, store, vectors):
+    store.persist(str(tmp_path / LEGACY_FNAME))
+    os.remove(tmp_path / SEGMENTS_FNAME)
+    with open(tmp_path / VECTORS_INDEX_FNAME, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "dtype": "float32", "count": 40, "dim": DIM,
+                   "ids": [f"n{i}" for i in range(40)], "ref_doc_ids": [f"doc{i % 4}.txt" for i in range(40)],
+                   "metadata": {f"n{i}": {"page": i} for i in range(40)}}, f)
+    loaded = MmapVectorStore.from_persist_dir(str(tmp_path))
+    assert query(loaded, vectors[5], k=3) == pytest.approx(query(store, vectors[5], k=3))
+    loaded.persist(str(tmp_path / LEGACY_FNAME))
+    assert (tmp_path / SEGMENTS_FNAME).exists() and not (tmp_path / VECTORS_INDEX_FNAME).exists()
+
+
+def test_simple_vector_store_migration(tmp_path, store, vectors):
+    store.to_simple_vector_store().persist(str(tmp_path / LEGACY_FNAME))
+    migrated = MmapVectorStore.from_persist_dir(str(tmp_path))
+    assert (tmp_path / (LEGACY_FNAME + ".migrated")).exists()
+    assert query(migrated, vectors[9], k=5) == pytest.approx(query(store, vectors[9], k=5))
+    migrated.delete("doc1.txt")
+    assert "n9" not in query(migrated, vectors[9], k=40)[0]
+
+
+def test_query_many_matches_query(store, vectors):
+    store.delete("doc2.txt")
+    results = store.query_many(vectors[:6], 4)
+    for vector, result in zip(vectors[:6], results):
+        ids, scores = query(store, vector, k=4)
+        assert result.ids == ids
+        assert result.similarities == pytest.approx(scores, rel=1e-5)
+
+
+def test_int8_quantization_re_ranks_exactly(store, vectors):
+    int8 = MmapVectorStore(quantization="int8", rerank_factor=10)
+    int8.add([make_node(f"n{i}", f"doc{i % 4}.txt", v) for i, v in enumerate(vectors)])
+    ids, scores = query(int8, vectors[12], k=3)
+    assert ids == query(store, vectors[12], k=3)[0]
+    assert scores[0] == pytest.approx(1.0, rel=1e-5)
+
+
+def test_queries_see_whole_batches_while_another_thread_updates(tmp_path, store, vectors):
+    stop, errors, seen = threading.Event(), [], set()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                ids, _ = query(store, vectors[0], k=100)
+                seen.add(len(ids))
+                store.query_many(vectors[:2], 5)
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    rng = np.random.default_rng(1)
+    for round_ in range(150):
+        # Replace one document's rows: readers must never see it half done
+        with store.batch():
+            store.delete(f"doc{round_ % 4}.txt")
+            store.add([make_node(f"r{round_}-{i}", f"doc{round_ % 4}.txt", v)
+                       for i, v in enumerate(rng.standard_normal((10, DIM)))])
+        if round_ % 25 == 0:
+            store.persist(str(tmp_path / LEGACY_FNAME))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert seen == {40}
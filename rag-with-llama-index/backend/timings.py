@@ -0,0 +1,44 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+from metrics import STAGE_SECONDS
+
+# Stage name -> elapsed milliseconds for the request being processed
+_current: contextvars.ContextVar = contextvars.ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def track():
+    """
+    Collects the timings of every `stage` run inside the block (including
+    code running in threads started with asyncio.to_thread).
+
+    Yields:
+        dict: Stage name -> elapsed milliseconds, filled in as stages finish.
+    """
+    timings: Dict[str, float] = {}
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a block as one pipeline stage; repeated stages are summed.
+    Every run is also recorded in the rag_stage_duration_seconds histogram,
+    including stages that run outside a tracked request (sync, audit writes).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        elapsed_ms = elapsed * 1000
+        timings: Optional[Dict[str, float]] = _current.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed_ms
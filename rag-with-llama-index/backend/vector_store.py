@@ -0,0 +1,852 @@
+import os
+import re
+import json
+import uuid
+import bisect
+import shutil
+import struct
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import build_metadata_filter_fn, node_to_metadata_dict
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from llama_index.core.indices.query.embedding_utils import get_top_k_mmr_embeddings
+
+# Raw row-major vectors: row i starts at byte i * dim * itemsize; only
+# appended to until the rows are compacted
+VECTORS_FNAME = "vectors.bin"
+# Segment table (JSON): dtype, dim, row count and the row segments in order
+SEGMENTS_FNAME = "vectors_segments.json"
+# Row segment: node id, ref doc id and metadata of a range of rows (row table format)
+SEGMENT_FNAME = "vectors_rows-{}.bin"
+_SEGMENT_RE = re.compile(r"^vectors_rows-[0-9a-f]+\.bin$")
+# Rows deleted since the last compaction (uint64)
+DELETED_FNAME = "vectors_deleted.bin"
+# Single row table written before row segments (still loaded)
+ROWS_FNAME = "vectors_rows.bin"
+# JSON row table written before the binary one (still loaded)
+VECTORS_INDEX_FNAME = "vectors_index.json"
+# Default LlamaIndex persistence of the vector store
+LEGACY_FNAME = "default__vector_store.json"
+
+# Compact the row storage once this share of rows is deleted
+_COMPACT_RATIO = 0.25
+# A new row segment is merged into the previous one while that holds fewer
+# than this many times its rows, so there are O(log rows) segments
+_MERGE_FACTOR = 2
+# Rows scored per matrix-vector product; bounds temporaries for float16/int8 rows
+_BLOCK_ROWS = 4096
+
+# Row table layout: header, metadata offsets (uint64, rows + 1), node ids and
+# ref doc ids (each "\0"-separated UTF-8), then the metadata of every row as
+# concatenated JSON objects; little-endian
+_ROWS_MAGIC = b"VRW\x01"
+_ROWS_HEADER = struct.Struct("<4s8sIIQQQ4x")  # magic, dtype, dim, rows, ids / ref ids / metadata bytes
+
+
+def _block_scores(matrix: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """Dot products of every row with the query, computed block by block in float32."""
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), _BLOCK_ROWS):
+        block = matrix[start:start + _BLOCK_ROWS]
+        scores[start:start + _BLOCK_ROWS] = block.astype(np.float32, copy=False) @ query_vector
+    return scores
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, in O(n + k log k)."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class _RowBlobs:
+    """
+    One byte string per row. Rows read from row tables are sliced out of
+    their memory-mapped files when accessed; rows added later are kept as
+    bytes.
+    """
+
+    def __init__(self, data: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        # Mapped parts: (data, offsets of its rows plus the end), first row of each part
+        self._parts: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._starts: List[int] = []
+        self._loaded = 0
+        if offsets is not None:
+            self._add_part(data, offsets)
+        self._added: List[bytes] = []
+
+    def _add_part(self, data: np.ndarray, offsets: np.ndarray):
+        self._starts.append(self._loaded)
+        self._parts.append((data, offsets))
+        self._loaded += len(offsets) - 1
+
+    @classmethod
+    def join(cls, columns: Sequence["_RowBlobs"]) -> "_RowBlobs":
+        """One column holding the rows of the given (freshly read) columns, in order."""
+        joined = cls()
+        for column in columns:
+            for data, offsets in column._parts:
+                joined._add_part(data, offsets)
+        return joined
+
+    def __len__(self) -> int:
+        return self._loaded + len(self._added)
+
+    def __getitem__(self, row: int) -> bytes:
+        if row < self._loaded:
+            part = bisect.bisect_right(self._starts, row) - 1
+            data, offsets = self._parts[part]
+            row -= self._starts[part]
+            return data[offsets[row]:offsets[row + 1]].tobytes()
+        return self._added[row - self._loaded]
+
+    def append(self, blob: bytes):
+        self._added.append(blob)
+
+    def take(self, rows: Sequence[int]) -> "_RowBlobs":
+        """A new column holding the given rows, in that order."""
+        taken = _RowBlobs()
+        taken._added = [self[row] for row in rows]
+        return taken
+
+    def nbytes(self) -> int:
+        loaded = sum(int(offsets[-1] - offsets[0]) for _, offsets in self._parts)
+        return loaded + sum(map(len, self._added))
+
+    def offsets(self) -> np.ndarray:
+        """Offsets of every row in the concatenated strings, plus the total length."""
+        lengths = [offsets[1:] - offsets[:-1] for _, offsets in self._parts]
+        lengths.append(np.fromiter(map(len, self._added), dtype=np.uint64, count=len(self._added)))
+        offsets = np.zeros(len(self) + 1, dtype=np.uint64)
+        np.cumsum(np.concatenate(lengths).astype(np.uint64), out=offsets[1:])
+        return offsets
+
+    def write(self, f):
+        """Writes the concatenated strings."""
+        for data, offsets in self._parts:
+            data[offsets[0]:offsets[-1]].tofile(f)
+        for blob in self._added:
+            f.write(blob)
+
+
+def _write_row_table(path: str, dtype: str, dim: int, ids: List[str], ref_doc_ids: List[str],
+                     metadata: _RowBlobs):
+    """Writes a binary row table atomically."""
+    id_bytes = "\0".join(ids).encode("utf-8")
+    ref_bytes = "\0".join(ref_doc_ids).encode("utf-8")
+    with open(path + ".tmp", "wb") as f:
+        f.write(_ROWS_HEADER.pack(_ROWS_MAGIC, dtype.encode("ascii"), dim, len(ids),
+                                  len(id_bytes), len(ref_bytes), metadata.nbytes()))
+        f.write(metadata.offsets().astype("<u8").tobytes())
+        f.write(id_bytes)
+        f.write(ref_bytes)
+        metadata.write(f)
+    os.replace(path + ".tmp", path)
+
+
+def _read_row_table(path: str):
+    """
+    Returns (dtype, dim, ids, ref doc ids, metadata) of a binary row table.
+    Only the ids are decoded; metadata stays in the mapped file until used.
+
+    Raises:
+        ValueError: The file is not a row table or is truncated.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.zeros(0, np.uint8)
+    if len(data) < _ROWS_HEADER.size:
+        raise ValueError(f"{path} is not a vector row table")
+    magic, dtype, dim, count, id_len, ref_len, meta_len = _ROWS_HEADER.unpack(data[:_ROWS_HEADER.size].tobytes())
+    start = _ROWS_HEADER.size + 8 * (count + 1)
+    if magic != _ROWS_MAGIC or len(data) != start + id_len + ref_len + meta_len:
+        raise ValueError(f"{path} is not a vector row table or is truncated")
+    offsets = np.frombuffer(data, dtype="<u8", count=count + 1, offset=_ROWS_HEADER.size)
+    ids = data[start:start + id_len].tobytes().decode("utf-8").split("\0") if count else []
+    start += id_len
+    ref_doc_ids = data[start:start + ref_len].tobytes().decode("utf-8").split("\0") if count else []
+    start += ref_len
+    metadata = _RowBlobs(data, offsets.astype(np.int64) + start)
+    return dtype.rstrip(b"\0").decode("ascii"), dim, ids, ref_doc_ids, metadata
+
+
+def _read_segments(persist_dir: str):
+    """
+    Returns (segment table, ids, ref doc ids, metadata, deleted rows) of a
+    segmented store, or None if the directory has no segment table.
+
+    Raises:
+        ValueError: A row segment does not match the table.
+    """
+    table_path = os.path.join(persist_dir, SEGMENTS_FNAME)
+    if not os.path.exists(table_path):
+        return None
+    with open(table_path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    ids, ref_doc_ids, columns = [], [], []
+    for name, count in table["segments"]:
+        _, _, segment_ids, segment_refs, metadata = _read_row_table(os.path.join(persist_dir, name))
+        if len(segment_ids) != count:
+            raise ValueError(f"Row segment {name} does not match {SEGMENTS_FNAME}")
+        ids += segment_ids
+        ref_doc_ids += segment_refs
+        columns.append(metadata)
+    deleted_path = os.path.join(persist_dir, DELETED_FNAME)
+    deleted = np.fromfile(deleted_path, dtype="<u8").astype(np.int64) if os.path.exists(deleted_path) \
+        else np.zeros(0, dtype=np.int64)
+    return table, ids, ref_doc_ids, _RowBlobs.join(columns), deleted
+
+
+def stored_node_ids(persist_dir: str) -> List[str]:
+    """Node ids with an embedding in a persisted store (any row table format)."""
+    segments = _read_segments(persist_dir)
+    if segments is not None:
+        _, ids, _, _, deleted = segments
+        dead = set(deleted.tolist())
+        return [node_id for row, node_id in enumerate(ids) if row not in dead]
+    rows_path = os.path.join(persist_dir, ROWS_FNAME)
+    if os.path.exists(rows_path):
+        return _read_row_table(rows_path)[2]
+    index_path = os.path.join(persist_dir, VECTORS_INDEX_FNAME)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            return [node_id for node_id in json.load(f).get("ids", []) if node_id is not None]
+    return []
+
+
+class _Snapshot:
+    """
+    The rows queries read. A published snapshot is never modified: mutations
+    work on the store's own arrays and publish a new snapshot with a single
+    reference assignment, so a query sees either all or none of a change.
+    Row norms and int8 codes are filled in lazily by the first query.
+    """
+
+    __slots__ = ("matrix", "alive", "ids", "ref_doc_ids", "rows", "metadata", "layout", "norms", "codes", "scales")
+
+    def __init__(self, matrix: np.ndarray, alive: np.ndarray, ids: List[str], ref_doc_ids: List[str],
+                 rows: Dict[str, int], metadata: _RowBlobs, layout: int):
+        self.matrix = matrix
+        self.alive = alive
+        # Shared with the store, which only appends past this snapshot's rows
+        self.ids = ids
+        self.ref_doc_ids = ref_doc_ids
+        self.metadata = metadata
+        self.rows = rows
+        # Rows keep their position until the store is compacted (a new layout)
+        self.layout = layout
+        self.norms: Optional[np.ndarray] = None
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.alive)
+
+    def node_metadata(self, node_id: str) -> Dict[str, Any]:
+        return json.loads(self.metadata[self.rows[node_id]])
+
+
+def _empty_snapshot() -> _Snapshot:
+    return _Snapshot(np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=bool), [], [], {}, _RowBlobs(), 0)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store that persists embeddings as one contiguous binary matrix.
+
+    On load the matrix is opened read-only with np.memmap, so startup does not
+    parse any floats and worker processes share the pages through the OS page
+    cache. The binary row segments next to it only have their ids decoded on
+    load; the metadata of a row is parsed when a filter needs it. Mutations
+    copy the matrix into a growable in-memory buffer; deleted rows are
+    tombstoned and compacted lazily.
+
+    A persist appends the rows added since the last one to vectors.bin and
+    writes them as a new row segment, merging it with the newest existing
+    segments while those are not much larger, and rewrites the list of
+    deleted rows. Only a compaction rewrites the whole store.
+
+    Queries read an immutable snapshot of the rows, so they can run while
+    another thread adds, deletes, compacts or persists. Mutations inside a
+    `batch()` block become visible together when the block ends.
+    """
+
+    stores_text: bool = False
+    dtype: str = "float32"
+    # "none" for exact scoring, "int8" for quantized scoring with exact re-ranking
+    quantization: str = "none"
+    rerank_factor: int = 4
+
+    # What queries read (replaced, never modified)
+    _snapshot: _Snapshot = PrivateAttr(default_factory=_empty_snapshot)
+    # Working state of the writer; rows past the snapshot are not visible yet
+    _buffer: Optional[np.ndarray] = PrivateAttr(default=None)
+    _size: int = PrivateAttr(default=0)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    # JSON metadata of every row
+    _metadata: _RowBlobs = PrivateAttr(default_factory=_RowBlobs)
+    # Node id -> row of live rows; copied before the first change after a publish
+    _rows: Dict[str, int] = PrivateAttr(default_factory=dict)
+    # Ref doc id -> rows, so deleting a document does not scan the row table
+    _by_ref: Dict[str, List[int]] = PrivateAttr(default_factory=dict)
+    _alive: Optional[np.ndarray] = PrivateAttr(default=None)
+    _deleted: int = PrivateAttr(default=0)
+    _layout: int = PrivateAttr(default=0)
+    _batch_depth: int = PrivateAttr(default=0)
+    _writable: bool = PrivateAttr(default=True)
+    _dirty: bool = PrivateAttr(default=False)
+    # Files of the last load or persist: vectors.bin lineage (None after a
+    # compaction), the rows it holds, the row segments (file, rows) and the
+    # number of deleted rows recorded
+    _disk_layout: Optional[str] = PrivateAttr(default=None)
+    _persisted: int = PrivateAttr(default=0)
+    _segments: List[Tuple[str, int]] = PrivateAttr(default_factory=list)
+    _deleted_on_disk: int = PrivateAttr(default=0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    # ------------------------- Row storage -------------------------
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Rows visible to queries (including tombstoned ones), shape (n, dim)."""
+        return self._snapshot.matrix
+
+    def memory_bytes(self) -> int:
+        """Size of the matrix and the arrays derived from it (norms, int8 codes)."""
+        snapshot = self._snapshot
+        arrays = (self._buffer, self._alive, snapshot.alive, snapshot.norms, snapshot.codes, snapshot.scales)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups mutations: queries keep seeing the rows as they were before
+        the block until it ends, then all of its changes at once. Blocks
+        may be nested; mutations outside a block are published right away.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._publish()
+
+    def _publish(self):
+        """Makes the working state visible to queries with one reference assignment."""
+        previous = self._snapshot
+        if self._buffer is None:
+            matrix, alive = np.zeros((0, 0), dtype=self.dtype), np.zeros(0, dtype=bool)
+        else:
+            matrix, alive = self._buffer[:self._size], self._alive[:self._size].copy()
+        snapshot = _Snapshot(matrix, alive, self._ids, self._ref_doc_ids, self._rows, self._metadata, self._layout)
+        if previous.layout == self._layout:
+            # Existing rows are unchanged: keep their norms and codes, only new rows get computed
+            snapshot.norms, snapshot.codes, snapshot.scales = previous.norms, previous.codes, previous.scales
+        self._snapshot = snapshot
+
+    def _own_rows(self):
+        """Copies the node id -> row map before changing it if a snapshot shares it."""
+        if self._rows is self._snapshot.rows:
+            self._rows = dict(self._rows)
+
+    def _reserve(self, extra: int, dim: int):
+        """Makes room for `extra` rows, copying a read-only memmap into memory first."""
+        needed = self._size + extra
+        if self._buffer is not None and self._writable and needed <= len(self._buffer):
+            return
+        capacity = max(needed, 2 * self._size, 1024)
+        buffer = np.empty((capacity, dim), dtype=self.dtype)
+        alive = np.zeros(capacity, dtype=bool)
+        if self._buffer is not None:
+            buffer[:self._size] = self._buffer[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._buffer, self._alive, self._writable = buffer, alive, True
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        buffer = np.ascontiguousarray(self._buffer[keep])
+        self._buffer, self._size, self._writable = buffer, len(keep), True
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[i] for i in keep]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+        self._metadata = self._metadata.take(keep)
+        self._deleted = 0
+        self._index_rows()
+        self._new_layout()
+
+    def _new_layout(self):
+        """Rows moved or were dropped: the next persist rewrites all files."""
+        self._layout += 1
+        self._disk_layout, self._persisted, self._segments = None, 0, []
+
+    def _index_rows(self):
+        """Rebuilds the node id -> row and ref doc id -> rows maps of the live rows."""
+        live = np.flatnonzero(self._alive[:self._size]).tolist() if self._deleted else range(self._size)
+        self._rows = {self._ids[row]: row for row in live}
+        self._by_ref = {}
+        for row in live:
+            self._by_ref.setdefault(self._ref_doc_ids[row], []).append(row)
+
+    def _remove_rows(self, rows: Sequence[int]):
+        self._own_rows()
+        for row in rows:
+            if not self._alive[row]:
+                continue
+            self._alive[row] = False
+            self._rows.pop(self._ids[row], None)
+            same_ref = self._by_ref.get(self._ref_doc_ids[row])
+            if same_ref is not None:
+                same_ref.remove(row)
+                if not same_ref:
+                    del self._by_ref[self._ref_doc_ids[row]]
+            self._deleted += 1
+        self._dirty = True
+        if self._deleted > _COMPACT_RATIO * max(self._size, 1):
+            self._compact()
+
+    @staticmethod
+    def _row_norms(snapshot: _Snapshot) -> np.ndarray:
+        """Row norms of the snapshot, computed for the rows that do not have one yet."""
+        norms = snapshot.norms
+        done = 0 if norms is None else len(norms)
+        if done < len(snapshot):
+            matrix = snapshot.matrix
+            extra = np.empty(len(snapshot) - done, dtype=np.float32)
+            for start in range(done, len(snapshot), _BLOCK_ROWS):
+                block = matrix[start:start + _BLOCK_ROWS].astype(np.float32, copy=False)
+                extra[start - done:start - done + len(block)] = np.linalg.norm(block, axis=1)
+            extra[extra == 0] = 1.0
+            norms = extra if norms is None else np.concatenate([norms, extra])
+            snapshot.norms = norms
+        return norms[:len(snapshot)]
+
+    # ------------------------- Vector store API -------------------------
+
+    def get(self, text_id: str) -> List[float]:
+        snapshot = self._snapshot
+        return snapshot.matrix[snapshot.rows[text_id]].astype(np.float32).tolist()
+
+    def node_ids(self) -> List[str]:
+        """Ids of the live rows, which are the node ids (the store keeps no text)."""
+        return list(self._snapshot.rows)
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=self.dtype)
+        with self.batch():
+            existing = [self._rows[n.node_id] for n in nodes if n.node_id in self._rows]
+            if existing:
+                self._remove_rows(existing)
+            self._own_rows()
+            self._reserve(len(nodes), vectors.shape[1])
+            start = self._size
+            self._buffer[start:start + len(nodes)] = vectors
+            self._alive[start:start + len(nodes)] = True
+            for offset, node in enumerate(nodes):
+                ref_doc_id = node.ref_doc_id or "None"
+                self._ids.append(node.node_id)
+                self._ref_doc_ids.append(ref_doc_id)
+                self._rows[node.node_id] = start + offset
+                self._by_ref.setdefault(ref_doc_id, []).append(start + offset)
+                metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+                metadata.pop("_node_content", None)
+                self._metadata.append(json.dumps(metadata).encode("utf-8"))
+            self._size += len(nodes)
+            self._dirty = True
+        return [node.node_id for node in nodes]
+
+    def _node_metadata(self, node_id: str) -> Dict[str, Any]:
+        return json.loads(self._metadata[self._rows[node_id]])
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        rows = self._by_ref.pop(ref_doc_id, None)
+        if rows:
+            with self.batch():
+                self._remove_rows(rows)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters=None, **delete_kwargs: Any) -> None:
+        filter_fn = build_metadata_filter_fn(self._node_metadata, filters)
+        candidates = node_ids if node_ids is not None else list(self._rows)
+        rows = [self._rows[n] for n in candidates if n in self._rows and filter_fn(n)]
+        if rows:
+            with self.batch():
+                self._remove_rows(rows)
+
+    def clear(self) -> None:
+        with self.batch():
+            self._buffer, self._alive, self._size = None, None, 0
+            self._ids, self._ref_doc_ids, self._metadata, self._rows = [], [], _RowBlobs(), {}
+            self._by_ref = {}
+            self._deleted, self._dirty = 0, True
+            self._new_layout()
+
+    @staticmethod
+    def _candidate_mask(snapshot: _Snapshot, query: VectorStoreQuery) -> np.ndarray:
+        mask = snapshot.alive.copy()
+        if query.node_ids is not None:
+            allowed = np.zeros(len(snapshot), dtype=bool)
+            allowed[[snapshot.rows[n] for n in query.node_ids if n in snapshot.rows]] = True
+            mask &= allowed
+        if query.filters is not None:
+            filter_fn = build_metadata_filter_fn(snapshot.node_metadata, query.filters)
+            for row in np.flatnonzero(mask):
+                if not filter_fn(snapshot.ids[row]):
+                    mask[row] = False
+        return mask
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        snapshot = self._snapshot
+        if not len(snapshot):
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        mask = self._candidate_mask(snapshot, query)
+        matrix = snapshot.matrix
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        top_k = query.similarity_top_k
+
+        if query.mode == VectorStoreQueryMode.MMR:
+            rows = np.flatnonzero(mask)
+            similarities, top_ids = get_top_k_mmr_embeddings(
+                query_vector.tolist(),
+                matrix[rows].astype(np.float32).tolist(),
+                similarity_top_k=top_k,
+                embedding_ids=[snapshot.ids[r] for r in rows],
+                mmr_threshold=kwargs.get("mmr_threshold"),
+            )
+            return VectorStoreQueryResult(similarities=similarities, ids=top_ids)
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        query_norm = np.linalg.norm(query_vector) or 1.0
+        if self.quantization == "int8":
+            # Cheap approximate scores on the int8 codes, exact re-rank of the
+            # best rerank_factor * top_k candidates on the full-precision rows
+            codes, scales, norms = self._quantized(snapshot)
+            approx = _block_scores(codes, query_vector) * scales / (norms * query_norm)
+            approx[~mask] = -np.inf
+            candidates = _top_k(approx, top_k * self.rerank_factor)
+            candidates = candidates[np.isfinite(approx[candidates])]
+            exact = (matrix[candidates].astype(np.float32) @ query_vector) / (norms[candidates] * query_norm)
+            best = _top_k(exact, top_k)
+            rows, scores = candidates[best], exact[best]
+        else:
+            # Cosine similarity against every row with blocked matrix-vector products
+            all_scores = _block_scores(matrix, query_vector) / (self._row_norms(snapshot) * query_norm)
+            all_scores[~mask] = -np.inf
+            rows = _top_k(all_scores, top_k)
+            rows = rows[np.isfinite(all_scores[rows])]
+            scores = all_scores[rows]
+        return VectorStoreQueryResult(
+            similarities=scores.tolist(),
+            ids=[snapshot.ids[row] for row in rows],
+        )
+
+    def query_many(self, query_embeddings: np.ndarray, top_k: int) -> List[VectorStoreQueryResult]:
+        """
+        Exact cosine top-k for many queries at once.
+
+        Rows are scored block by block against all queries with one
+        matrix-matrix product per block, keeping a running top-k per query,
+        so the full (rows x queries) score matrix is never materialized.
+        Filters and MMR are not supported here; use query() for those.
+
+        Args:
+            query_embeddings (np.ndarray): Query vectors, shape (q, dim).
+            top_k (int): Results per query.
+
+        Returns:
+            list: One VectorStoreQueryResult per query, in input order.
+        """
+        snapshot = self._snapshot
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        size = len(snapshot)
+        if size == 0 or not len(queries):
+            return [VectorStoreQueryResult(similarities=[], ids=[]) for _ in range(len(queries))]
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        query_norms[query_norms == 0] = 1.0
+        queries = queries / query_norms
+        row_norms = self._row_norms(snapshot)
+        alive = snapshot.alive
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, size, _BLOCK_ROWS):
+            block = snapshot.matrix[start:start + _BLOCK_ROWS].astype(np.float32, copy=False)
+            scores = (queries @ block.T) / row_norms[start:start + len(block)]
+            scores[:, ~alive[start:start + len(block)]] = -np.inf
+            k = min(top_k, len(block))
+            cols = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, cols, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, cols + start], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            order = order[np.isfinite(scores[order])]
+            results.append(VectorStoreQueryResult(
+                similarities=scores[order].tolist(),
+                ids=[snapshot.ids[row] for row in rows[order]],
+            ))
+        return results
+
+    def _quantized(self, snapshot: _Snapshot):
+        """Lazily builds symmetric per-row int8 codes, scales and exact row norms of new rows."""
+        codes, scales = snapshot.codes, snapshot.scales
+        done = 0 if codes is None else len(codes)
+        if done < len(snapshot):
+            matrix = snapshot.matrix
+            extra_codes = np.empty((len(snapshot) - done, matrix.shape[1]), dtype=np.int8)
+            extra_scales = np.empty(len(snapshot) - done, dtype=np.float32)
+            for start in range(done, len(snapshot), _BLOCK_ROWS):
+                block = matrix[start:start + _BLOCK_ROWS].astype(np.float32)
+                block_scales = np.abs(block).max(axis=1) / 127.0
+                block_scales[block_scales == 0] = 1.0
+                extra_codes[start - done:start - done + len(block)] = np.rint(block / block_scales[:, None])
+                extra_scales[start - done:start - done + len(block)] = block_scales
+            codes = extra_codes if codes is None else np.concatenate([codes, extra_codes])
+            scales = extra_scales if scales is None else np.concatenate([scales, extra_scales])
+            snapshot.codes, snapshot.scales = codes, scales
+        size = len(snapshot)
+        return codes[:size], scales[:size], self._row_norms(snapshot)
+
+    # ------------------------- Persistence -------------------------
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """
+        Writes the store next to `persist_path` (the path StorageContext
+        passes for default__vector_store.json).
+
+        Where the directory holds the files of this store's last load or
+        persist (as a new storage generation does, through hard links), only
+        the rows added since are appended and the deleted rows rewritten;
+        otherwise all files are written. Does nothing if the store has not
+        changed since it was loaded or saved.
+        """
+        persist_dir = os.path.dirname(persist_path) or "."
+        on_disk = self._on_disk(persist_dir)
+        if not self._dirty and on_disk:
+            return
+        os.makedirs(persist_dir, exist_ok=True)
+
+        vectors_path = os.path.join(persist_dir, VECTORS_FNAME)
+        matrix = self._buffer if self._buffer is not None else np.zeros((0, 0), dtype=self.dtype)
+        dim = int(matrix.shape[1]) if self._size else 0
+        if not on_disk:
+            self._disk_layout, self._persisted, self._segments = uuid.uuid4().hex, 0, []
+            self._deleted_on_disk = -1
+            tmp_path = vectors_path + ".tmp"
+            np.ascontiguousarray(matrix[:self._size], dtype=self.dtype).tofile(tmp_path)
+            # Replacing (not overwriting) keeps existing memmaps of the old file valid
+            os.replace(tmp_path, vectors_path)
+        elif self._size > self._persisted:
+            with open(vectors_path, "r+b") as f:
+                # Drops anything a failed persist appended after the recorded rows
+                f.truncate(self._persisted * dim * np.dtype(self.dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                np.ascontiguousarray(matrix[self._persisted:self._size], dtype=self.dtype).tofile(f)
+
+        if self._size > self._persisted:
+            start = self._persisted
+            while self._segments and self._segments[-1][1] < _MERGE_FACTOR * (self._size - start):
+                start -= self._segments.pop()[1]
+            name = SEGMENT_FNAME.format(uuid.uuid4().hex[:16])
+            _write_row_table(os.path.join(persist_dir, name), self.dtype, dim, self._ids[start:self._size],
+                             self._ref_doc_ids[start:self._size], self._metadata.take(range(start, self._size)))
+            self._segments.append((name, self._size - start))
+            self._persisted = self._size
+
+        deleted_path = os.path.join(persist_dir, DELETED_FNAME)
+        if self._deleted != self._deleted_on_disk:
+            if self._deleted:
+                rows = np.flatnonzero(~self._alive[:self._size]).astype("<u8")
+                rows.tofile(deleted_path + ".tmp")
+                os.replace(deleted_path + ".tmp", deleted_path)
+            elif os.path.exists(deleted_path):
+                os.remove(deleted_path)
+            self._deleted_on_disk = self._deleted
+
+        table = {"version": 2, "dtype": self.dtype, "dim": dim, "layout": self._disk_layout,
+                 "rows": self._size, "segments": [list(segment) for segment in self._segments]}
+        table_path = os.path.join(persist_dir, SEGMENTS_FNAME)
+        with open(table_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        os.replace(table_path + ".tmp", table_path)
+        # Drop merged segments and row tables of older versions (linked from the previous generation)
+        current = {name for name, _ in self._segments}
+        for name in os.listdir(persist_dir):
+            if (_SEGMENT_RE.match(name) and name not in current) or name in (ROWS_FNAME, VECTORS_INDEX_FNAME):
+                os.remove(os.path.join(persist_dir, name))
+        self._dirty = False
+
+    def _on_disk(self, persist_dir: str) -> bool:
+        """True if the directory holds the files this store last loaded or wrote."""
+        if self._disk_layout is None:
+            return False
+        try:
+            with open(os.path.join(persist_dir, SEGMENTS_FNAME), "r", encoding="utf-8") as f:
+                table = json.load(f)
+            vectors_size = os.path.getsize(os.path.join(persist_dir, VECTORS_FNAME))
+        except (OSError, ValueError):
+            return False
+        row_bytes = table.get("dim", 0) * np.dtype(self.dtype).itemsize
+        return (
+            table.get("layout") == self._disk_layout
+            and table.get("rows") == self._persisted
+            and vectors_size >= self._persisted * row_bytes
+            and all(os.path.exists(os.path.join(persist_dir, name)) for name, _ in table.get("segments", []))
+        )
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, dtype: str = "float32", **kwargs: Any) -> "MmapVectorStore":
+        """
+        Opens a persisted store. A legacy default__vector_store.json is
+        converted on first load (and kept as *.migrated); a single row table
+        of an older version (vectors_rows.bin or vectors_index.json) is
+        replaced by row segments on the next persist.
+        """
+        rows_path = os.path.join(persist_dir, ROWS_FNAME)
+        index_path = os.path.join(persist_dir, VECTORS_INDEX_FNAME)
+        legacy_path = os.path.join(persist_dir, LEGACY_FNAME)
+        segments = _read_segments(persist_dir)
+        deleted = np.zeros(0, dtype=np.int64)
+        if segments is not None:
+            table, ids, ref_doc_ids, metadata, deleted = segments
+            table_dtype, dim = table["dtype"], table["dim"]
+        elif os.path.exists(rows_path):
+            table_dtype, dim, ids, ref_doc_ids, metadata = _read_row_table(rows_path)
+        elif os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            table_dtype, dim, ids, ref_doc_ids = table["dtype"], table["dim"], table["ids"], table["ref_doc_ids"]
+            metadata = _RowBlobs()
+            for node_id in ids:
+                metadata.append(json.dumps(table.get("metadata", {}).get(node_id, {})).encode("utf-8"))
+        else:
+            store = cls(dtype=dtype, **kwargs)
+            if os.path.exists(legacy_path):
+                print("Converting default__vector_store.json to the binary vector format...")
+                store._load_simple(SimpleVectorStore.from_persist_path(legacy_path))
+                store.persist(legacy_path)
+                os.replace(legacy_path, legacy_path + ".migrated")
+            return store
+
+        store = cls(dtype=table_dtype, **kwargs)
+        count = len(ids)
+        if count:
+            store._buffer = np.memmap(
+                os.path.join(persist_dir, VECTORS_FNAME), dtype=table_dtype, mode="r", shape=(count, dim)
+            )
+            store._alive = np.ones(count, dtype=bool)
+            store._alive[deleted] = False
+            store._writable = False
+        store._size = count
+        store._ids = ids
+        store._ref_doc_ids = ref_doc_ids
+        store._metadata = metadata
+        store._deleted = len(deleted)
+        store._index_rows()
+        if segments is not None:
+            store._disk_layout, store._persisted = table["layout"], count
+            store._segments = [(name, rows) for name, rows in table["segments"]]
+            store._deleted_on_disk = store._deleted
+        store._publish()
+        return store
+
+    def _load_simple(self, simple: SimpleVectorStore):
+        data = simple.data
+        ids = list(data.embedding_dict.keys())
+        with self.batch():
+            self.clear()
+            if ids:
+                matrix = np.asarray([data.embedding_dict[i] for i in ids], dtype=self.dtype)
+                self._buffer, self._size = matrix, len(ids)
+                self._alive = np.ones(len(ids), dtype=bool)
+            self._ids = ids
+            self._ref_doc_ids = [data.text_id_to_ref_doc_id.get(i, "None") for i in ids]
+            metadata = data.metadata_dict or {}
+            for node_id in ids:
+                self._metadata.append(json.dumps(metadata.get(node_id, {})).encode("utf-8"))
+            self._index_rows()
+
+    def to_simple_vector_store(self) -> SimpleVectorStore:
+        """Converts back to LlamaIndex's default JSON-persisted store."""
+        simple = SimpleVectorStore()
+        snapshot = self._snapshot
+        for row in np.flatnonzero(snapshot.alive):
+            node_id = snapshot.ids[row]
+            simple.data.embedding_dict[node_id] = snapshot.matrix[row].astype(np.float32).tolist()
+            simple.data.text_id_to_ref_doc_id[node_id] = snapshot.ref_doc_ids[row]
+            simple.data.metadata_dict[node_id] = json.loads(snapshot.metadata[row])
+        return simple
+
+
+def export_legacy(persist_dir: str, output_dir: str):
+    """
+    Writes a storage directory that stock LlamaIndex can load (for rolling
+    back): default__vector_store.json from the binary store, the docstore
+    with its change logs folded in and the index store with its node id map.
+    """
+    from llama_index.core.data_structs.data_structs import IndexDict
+    from llama_index.core.storage.index_store import SimpleIndexStore
+    from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+    from docstore_log import LogKVStore
+
+    os.makedirs(output_dir, exist_ok=True)
+    store = MmapVectorStore.from_persist_dir(persist_dir)
+    store.to_simple_vector_store().persist(os.path.join(output_dir, LEGACY_FNAME))
+    docstore_path = os.path.join(persist_dir, "docstore.json")
+    if os.path.exists(docstore_path):
+        data = LogKVStore.from_persist_path(docstore_path).to_dict()
+        SimpleKVStore(data).persist(os.path.join(output_dir, "docstore.json"))
+    index_store_path = os.path.join(persist_dir, "index_store.json")
+    if os.path.exists(index_store_path):
+        index_store = SimpleIndexStore.from_persist_path(index_store_path)
+        for struct in index_store.index_structs():
+            if isinstance(struct, IndexDict):
+                struct.nodes_dict = {node_id: node_id for node_id in store.node_ids()}
+                index_store.add_index_struct(struct)
+        index_store.persist(os.path.join(output_dir, "index_store.json"))
+    for name in ("graph_store.json", "image__vector_store.json"):
+        if os.path.exists(os.path.join(persist_dir, name)):
+            shutil.copy2(os.path.join(persist_dir, name), os.path.join(output_dir, name))
+
+
+if __name__ == "__main__":
+    import argparse
+    import config
+    import index_storage
+
+    parser = argparse.ArgumentParser(description="Convert between vector store formats.")
+    parser.add_argument("action", choices=["migrate", "export"],
+                        help="migrate: JSON -> binary, export: binary -> a stock LlamaIndex directory")
+    parser.add_argument("--persist-dir", default=config.STORAGE_DIR)
+    parser.add_argument("--output", help="export: target directory (default: <persist-dir>/export)")
+    args = parser.parse_args()
+    # Operates on the committed generation (or a legacy flat directory)
+    persist_dir = index_storage.resolve(args.persist_dir) or args.persist_dir
+    if args.action == "migrate":
+        MmapVectorStore.from_persist_dir(persist_dir, dtype=config.VECTOR_DTYPE)
+    else:
+        export_legacy(persist_dir, args.output or os.path.join(args.persist_dir, "export"))
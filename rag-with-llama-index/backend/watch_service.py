@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+import config
+from rag_service import RAGService
+from sync_service import load_manifest, apply_changes
+
+try:
+    # inotify (Linux) / FSEvents / ReadDirectoryChangesW backed watcher
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "DataDirectoryWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        self.watcher.notify()
+
+
+class DataDirectoryWatcher:
+    """
+    Keeps a live RAGService in sync with its data directory.
+
+    File system events (or, without watchdog, a periodic stat scan) only mark
+    the directory as dirty. Once no new event has arrived for
+    WATCH_DEBOUNCE_SECONDS, all pending changes are applied in one batch via
+    `apply_changes`. The index and manifest are persisted at most every
+    WATCH_PERSIST_INTERVAL seconds, and once more on stop().
+    """
+
+    def __init__(self, rag: RAGService):
+        self.rag = rag
+        self.manifest = load_manifest(rag.manifest_file)
+        self._last_event = None
+        self._event = threading.Event()
+        self._stop = threading.Event()
+        self._dirty = False  # changes applied but not persisted yet
+        self._last_persist = time.monotonic()
+        self._observer = None
+        self._threads = []
+
+    def notify(self):
+        """Records a change in the data directory."""
+        self._last_event = time.monotonic()
+        self._event.set()
+
+    def _snapshot(self):
+        entries = {}
+        try:
+            with os.scandir(self.rag.data_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        st = entry.stat()
+                        entries[entry.name] = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            return None  # directory absent (e.g. unmounted); apply_changes leaves the index alone
+        return entries
+
+    def _poll(self):
+        previous = self._snapshot()
+        while not self._stop.wait(config.WATCH_POLL_INTERVAL):
+            current = self._snapshot()
+            if current != previous:
+                previous = current
+                self.notify()
+
+    def _apply(self):
+        try:
+            new_manifest, changed, deleted = apply_changes(self.rag, self.manifest)
+        except FileNotFoundError:
+            print(f"Data directory {self.rag.data_dir} does not exist; index left unchanged.")
+            return
+        except Exception as e:
+            print(f"Error applying data directory changes: {e}")
+            return
+        if changed or deleted:
+            print(f"Watcher applied {len(changed)} new or modified and {len(deleted)} deleted files.")
+        if new_manifest != self.manifest:
+            self.manifest = new_manifest
+            self._dirty = True
+
+    def persist(self):
+        """Persists the index and manifest if changes were applied since the last call."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        self.rag.persist_index(manifest=self.manifest)
+        self._last_persist = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._event.wait(timeout=1.0)
+            now = time.monotonic()
+            if self._event.is_set() and now - self._last_event >= config.WATCH_DEBOUNCE_SECONDS:
+                self._event.clear()
+                self._apply()
+            if self._dirty and now - self._last_persist >= config.WATCH_PERSIST_INTERVAL:
+                self.persist()
+            if self._event.is_set():
+                # Still inside the debounce window, don't spin on the set event
+                self._stop.wait(min(0.2, config.WATCH_DEBOUNCE_SECONDS))
+
+    def start(self):
+        if Observer is not None and os.path.isdir(self.rag.data_dir):
+            self._observer = Observer()
+            self._observer.schedule(_ChangeHandler(self), self.rag.data_dir, recursive=False)
+            self._observer.start()
+            print("Watching data directory with file system events.")
+        else:
+            poller = threading.Thread(target=self._poll, name="data-dir-poller", daemon=True)
+            poller.start()
+            self._threads.append(poller)
+            reason = "watchdog not installed" if Observer is None else "data directory missing"
+            print(f"{reason}; polling data directory every {config.WATCH_POLL_INTERVAL}s.")
+        # Catch up with changes made while nothing was watching
+        self.notify()
+        worker = threading.Thread(target=self._run, name="data-dir-watcher", daemon=True)
+        worker.start()
+        self._threads.append(worker)
+
+    def stop(self):
+        """Stops watching and persists any pending changes."""
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+        # Pick up changes that arrived inside the last debounce window
+        self._event.clear()
+        self._apply()
+        self.persist()
+
+
+if __name__ == "__main__":
+    watcher = DataDirectoryWatcher(RAGService())
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -1,4 +1,5 @@
 
+import json
 import streamlit as st
 import requests
 
@@ -9,23 +10,40 @@ if "chat_history" not in st.session_state:
     st.session_state["chat_history"] = []
 
 API_URL = "http://localhost:5000/chat"  # Updated to match backend
+STREAM_URL = API_URL + "/stream"
+
+USER_BUBBLE = """
+    <div style='text-align: right; background-color: #22223b; color: #fff; padding: 12px; border-radius: 12px; margin: 6px 0; box-shadow: 0 2px 8px rgba(34,34,59,0.08);'>
+        <b>You:</b> {message}
+    </div>
+"""
+BOT_BUBBLE = """
+    <div style='text-align: left; background-color: #22223b; color: #fff; padding: 12px; border-radius: 12px; margin: 6px 0; box-shadow: 0 2px 8px rgba(34,34,59,0.08);'>
+        <b>Ani-Farm:</b> {message}
+    </div>
+"""
+
+
+def iter_sse(response):
+    """Yields (event, payload) pairs from a server-sent events response."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
 
 chat_container = st.container()
 
 with chat_container:
     for sender, message in st.session_state["chat_history"]:
         if sender == "You":
-            st.markdown(f"""
-                <div style='text-align: right; background-color: #22223b; color: #fff; padding: 12px; border-radius: 12px; margin: 6px 0; box-shadow: 0 2px 8px rgba(34,34,59,0.08);'>
-                    <b>You:</b> {message}
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(USER_BUBBLE.format(message=message), unsafe_allow_html=True)
         else:
-            st.markdown(f"""
-                <div style='text-align: left; background-color: #22223b; color: #fff; padding: 12px; border-radius: 12px; margin: 6px 0; box-shadow: 0 2px 8px rgba(34,34,59,0.08);'>
-                    <b>Ani-Farm:</b> {message}
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(BOT_BUBBLE.format(message=message), unsafe_allow_html=True)
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
@@ -37,9 +55,22 @@ with col2:
 
 if send_clicked and user_message:
     st.session_state["chat_history"].append(("You", user_message))
+    with chat_container:
+        st.markdown(USER_BUBBLE.format(message=user_message), unsafe_allow_html=True)
+        placeholder = st.empty()
+
+    chat_response = ""
     try:
-        response = requests.post(API_URL, json={"prompt": user_message})
-        chat_response = response.json().get("response", "No response")
+        with requests.post(STREAM_URL, json={"prompt": user_message}, stream=True, timeout=(5, 300)) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            for event, payload in iter_sse(response):
+                if event == "token":
+                    chat_response += payload["token"]
+                    placeholder.markdown(BOT_BUBBLE.format(message=chat_response + "▌"), unsafe_allow_html=True)
+                elif event == "error":
+                    chat_response = f"Error: {payload.get('details')}"
+        chat_response = chat_response or "No response"
     except Exception as e:
         chat_response = f"Error: {e}"
     st.session_state["chat_history"].append(("Bot", chat_response))
@@ -0,0 +1,93 @@
+"""
+Ingestion benchmark for the backend's parse-and-split stage.
+
+Generates a synthetic text corpus and compares serial parsing (one reader
+and splitter in this process) with the backend's process pool at several
+worker counts. Reports docs/sec, chunks/sec and the largest chunk in tokens,
+which must stay within the chunk size:
+
+    python python-scripts/bench_ingestion.py --docs 2000 --words 3000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import config  # noqa: E402
+import ingestion  # noqa: E402
+from llama_index.core.utils import get_tokenizer  # noqa: E402
+
+
+def synthetic_corpus(directory: str, docs: int, words: int, seed: int = 42):
+    """Writes `docs` files of roughly `words` words of sentence-like text."""
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    paths = []
+    for i in range(docs):
+        sentences, count = [], 0
+        while count < words:
+            length = rng.randint(6, 24)
+            sentence = " ".join(rng.choice(vocabulary) for _ in range(length))
+            sentences.append(sentence.capitalize() + ".")
+            count += length
+            if rng.random() < 0.1:
+                sentences.append("\n\n")
+        path = os.path.join(directory, f"doc_{i:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+        paths.append(path)
+    return paths
+
+
+def report(name: str, elapsed: float, docs: int, nodes):
+    tokenizer = get_tokenizer()
+    largest = max((len(tokenizer(node.get_content())) for node in nodes), default=0)
+    print(f"{name:<18} {elapsed:>8.2f} {docs / elapsed:>10.1f} {len(nodes) / elapsed:>12.1f} "
+          f"{len(nodes):>9} {largest:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document parsing and splitting.")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=3000, help="Approximate words per document")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=config.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=config.CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="ingest-bench-")
+    try:
+        paths = synthetic_corpus(directory, args.docs, args.words)
+        size_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        print(f"Corpus: {args.docs} documents, {size_mb:.1f} MB, chunk size {args.chunk_size} tokens")
+        print(f"{'mode':<18} {'seconds':>8} {'docs/sec':>10} {'chunks/sec':>12} {'chunks':>9} {'max tokens':>11}")
+
+        start = time.perf_counter()
+        nodes = [node for path in paths for node in ingestion.parse_file(path, args.chunk_size, args.chunk_overlap)]
+        report("serial", time.perf_counter() - start, len(paths), nodes)
+
+        config.INGEST_PARALLEL_MIN_FILES = 1
+        for workers in args.workers:
+            if workers <= 1:
+                continue
+            config.INGEST_WORKERS = workers
+            ingestion.shutdown_pool()
+            ingestion.parse_files(paths[:workers])  # warm-up: start the workers
+            start = time.perf_counter()
+            nodes = ingestion.parse_files(paths, args.chunk_size, args.chunk_overlap)
+            report(f"pool x{workers}", time.perf_counter() - start, len(paths), nodes)
+        ingestion.shutdown_pool()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
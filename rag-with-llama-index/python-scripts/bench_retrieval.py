@@ -0,0 +1,93 @@
+"""
+Retrieval benchmark for the backend's MmapVectorStore.
+
+Compares LlamaIndex's per-node SimpleVectorStore scoring with the vectorized
+store in float32, float16 and int8 (+ exact re-rank) modes on synthetic
+embeddings. Reports query latency and recall@k against exact search:
+
+    python python-scripts/bench_retrieval.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from llama_index.core.schema import TextNode  # noqa: E402
+from llama_index.core.vector_stores import SimpleVectorStore  # noqa: E402
+from llama_index.core.vector_stores.types import VectorStoreQuery  # noqa: E402
+from vector_store import MmapVectorStore  # noqa: E402
+
+
+def synthetic_embeddings(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than pure noise."""
+    centers = rng.normal(size=(max(n // 500, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_store(store, vectors: np.ndarray, batch: int = 20000):
+    for start in range(0, len(vectors), batch):
+        store.add([
+            TextNode(id_=str(i), text="", embedding=vectors[i].tolist())
+            for i in range(start, min(start + batch, len(vectors)))
+        ])
+    return store
+
+
+def time_queries(store, queries: np.ndarray, k: int):
+    latencies, results = [], []
+    for q in queries:
+        query = VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=k)
+        start = time.perf_counter()
+        result = store.query(query)
+        latencies.append(time.perf_counter() - start)
+        results.append(result.ids)
+    return np.array(latencies) * 1000, results
+
+
+def recall(results, truth) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / sum(len(t) for t in truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector retrieval backends.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384, help="bge-small-en-v1.5 is 384-d")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--simple-max", type=int, default=100_000,
+                        help="Skip SimpleVectorStore above this size (it is very slow)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'chunks':>9} {'backend':<22} {'p50 ms':>9} {'p95 ms':>9} {'recall@k':>9}")
+    for n in args.sizes:
+        vectors = synthetic_embeddings(n, args.dim, rng)
+        queries = synthetic_embeddings(args.queries, args.dim, rng)
+
+        exact = build_store(MmapVectorStore(), vectors)
+        backends = [("mmap float32", exact)]
+        if n <= args.simple_max:
+            backends.insert(0, ("SimpleVectorStore", build_store(SimpleVectorStore(), vectors)))
+        backends.append(("mmap float16", build_store(MmapVectorStore(dtype="float16"), vectors)))
+        int8 = MmapVectorStore(quantization="int8")
+        int8._snapshot = exact._snapshot  # same rows, scored through int8 codes
+        backends.append(("mmap int8 + rerank", int8))
+
+        _, truth = time_queries(exact, queries[:1], args.top_k)  # warm-up
+        _, truth = time_queries(exact, queries, args.top_k)
+        for name, store in backends:
+            time_queries(store, queries[:1], args.top_k)  # warm-up (builds norms / int8 codes)
+            latencies, results = time_queries(store, queries, args.top_k)
+            print(f"{n:>9} {name:<22} {np.percentile(latencies, 50):>9.2f} "
+                  f"{np.percentile(latencies, 95):>9.2f} {recall(results, truth):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
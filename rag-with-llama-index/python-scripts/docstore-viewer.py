@@ -1,122 +1,68 @@
-import json
 import io
+import math
+import os
+import sys
 from pathlib import Path
 from typing import Dict, Any, List, Tuple, Optional, Union
 
 import streamlit as st
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# ------------------------- Helpers -------------------------
+from docstore_index import (  # noqa: E402
+    DocstoreIndex,
+    SearchIndex,
+    compute_stats,
+    decode_relationships,
+    get_node_payload,
+    get_node_text,
+    group_roots_and_nodes,
+    resolve_root_file_path,
+)
 
-def load_docstore_json(src: Optional[Union[io.BytesIO, str, Path]]) -> Dict[str, Any]:
-    """Load a docstore.json either from an uploaded file or a filesystem path."""
-    if src is None:
-        return {}
-    if hasattr(src, "read"):  # Uploaded file-like (BytesIO)
-        data = src.read()
-        return json.loads(data.decode("utf-8"))
-    p = Path(src)
-    with p.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def group_roots_and_nodes(docstore: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
-    """Return the three main sections we care about."""
-    meta = docstore.get("docstore/metadata", {}) or {}
-    ref = docstore.get("docstore/ref_doc_info", {}) or {}
-    data = docstore.get("docstore/data", {}) or {}
-    return meta, ref, data
-
-
-def get_node_payload(node_obj: Dict[str, Any]) -> Dict[str, Any]:
-    """Return the payload for a node, accounting for version differences."""
-    return node_obj.get("__data__", {}) or {}
-
-
-def get_node_text(payload: Dict[str, Any]) -> str:
-    """Extract the text content from a node payload (handles common variants)."""
-    return (
-        payload.get("text")
-        or payload.get("document", {}).get("text")
-        or payload.get("raw_text")
-        or ""
-    )
 
+# ------------------------- Helpers -------------------------
 
-def decode_relationships(rels: Dict[str, Any]) -> List[Dict[str, str]]:
-    """
-    Best-effort decoding of relationship types.
-    Common persisted mapping: 1=PARENT, 2=PREVIOUS, 3=NEXT.
-    """
-    mapping = {"1": "PARENT", "2": "PREVIOUS", "3": "NEXT"}
-    decoded: List[Dict[str, str]] = []
-    if not isinstance(rels, dict):
-        return decoded
-    for code, info in rels.items():
-        kind = mapping.get(str(code), "REL_" + str(code))
-        node_id = ""
-        if isinstance(info, dict):
-            node_id = str(info.get("node_id", ""))
-        decoded.append({"kind": kind, "node_id": node_id})
-    return decoded
-
-
-def resolve_root_file_path(root_id: str, ref: Dict[str, Any], data: Dict[str, Any]) -> Optional[str]:
+@st.cache_resource(show_spinner="Indexing docstore...", max_entries=4)
+def open_docstore(path: str, mtime_ns: int, size: int) -> DocstoreIndex:
     """
-    Resolve a root's file path, using ref_doc_info metadata if present; otherwise,
-    peek at the first node's metadata for file_path/filepath/path/source.
+    Offset index of a docstore file, built once per file version: mtime and
+    size are part of the cache key, so an edited file is indexed again.
     """
-    info = ref.get(root_id, {}) if isinstance(root_id, str) else {}
-    md = info.get("metadata", {}) if isinstance(info, dict) else {}
-    fp = None
-    for k in ("file_path", "filepath", "path", "source"):
-        v = md.get(k)
-        if v:
-            fp = str(v)
-            break
-    if fp:
-        return fp
-
-    node_ids = info.get("node_ids", []) if isinstance(info, dict) else []
-    if isinstance(node_ids, (str, bytes)):
-        node_ids = [node_ids]
-    for nid in node_ids[:1]:
-        payload = get_node_payload(data.get(nid, {}))
-        nmd = payload.get("metadata", {}) or {}
-        for k in ("file_path", "filepath", "path", "source"):
-            v = nmd.get(k)
-            if v:
-                return str(v)
-    return None
-
-
-def count_nodes_for_root(root_id: str, ref: Dict[str, Any]) -> int:
-    node_ids = ref.get(root_id, {}).get("node_ids", [])
-    if isinstance(node_ids, (str, bytes)):
-        return 1
-    return len(node_ids or [])
-
-
-def find_orphan_nodes(meta: Dict[str, Any], ref: Dict[str, Any]) -> List[str]:
-    """
-    Nodes that have a ref_doc_id pointing to a root not present in ref_doc_info.
-    """
-    roots = set(ref.keys())
-    orphans: List[str] = []
-    for obj_id, m in meta.items():
-        if not isinstance(m, dict):
-            continue
-        r = m.get("ref_doc_id")
-        if r and r not in roots:
-            orphans.append(obj_id)
-    return orphans
+    return DocstoreIndex.open(path)
+
+
+@st.cache_resource(show_spinner="Indexing docstore...", max_entries=4)
+def open_uploaded_docstore(file_key: str, _data: bytes) -> DocstoreIndex:
+    """Offset index of an uploaded docstore (the bytes are not hashed, the key is)."""
+    return DocstoreIndex(_data, source=file_key)
+
 
+@st.cache_resource(show_spinner="Computing statistics...", max_entries=4)
+def docstore_stats(_docstore: DocstoreIndex, version: str) -> Dict[str, Any]:
+    """Orphans, per-root counts and missing chunks, computed once per file version."""
+    return compute_stats(_docstore)
 
-def search_match(text: str, query: str) -> bool:
-    if not query:
-        return True
-    q = query.lower().strip()
-    return q in (text or "").lower()
+
+@st.cache_resource(show_spinner="Building search index...", max_entries=4)
+def docstore_search_index(_docstore: DocstoreIndex, version: str) -> SearchIndex:
+    """Inverted index over chunk texts and ids, built once per file version."""
+    return SearchIndex.build(_docstore)
+
+
+def load_docstore(src: Optional[Union[io.BytesIO, str, Path]]) -> Tuple[DocstoreIndex, str]:
+    """
+    Index a docstore.json from an uploaded file or a filesystem path (cached across reruns).
+
+    Returns:
+        tuple: (index, version key for the caches derived from it)
+    """
+    if hasattr(src, "getvalue"):  # Uploaded file-like (BytesIO)
+        key = getattr(src, "file_id", None) or f"{getattr(src, 'name', 'upload')}:{getattr(src, 'size', 0)}"
+        return open_uploaded_docstore(key, src.getvalue()), f"upload:{key}"
+    p = Path(src).resolve()
+    stat = p.stat()
+    return open_docstore(str(p), stat.st_mtime_ns, stat.st_size), f"{p}:{stat.st_mtime_ns}:{stat.st_size}"
 
 
 # ------------------------- UI -------------------------
@@ -133,7 +79,11 @@ with st.sidebar:
 
     st.markdown("---")
     st.subheader("Filters")
-    query = st.text_input("Search (chunk id or text)", help="Case-insensitive substring search.")
+    query = st.text_input(
+        "Search (chunk id or text)",
+        help="Ranked word search across all roots; words match as prefixes, ids by prefix.",
+    )
+    max_results = st.number_input("Max search results", min_value=1, max_value=5000, value=200)
     show_text = st.checkbox("Show text in expanders", True)
     show_metadata = st.checkbox("Show metadata", True)
     show_relationships = st.checkbox("Show relationships", True)
@@ -141,39 +91,106 @@ with st.sidebar:
     st.markdown("---")
     st.subheader("Display")
     collapse_all = st.checkbox("Start chunks collapsed", True)
-    max_chunks = st.number_input("Max chunks per root to display", min_value=1, max_value=5000, value=200)
+    roots_per_page = st.number_input("Roots per page", min_value=1, max_value=500, value=10)
+    max_chunks = st.number_input("Chunks per page (per root)", min_value=1, max_value=5000, value=50)
 
 # Load data
 try:
-    docstore = load_docstore_json(uploaded if uploaded else default_path)
+    docstore, version = load_docstore(uploaded if uploaded else default_path)
 except Exception as e:
     st.error(f"Failed to load JSON: {e}")
     st.stop()
 
 meta, ref, data = group_roots_and_nodes(docstore)
+stats = docstore_stats(docstore, version)
 
 # Summary metrics
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("Roots (reference docs)", len(ref))
+    st.metric("Roots (reference docs)", stats["roots"])
 with col2:
-    st.metric("Metadata entries", len(meta))
+    st.metric("Metadata entries", stats["metadata_entries"])
 with col3:
-    st.metric("Nodes (in data)", len(data))
+    st.metric("Nodes (in data)", stats["nodes"])
 with col4:
-    st.metric("Orphan nodes", len(find_orphan_nodes(meta, ref)))
+    st.metric("Orphan nodes", len(stats["orphans"]))
 
 st.markdown("---")
 
-# Show each root
-if not ref:
+
+def page_slice(items: List[Any], page_size: int, label: str, key: str) -> List[Any]:
+    """Renders a page selector when needed and returns the items of the selected page."""
+    pages = max(1, math.ceil(len(items) / page_size))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"{label} page (of {pages})", min_value=1, max_value=pages, value=1, key=key)
+    start = (page - 1) * page_size
+    return items[start:start + page_size]
+
+
+def render_chunk(nid: str, title: str):
+    """Renders one chunk in an expander; its payload is decoded only here."""
+    payload = get_node_payload(data.get(nid) or {})
+    text = get_node_text(payload)
+    with st.expander(title, expanded=not collapse_all):
+        cols = st.columns([2, 2, 1])
+        with cols[0]:
+            st.markdown("**Node ID**")
+            st.code(nid, language="text")
+        with cols[1]:
+            start = payload.get("start_char_idx")
+            end = payload.get("end_char_idx")
+            st.markdown("**Span**")
+            st.write(f"{start} – {end}" if start is not None else "n/a")
+        with cols[2]:
+            st.markdown("**MIME**")
+            st.write(payload.get("mimetype", "n/a"))
+
+        if show_metadata:
+            st.markdown("**Metadata**")
+            st.json(payload.get("metadata", {}) or {})
+
+        if show_relationships:
+            st.markdown("**Relationships**")
+            rels = decode_relationships(payload.get("relationships", {}) or {})
+            if rels:
+                st.table(rels)
+            else:
+                st.write("None")
+
+        if show_text:
+            st.markdown("**Text**")
+            if text:
+                st.text(text)
+            else:
+                st.info("No text field found in this node payload.")
+
+
+if query.strip():
+    # Ranked results across all roots
+    results = docstore_search_index(docstore, version).search(query, top_k=int(max_results))
+    st.subheader(f"🔎 {len(results)} results for \"{query.strip()}\"")
+    if not results:
+        st.warning("No chunks match the current search.")
+    for nid, root_id, score in page_slice(results, int(max_chunks), "Result", "result-page"):
+        file_path = resolve_root_file_path(root_id, ref, data) if root_id in ref else None
+        match = "id match" if math.isinf(score) else f"score {score:.2f}"
+        render_chunk(nid, f"{file_path or root_id or 'Unknown root'} • Chunk: {nid} • {match}")
+
+# Show the roots of the current page
+elif not ref:
     st.info("No `docstore/ref_doc_info` found.")
 else:
-    for root_id, info in ref.items():
+    root_ids = list(ref.keys())
+    page_roots = page_slice(root_ids, int(roots_per_page), "Root", "root-page")
+    st.caption(f"Showing {len(page_roots)} of {len(root_ids)} roots.")
+    for root_id in page_roots:
+        info = ref[root_id]
         file_path = resolve_root_file_path(root_id, ref, data) or "Unknown file"
         node_ids = info.get("node_ids", []) or []
         if isinstance(node_ids, (str, bytes)):
             node_ids = [node_ids]
+        declared, present = stats["per_root"].get(root_id, (len(node_ids), 0))
 
         # Root header block
         st.subheader(f"📄 {file_path}")
@@ -183,9 +200,8 @@ else:
             st.code(str(root_id), language="text")
         with root_cols[1]:
             st.markdown("**Chunks declared**")
-            st.write(len(node_ids))
+            st.write(declared)
         with root_cols[2]:
-            present = sum(1 for nid in node_ids if nid in data)
             st.markdown("**Chunks found in data**")
             st.write(present)
         with root_cols[3]:
@@ -197,62 +213,21 @@ else:
                 st.markdown("**Summary**")
                 st.write(f"{ftype} • {fsize} bytes • modified {mod}")
 
-        # List chunks with expanders
-        displayed = 0
-        for nid in node_ids:
-            if displayed >= max_chunks:
-                break
-            node_obj = data.get(nid)
-            payload = get_node_payload(node_obj or {})
-            text = get_node_text(payload)
-
-            # Apply search filter (by id or text)
-            if not (search_match(nid, query) or search_match(text, query)):
-                continue
-
-            title = f"Chunk: {nid}"
-            with st.expander(title, expanded=not collapse_all):
-                cols = st.columns([2, 2, 1])
-                with cols[0]:
-                    st.markdown("**Node ID**")
-                    st.code(nid, language="text")
-                with cols[1]:
-                    start = payload.get("start_char_idx")
-                    end = payload.get("end_char_idx")
-                    st.markdown("**Span**")
-                    st.write(f"{start} – {end}" if start is not None else "n/a")
-                with cols[2]:
-                    st.markdown("**MIME**")
-                    st.write(payload.get("mimetype", "n/a"))
-
-                if show_metadata:
-                    st.markdown("**Metadata**")
-                    st.json(payload.get("metadata", {}) or {})
-
-                if show_relationships:
-                    st.markdown("**Relationships**")
-                    rels = decode_relationships(payload.get("relationships", {}) or {})
-                    if rels:
-                        st.table(rels)
-                    else:
-                        st.write("None")
-
-                if show_text:
-                    st.markdown("**Text**")
-                    if text:
-                        st.text(text)
-                    else:
-                        st.info("No text field found in this node payload.")
-
-            displayed += 1
-
-        if displayed == 0:
-            st.warning("No chunks match the current filter for this document.")
+        if root_id in stats["missing"]:
+            st.warning(f"{len(stats['missing'][root_id])} declared chunks are missing from `docstore/data`.")
+
+        # List chunks of the current chunk page with expanders
+        node_ids = [nid for nid in node_ids if nid in data]
+        for nid in page_slice(node_ids, int(max_chunks), "Chunk", f"chunk-page-{root_id}"):
+            render_chunk(nid, f"Chunk: {nid}")
+
+        if not node_ids:
+            st.warning("No chunks of this document were found in the data.")
 
 # Orphans section (if any)
-orphans = find_orphan_nodes(meta, ref)
+orphans = stats["orphans"]
 if orphans:
     st.markdown("---")
     st.subheader("⚠️ Orphan Nodes (ref_doc_id not present in ref_doc_info)")
-    for nid in orphans:
+    for nid in page_slice(orphans, int(max_chunks), "Orphan", "orphan-page"):
         st.code(nid, language="text")
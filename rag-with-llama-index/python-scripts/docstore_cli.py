@@ -0,0 +1,368 @@
+"""
+Headless inspection and maintenance of a persisted LlamaIndex docstore.
+
+PATH is a docstore.json, or a storage directory (the backend's STORAGE_DIR
+or a collection's storage directory), whose committed generation is used:
+
+    python python-scripts/docstore_cli.py stats backend/files/storage
+    python python-scripts/docstore_cli.py validate backend/files/storage --json
+    python python-scripts/docstore_cli.py compact backend/files/storage --dry-run
+
+The file is memory-mapped and indexed once; node payloads are then decoded
+one at a time, so memory grows with the number of entries, not their size.
+
+Exit codes (for cron jobs and CI):
+    0  success; for validate, no problems found
+    1  validate found problems (see --fail-on)
+    2  the docstore could not be read or the arguments are invalid
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from docstore_index import (  # noqa: E402
+    REF_DOC_INFO,
+    SECTIONS,
+    DocstoreFormatError,
+    DocstoreIndex,
+    compute_stats,
+    get_node_payload,
+    get_node_text,
+    resolve_root_file_path,
+)
+
+EXIT_OK, EXIT_PROBLEMS, EXIT_ERROR = 0, 1, 2
+DOCSTORE_FNAME = "docstore.json"
+PROBLEM_KINDS = ("orphans", "missing", "dangling", "duplicates")
+
+
+# ------------------------- Loading -------------------------
+
+def resolve_docstore(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Returns (docstore file, storage directory or None). A storage directory is
+    resolved through its CURRENT generation (see backend/index_storage.py).
+    """
+    if os.path.isfile(path):
+        return path, None
+    if not os.path.isdir(path):
+        raise FileNotFoundError(path)
+    import index_storage
+    load_dir = index_storage.resolve(path)
+    if load_dir is None or not os.path.isfile(os.path.join(load_dir, DOCSTORE_FNAME)):
+        raise FileNotFoundError(f"No persisted docstore in {path}")
+    return os.path.join(load_dir, DOCSTORE_FNAME), path
+
+
+def fold_change_logs(docstore_path: str) -> Optional[str]:
+    """
+    The backend appends docstore changes to change logs next to docstore.json
+    (see backend/docstore_log.py). If there are any, writes the docstore with
+    them applied to a temp file and returns its path (the caller removes it);
+    otherwise returns None.
+    """
+    from docstore_log import LogKVStore, log_files
+    if not log_files(docstore_path):
+        return None
+    data = LogKVStore.from_persist_path(docstore_path).to_dict()
+    fd, path = tempfile.mkstemp(suffix=".json", prefix="docstore-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return path
+
+
+def distribution(values: array) -> Dict[str, float]:
+    """Count, mean, min, percentiles and max of a list of sizes."""
+    if not len(values):
+        return {"count": 0}
+    sizes = np.frombuffer(values, dtype=np.uint32) if values.typecode == "I" else np.asarray(values)
+    p50, p90, p99 = np.percentile(sizes, [50, 90, 99])
+    return {
+        "count": int(len(sizes)),
+        "mean": round(float(sizes.mean()), 1),
+        "min": int(sizes.min()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": int(sizes.max()),
+    }
+
+
+# ------------------------- Validation -------------------------
+
+def _relationship_ids(relationships: Any) -> List[str]:
+    """Node ids referenced by a relationships dict (single and list-valued entries)."""
+    ids = []
+    if not isinstance(relationships, dict):
+        return ids
+    for info in relationships.values():
+        for item in info if isinstance(info, list) else [info]:
+            if isinstance(item, dict) and item.get("node_id"):
+                ids.append(str(item["node_id"]))
+    return ids
+
+
+def analyze(index: DocstoreIndex, samples: int = 20) -> Dict[str, Any]:
+    """
+    One streaming pass over all node payloads on top of compute_stats.
+
+    Duplicate chunk hashes are grouped by a 64-bit prefix of the hash first
+    (8 bytes per chunk) and only the colliding groups are compared in full.
+
+    Returns:
+        dict: counts, problem lists (truncated to `samples` ids each in the
+        report, full counts kept) and size distributions.
+    """
+    meta, ref, data = index.sections()
+    stats = compute_stats(index)
+
+    dangling: List[Tuple[str, str]] = []
+    dangling_count = 0
+    text_chars, entry_bytes = array("I"), array("I")
+    for node_id, node_obj in data.stream():
+        payload = get_node_payload(node_obj if isinstance(node_obj, dict) else {})
+        text_chars.append(min(len(get_node_text(payload)), 2 ** 32 - 1))
+        start, end = data.span(node_id)
+        entry_bytes.append(min(end - start, 2 ** 32 - 1))
+        for target in _relationship_ids(payload.get("relationships")):
+            if target not in data and target not in ref and target not in meta:
+                dangling_count += 1
+                if len(dangling) < samples:
+                    dangling.append((node_id, target))
+
+    # Duplicate chunk hashes (roots are documents, not chunks, and are skipped)
+    first_by_prefix: Dict[int, str] = {}
+    colliding: Dict[int, List[str]] = {}
+    for obj_id, m in meta.stream():
+        if not isinstance(m, dict) or not m.get("ref_doc_id") or not m.get("doc_hash"):
+            continue
+        try:
+            prefix = int(str(m["doc_hash"])[:16], 16)
+        except ValueError:
+            prefix = hash(m["doc_hash"])
+        if prefix in first_by_prefix:
+            colliding.setdefault(prefix, [first_by_prefix[prefix]]).append(obj_id)
+        else:
+            first_by_prefix[prefix] = obj_id
+    del first_by_prefix
+    duplicates: List[List[str]] = []
+    for ids in colliding.values():
+        by_hash: Dict[str, List[str]] = {}
+        for obj_id in ids:
+            by_hash.setdefault(meta[obj_id]["doc_hash"], []).append(obj_id)
+        duplicates.extend(group for group in by_hash.values() if len(group) > 1)
+
+    missing_count = sum(len(ids) for ids in stats["missing"].values())
+    roots_by_size = sorted(stats["per_root"].items(), key=lambda item: -item[1][0])
+    return {
+        "source": index.source,
+        "file_bytes": index.size_bytes(),
+        "roots": stats["roots"],
+        "metadata_entries": stats["metadata_entries"],
+        "nodes": stats["nodes"],
+        "problems": {
+            "orphans": len(stats["orphans"]),
+            "missing": missing_count,
+            "dangling": dangling_count,
+            "duplicates": sum(len(group) - 1 for group in duplicates),
+        },
+        "samples": {
+            "orphans": stats["orphans"][:samples],
+            "missing": [[root_id, nid] for root_id, ids in stats["missing"].items() for nid in ids][:samples],
+            "dangling": [list(pair) for pair in dangling],
+            "duplicates": duplicates[:samples],
+        },
+        "sizes": {
+            "text_chars": distribution(text_chars),
+            "entry_bytes": distribution(entry_bytes),
+            "chunks_per_root": distribution(array("I", [declared for declared, _ in stats["per_root"].values()])),
+        },
+        "largest_roots": [
+            {"root_id": root_id, "file_path": resolve_root_file_path(root_id, ref, data), "chunks": declared}
+            for root_id, (declared, _) in roots_by_size[:5]
+        ],
+    }
+
+
+def print_report(report: Dict[str, Any], show_problems: bool):
+    print(f"Docstore: {report['source']} ({report['file_bytes'] / (1024 * 1024):.1f} MB)")
+    print(f"  roots: {report['roots']}  metadata entries: {report['metadata_entries']}  nodes: {report['nodes']}")
+    for name, dist in report["sizes"].items():
+        if dist["count"]:
+            print(f"  {name:<16} mean {dist['mean']:>10}  p50 {dist['p50']:>9.0f}  p90 {dist['p90']:>9.0f}  "
+                  f"p99 {dist['p99']:>9.0f}  max {dist['max']:>9}")
+    if report["largest_roots"]:
+        print("  largest roots:")
+        for root in report["largest_roots"]:
+            print(f"    {root['chunks']:>7} chunks  {root['file_path'] or root['root_id']}")
+    if show_problems:
+        print("Problems:")
+        for kind in PROBLEM_KINDS:
+            print(f"  {kind:<11} {report['problems'][kind]}")
+            for sample in report["samples"][kind]:
+                print(f"      {sample}")
+
+
+# ------------------------- Compaction -------------------------
+
+def _write_compacted(index: DocstoreIndex, out, drop: Set[str], drop_missing: bool, missing: Dict[str, List[str]]):
+    """
+    Streams the kept entries' raw bytes into `out`. Only roots whose declared
+    chunk list changes are decoded and re-encoded.
+    """
+    out.write(b"{")
+    for section_no, name in enumerate(s for s in SECTIONS if s in index.tables):
+        section = index.section(name)
+        out.write(b", " if section_no else b"")
+        out.write(json.dumps(name).encode("utf-8") + b": {")
+        first = True
+        for key in section:
+            if name != REF_DOC_INFO and key in drop:
+                continue
+            if name == REF_DOC_INFO and drop_missing and key in missing:
+                info = dict(section[key])
+                absent = set(missing[key])
+                info["node_ids"] = [nid for nid in info.get("node_ids", []) if nid not in absent]
+                raw = json.dumps(info).encode("utf-8")
+            else:
+                raw = section.raw(key)
+            out.write((b"" if first else b", ") + json.dumps(key).encode("utf-8") + b": " + raw)
+            first = False
+        out.write(b"}")
+    out.write(b"}")
+
+
+def _vector_ids(load_dir: str) -> Set[str]:
+    """Node ids that still have an embedding in the binary vector store, if any."""
+    from vector_store import stored_node_ids
+    return set(stored_node_ids(load_dir))
+
+
+def compact(index: DocstoreIndex, docstore_path: str, storage_dir: Optional[str], output: Optional[str],
+            drop_missing: bool, dry_run: bool) -> Dict[str, Any]:
+    """
+    Drops orphan nodes (metadata and data entries) and, optionally, declared
+    chunk ids missing from data, then atomically replaces the docstore.
+
+    For a storage directory the result is committed as a new generation with
+    all other index files hard-linked, so the served index switches over in
+    one step (and the previous generation stays available). Orphans that
+    still have an embedding are kept, since the retriever could return them.
+    """
+    unknown = [name for name in index.tables if name not in SECTIONS]
+    if unknown:
+        raise DocstoreFormatError(f"Unexpected top-level sections {unknown}; refusing to rewrite")
+    stats = compute_stats(index)
+    drop = set(stats["orphans"])
+    kept_with_vectors = 0
+    if storage_dir is not None:
+        embedded = _vector_ids(os.path.dirname(docstore_path))
+        kept_with_vectors = len(drop & embedded)
+        drop -= embedded
+    result = {
+        "orphans_dropped": len(drop),
+        "orphans_kept_with_vectors": kept_with_vectors,
+        "missing_ids_dropped": sum(len(ids) for ids in stats["missing"].values()) if drop_missing else 0,
+        "bytes_before": index.size_bytes(),
+    }
+    if dry_run or not (drop or result["missing_ids_dropped"]):
+        result["written"] = None
+        return result
+
+    def write_to(path: str):
+        with open(path + ".tmp", "wb") as out:
+            _write_compacted(index, out, drop, drop_missing, stats["missing"])
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(path + ".tmp", path)
+        result["bytes_after"] = os.path.getsize(path)
+        result["written"] = path
+
+    if storage_dir is not None and output is None:
+        import index_storage
+        from docstore_log import log_files
+        # The compacted docstore already holds the changes of its logs
+        logs = [os.path.basename(log) for log in log_files(docstore_path)]
+        with index_storage.Generation(storage_dir) as generation:
+            generation.link_unchanged(exclude=[DOCSTORE_FNAME] + logs)
+            write_to(os.path.join(generation.path, DOCSTORE_FNAME))
+    else:
+        if output is None:
+            from docstore_log import log_files
+            if log_files(docstore_path):
+                raise ValueError(f"{docstore_path} has change logs; compact its storage directory or use --output")
+        write_to(output or docstore_path)
+    return result
+
+
+# ------------------------- Entry point -------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect, validate and compact a LlamaIndex docstore.")
+    parser.add_argument("command", choices=["stats", "validate", "compact"])
+    parser.add_argument("path", help="docstore.json or a storage directory")
+    parser.add_argument("--json", action="store_true", help="Print a machine-readable JSON report")
+    parser.add_argument("--samples", type=int, default=20, help="Example ids listed per problem kind")
+    parser.add_argument("--fail-on", nargs="+", choices=PROBLEM_KINDS, default=list(PROBLEM_KINDS),
+                        help="Problem kinds that make validate exit with 1")
+    parser.add_argument("--output", help="compact: write here instead of replacing the docstore")
+    parser.add_argument("--drop-missing", action="store_true",
+                        help="compact: also remove declared chunk ids that are absent from data")
+    parser.add_argument("--dry-run", action="store_true", help="compact: only report what would be removed")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    folded = None
+    try:
+        docstore_path, storage_dir = resolve_docstore(args.path)
+        folded = fold_change_logs(docstore_path)
+        index = DocstoreIndex.open(folded or docstore_path)
+    except (OSError, ValueError, DocstoreFormatError) as e:
+        print(f"Error: cannot read docstore: {e}", file=sys.stderr)
+        if folded is not None:
+            os.remove(folded)
+        return EXIT_ERROR
+
+    try:
+        if args.command == "compact":
+            result = compact(index, docstore_path, storage_dir, args.output, args.drop_missing, args.dry_run)
+        else:
+            result = analyze(index, samples=args.samples)
+    except (OSError, ValueError) as e:
+        print(f"Error: {args.command} failed: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        index.close()
+        if folded is not None:
+            os.remove(folded)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.command == "compact":
+        action = "Would drop" if args.dry_run else "Dropped"
+        print(f"{action} {result['orphans_dropped']} orphan nodes and {result['missing_ids_dropped']} missing chunk ids"
+              f" ({result['orphans_kept_with_vectors']} orphans kept: still in the vector store).")
+        if result.get("written"):
+            print(f"Wrote {result['written']}: {result['bytes_before']} -> {result['bytes_after']} bytes.")
+    else:
+        print_report(result, show_problems=args.command == "validate")
+        print(f"Done in {result['seconds']}s.")
+
+    if args.command == "validate" and any(result["problems"][kind] for kind in args.fail_on):
+        return EXIT_PROBLEMS
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
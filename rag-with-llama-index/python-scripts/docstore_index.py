@@ -0,0 +1,522 @@
+"""
+Lazily decoded view of a LlamaIndex docstore.json.
+
+A single pass over the raw bytes (memory-mapped for files) records where
+each entry of the three docstore sections starts and ends. Entries are only
+parsed with json.loads when they are accessed, so opening a multi-hundred-MB
+docstore costs one scan and a compact offset table instead of the whole
+object tree:
+
+    index = DocstoreIndex.open("docstore.json")
+    data = index.section(DATA)          # Mapping: node id -> payload dict
+    node = data["857a0843-..."]         # decodes just this node
+
+Also holds the docstore helpers shared by docstore-viewer.py (which caches
+the index across Streamlit reruns) and the headless docstore_cli.py.
+"""
+import bisect
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+METADATA = "docstore/metadata"
+REF_DOC_INFO = "docstore/ref_doc_info"
+DATA = "docstore/data"
+SECTIONS = (METADATA, REF_DOC_INFO, DATA)
+
+# A JSON string, with escapes (unrolled loop: no per-character alternation)
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# One match per structural bracket, or per run of everything between two
+# brackets (strings included, so brackets inside strings are skipped). The
+# Python loop thus sees a few tokens per node instead of every string in it.
+_TOKEN_RE = re.compile(rb'[{}\[\]]|(?:[^"{}\[\]]+|' + _STRING + rb')+', re.S)
+_STRING_RE = re.compile(_STRING, re.S)
+_WS = b" \t\r\n"
+_SCALAR_END = b",}] \t\r\n"
+_QUOTE, _COLON = b'"'[0], b":"[0]
+_OPEN_OBJECT, _OPEN_ARRAY = b"{"[0], b"["[0]
+_BRACKETS = b"{}[]"
+
+
+class DocstoreFormatError(ValueError):
+    """Raised when the bytes are not a JSON object of docstore sections."""
+
+
+def _keys(buffer, start: int, end: int) -> Iterator[Tuple[str, int]]:
+    """Object keys in buffer[start:end], with the offset just past each one's colon."""
+    for match in _STRING_RE.finditer(buffer, start, end):
+        position = match.end()
+        while position < end and buffer[position] in _WS:
+            position += 1
+        if position < end and buffer[position] == _COLON:
+            yield json.loads(match.group()), position + 1
+
+
+def _value_span(buffer, start: int) -> Tuple[int, int]:
+    """Span of a scalar value (string, number, literal) starting at or after `start`."""
+    size = len(buffer)
+    while start < size and buffer[start] in _WS:
+        start += 1
+    if start < size and buffer[start] == _QUOTE:
+        return start, _STRING_RE.match(buffer, start).end()
+    end = start
+    while end < size and buffer[end] not in _SCALAR_END:
+        end += 1
+    return start, end
+
+
+class _SectionTable:
+    """Entry ids of one section with their byte spans."""
+
+    __slots__ = ("ids", "positions", "starts", "ends")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.starts = array("Q")
+        self.ends = array("Q")
+
+    def add(self, key: str, start: int, end: int):
+        if key in self.positions:  # Later duplicates win, as with json.load
+            slot = self.positions[key]
+            self.starts[slot], self.ends[slot] = start, end
+            return
+        self.positions[key] = len(self.ids)
+        self.ids.append(key)
+        self.starts.append(start)
+        self.ends.append(end)
+
+
+def scan(buffer) -> Dict[str, _SectionTable]:
+    """
+    Builds the offset table of every top-level section in one pass.
+
+    Returns:
+        dict: section name -> table of entry id -> (start, end) byte span.
+    """
+    tables: Dict[str, _SectionTable] = {}
+    depth = 0
+    section: Optional[_SectionTable] = None
+    key: Optional[str] = None  # pending key inside a section (depth 2)
+    value_start = 0
+    for match in _TOKEN_RE.finditer(buffer):
+        start = match.start()
+        token = buffer[start]
+        if match.end() - start > 1 or token not in _BRACKETS:
+            # Keys only matter directly inside the root object and the sections
+            if depth == 1:
+                for name, _ in _keys(buffer, start, match.end()):
+                    section = tables.setdefault(name, _SectionTable())
+            elif depth == 2 and section is not None:
+                for next_key, after_colon in _keys(buffer, start, match.end()):
+                    if key is not None:  # the previous entry had a scalar value
+                        section.add(key, *_value_span(buffer, value_start))
+                    key, value_start = next_key, after_colon
+            continue
+        if token == _OPEN_OBJECT or token == _OPEN_ARRAY:
+            if depth == 2 and key is not None:
+                value_start = start
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 2 and key is not None:
+                section.add(key, value_start, match.end())
+                key = None
+            elif depth == 1:
+                if key is not None:  # the section's last entry had a scalar value
+                    section.add(key, *_value_span(buffer, value_start))
+                    key = None
+                section = None
+            elif depth < 0:
+                raise DocstoreFormatError("Unbalanced brackets in docstore JSON")
+    if depth != 0:
+        raise DocstoreFormatError("Truncated docstore JSON")
+    return tables
+
+
+class LazySection(Mapping):
+    """
+    Read-only mapping over one docstore section that decodes entries on access.
+
+    Recently decoded entries are kept in a small LRU, so rendering the same
+    page twice does not parse its nodes twice.
+    """
+
+    def __init__(self, index: "DocstoreIndex", table: _SectionTable, cache_size: int = 512):
+        self._index = index
+        self._table = table
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._cache_size = cache_size
+        # Streamlit sessions share one cached index across script threads
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = json.loads(self.raw(key))
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return key in self._table.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.ids)
+
+    def __len__(self) -> int:
+        return len(self._table.ids)
+
+    def keys(self):
+        return list(self._table.ids)
+
+    def raw(self, key: str) -> bytes:
+        """The undecoded JSON bytes of an entry (KeyError if missing)."""
+        slot = self._table.positions[key]
+        return bytes(self._index.buffer[self._table.starts[slot]:self._table.ends[slot]])
+
+    def span(self, key: str) -> Tuple[int, int]:
+        slot = self._table.positions[key]
+        return self._table.starts[slot], self._table.ends[slot]
+
+    def stream(self) -> Iterator[Tuple[str, Any]]:
+        """Decodes every entry in file order without keeping them (constant memory)."""
+        buffer, starts, ends = self._index.buffer, self._table.starts, self._table.ends
+        for slot, key in enumerate(self._table.ids):
+            yield key, json.loads(buffer[starts[slot]:ends[slot]])
+
+
+class DocstoreIndex:
+    """Offset index over a docstore.json held in a buffer (mmap or bytes)."""
+
+    def __init__(self, buffer, source: str = "<bytes>"):
+        self.buffer = buffer
+        self.source = source
+        self.tables = scan(buffer)
+        self._sections: Dict[str, LazySection] = {}
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "DocstoreIndex":
+        """Memory-maps a docstore file and indexes it."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls(b"{}", str(path))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, str(path))
+
+    def section(self, name: str) -> LazySection:
+        """Lazy mapping of a section (empty if the file does not have it)."""
+        if name not in self._sections:
+            self._sections[name] = LazySection(self, self.tables.get(name, _SectionTable()))
+        return self._sections[name]
+
+    def sections(self) -> Tuple[LazySection, LazySection, LazySection]:
+        """(metadata, ref_doc_info, data), like group_roots_and_nodes."""
+        return self.section(METADATA), self.section(REF_DOC_INFO), self.section(DATA)
+
+    def size_bytes(self) -> int:
+        return len(self.buffer)
+
+    def table_bytes(self) -> int:
+        """Approximate memory of the offset tables."""
+        total = 0
+        for table in self.tables.values():
+            total += table.starts.itemsize * len(table.starts) * 2
+            total += sum(len(key) + 49 for key in table.ids) + 100 * len(table.ids)
+        return total
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+
+# ------------------------- Node payloads -------------------------
+
+def get_node_payload(node_obj: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the payload for a node, accounting for version differences."""
+    return node_obj.get("__data__", {}) or {}
+
+
+def get_node_text(payload: Dict[str, Any]) -> str:
+    """Extract the text content from a node payload (handles common variants)."""
+    return (
+        payload.get("text")
+        or payload.get("document", {}).get("text")
+        or payload.get("raw_text")
+        or ""
+    )
+
+
+# ------------------------- Docstore helpers -------------------------
+
+def group_roots_and_nodes(docstore: Union[DocstoreIndex, Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """
+    Return the three main sections we care about. For an indexed docstore these
+    are lazy mappings that decode entries on access.
+    """
+    if isinstance(docstore, DocstoreIndex):
+        return docstore.sections()
+    meta = docstore.get("docstore/metadata", {}) or {}
+    ref = docstore.get("docstore/ref_doc_info", {}) or {}
+    data = docstore.get("docstore/data", {}) or {}
+    return meta, ref, data
+
+
+def decode_relationships(rels: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Best-effort decoding of relationship types.
+    Common persisted mapping: 1=PARENT, 2=PREVIOUS, 3=NEXT.
+    """
+    mapping = {"1": "PARENT", "2": "PREVIOUS", "3": "NEXT"}
+    decoded: List[Dict[str, str]] = []
+    if not isinstance(rels, dict):
+        return decoded
+    for code, info in rels.items():
+        kind = mapping.get(str(code), "REL_" + str(code))
+        node_id = ""
+        if isinstance(info, dict):
+            node_id = str(info.get("node_id", ""))
+        decoded.append({"kind": kind, "node_id": node_id})
+    return decoded
+
+
+def resolve_root_file_path(root_id: str, ref: Dict[str, Any], data: Dict[str, Any]) -> Optional[str]:
+    """
+    Resolve a root's file path, using ref_doc_info metadata if present; otherwise,
+    peek at the first node's metadata for file_path/filepath/path/source.
+    """
+    info = ref.get(root_id, {}) if isinstance(root_id, str) else {}
+    md = info.get("metadata", {}) if isinstance(info, dict) else {}
+    fp = None
+    for k in ("file_path", "filepath", "path", "source"):
+        v = md.get(k)
+        if v:
+            fp = str(v)
+            break
+    if fp:
+        return fp
+
+    node_ids = info.get("node_ids", []) if isinstance(info, dict) else []
+    if isinstance(node_ids, (str, bytes)):
+        node_ids = [node_ids]
+    for nid in node_ids[:1]:
+        payload = get_node_payload(data.get(nid, {}))
+        nmd = payload.get("metadata", {}) or {}
+        for k in ("file_path", "filepath", "path", "source"):
+            v = nmd.get(k)
+            if v:
+                return str(v)
+    return None
+
+
+def count_nodes_for_root(root_id: str, ref: Dict[str, Any]) -> int:
+    node_ids = ref.get(root_id, {}).get("node_ids", [])
+    if isinstance(node_ids, (str, bytes)):
+        return 1
+    return len(node_ids or [])
+
+
+def find_orphan_nodes(meta: Dict[str, Any], ref: Dict[str, Any]) -> List[str]:
+    """
+    Nodes that have a ref_doc_id pointing to a root not present in ref_doc_info.
+    """
+    roots = set(ref.keys())
+    orphans: List[str] = []
+    # Indexed sections are streamed rather than decoded through the mapping
+    entries = meta.stream() if isinstance(meta, LazySection) else meta.items()
+    for obj_id, m in entries:
+        if not isinstance(m, dict):
+            continue
+        r = m.get("ref_doc_id")
+        if r and r not in roots:
+            orphans.append(obj_id)
+    return orphans
+
+
+# ------------------------- Statistics -------------------------
+
+def compute_stats(index: DocstoreIndex) -> Dict[str, Any]:
+    """
+    Aggregate statistics of a docstore in one streaming pass over the
+    metadata and ref_doc_info sections (node payloads are not decoded).
+
+    Returns:
+        dict: roots, metadata_entries, nodes, orphans (node ids whose
+        ref_doc_id is not a root), missing (declared chunk ids absent from
+        data, per root) and per_root {root_id: (declared, found)}.
+    """
+    meta, ref, data = index.sections()
+    orphans = find_orphan_nodes(meta, ref)
+    per_root, missing = {}, {}
+    for root_id, info in ref.stream():
+        node_ids = info.get("node_ids", []) if isinstance(info, dict) else []
+        if isinstance(node_ids, (str, bytes)):
+            node_ids = [node_ids]
+        absent = [nid for nid in node_ids if nid not in data]
+        per_root[root_id] = (len(node_ids), len(node_ids) - len(absent))
+        if absent:
+            missing[root_id] = absent
+    return {
+        "roots": len(ref),
+        "metadata_entries": len(meta),
+        "nodes": len(data),
+        "orphans": orphans,
+        "missing": missing,
+        "per_root": per_root,
+    }
+
+
+# ------------------------- Full-text search -------------------------
+
+# Unicode word characters, so non-Latin text is searchable too
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Token inverted index over the chunk texts of a docstore, ranked with BM25.
+
+    Posting lists are stored CSR-style in shared numpy arrays (term slot ->
+    range of node ordinals and term frequencies) next to a sorted term list,
+    so a query token also matches every term it is a prefix of (results
+    update while typing) with two bisects. All query tokens must match.
+    Chunk ids can be searched by prefix as well.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.node_ids: List[str] = []
+        self.root_ids: List[Optional[str]] = []
+        self.terms: List[str] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.ordinals = np.zeros(0, dtype=np.uint32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_len = np.zeros(0, dtype=np.uint32)
+        # Lower-cased node ids in sorted order, for id prefix search
+        self._id_keys: List[str] = []
+        self._id_ordinals = np.zeros(0, dtype=np.uint32)
+
+    @classmethod
+    def build(cls, index: DocstoreIndex) -> "SearchIndex":
+        """Streams every node once; only the postings are kept."""
+        meta, ref, data = index.sections()
+        # Root of each node: its ref_doc_id, else the root that lists it
+        root_of = {}
+        for root_id, info in ref.stream():
+            node_ids = info.get("node_ids", []) if isinstance(info, dict) else []
+            for nid in [node_ids] if isinstance(node_ids, str) else node_ids:
+                root_of[nid] = root_id
+
+        search = cls()
+        postings: Dict[str, Tuple[array, array]] = {}
+        doc_len = array("I")
+        for ordinal, (node_id, node_obj) in enumerate(data.stream()):
+            payload = get_node_payload(node_obj if isinstance(node_obj, dict) else {})
+            counts = Counter(tokenize(get_node_text(payload)))
+            search.node_ids.append(node_id)
+            source = (payload.get("relationships") or {}).get("1")
+            search.root_ids.append(root_of.get(node_id) or (source.get("node_id") if isinstance(source, dict) else None))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                ords, tfs = postings.setdefault(term, (array("I"), array("H")))
+                ords.append(ordinal)
+                tfs.append(min(tf, 65535))
+
+        search.terms = sorted(postings)
+        sizes = [len(postings[term][0]) for term in search.terms]
+        search.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        search.ordinals = np.empty(int(search.offsets[-1]), dtype=np.uint32)
+        search.tfs = np.empty(int(search.offsets[-1]), dtype=np.uint16)
+        for slot, term in enumerate(search.terms):
+            ords, tfs = postings.pop(term)
+            start, end = search.offsets[slot], search.offsets[slot + 1]
+            search.ordinals[start:end] = np.frombuffer(ords, dtype=np.uint32)
+            search.tfs[start:end] = np.frombuffer(tfs, dtype=np.uint16)
+        search.doc_len = np.frombuffer(doc_len, dtype=np.uint32).copy()
+        by_id = sorted(range(len(search.node_ids)), key=lambda i: search.node_ids[i].lower())
+        search._id_keys = [search.node_ids[i].lower() for i in by_id]
+        search._id_ordinals = np.asarray(by_id, dtype=np.uint32)
+        return search
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def memory_bytes(self) -> int:
+        arrays = self.offsets.nbytes + self.ordinals.nbytes + self.tfs.nbytes + self.doc_len.nbytes
+        return arrays + sum(len(t) + 49 for t in self.terms) + 120 * len(self.node_ids)
+
+    @staticmethod
+    def _prefix_range(keys: List[str], prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + "\U0010ffff")
+
+    def _token_scores(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 contribution of one query token (summed over the terms it prefixes)."""
+        lo, hi = self._prefix_range(self.terms, token)
+        if lo == hi:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float64)
+        start, end = self.offsets[lo], self.offsets[hi]
+        ords = self.ordinals[start:end]
+        tfs = self.tfs[start:end].astype(np.float64)
+        # Per-posting idf of the term it belongs to
+        df = np.diff(self.offsets[lo:hi + 1])
+        idf = np.log(1 + (len(self.node_ids) - df + 0.5) / (df + 0.5))
+        idf = np.repeat(idf, df)
+        avg_len = max(float(self.doc_len.mean()), 1.0)
+        lengths = self.doc_len[ords]
+        scores = idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lengths / avg_len))
+        unique, inverse = np.unique(ords, return_inverse=True)
+        return unique, np.bincount(inverse, weights=scores)
+
+    def search(self, query: str, top_k: int = 50) -> List[Tuple[str, Optional[str], float]]:
+        """
+        Ranked chunks matching all query tokens, plus chunks whose id starts
+        with the query (ranked first).
+
+        Returns:
+            list: (node_id, root_id, score) tuples, best first.
+        """
+        query = (query or "").strip()
+        if not query or not self.node_ids:
+            return []
+        ordinals, scores = None, None
+        for token in dict.fromkeys(tokenize(query)):
+            token_ords, token_scores = self._token_scores(token)
+            if ordinals is None:
+                ordinals, scores = token_ords, token_scores
+            else:
+                keep_prev = np.isin(ordinals, token_ords, assume_unique=True)
+                keep_new = np.isin(token_ords, ordinals, assume_unique=True)
+                ordinals, scores = ordinals[keep_prev], scores[keep_prev] + token_scores[keep_new]
+            if not len(ordinals):
+                break
+
+        results: Dict[int, float] = {}
+        lo, hi = self._prefix_range(self._id_keys, query.lower())
+        for ordinal in self._id_ordinals[lo:min(hi, lo + top_k)].tolist():
+            results[ordinal] = math.inf
+        if ordinals is not None and len(ordinals):
+            if len(ordinals) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                ordinals, scores = ordinals[best], scores[best]
+            for ordinal, score in zip(ordinals.tolist(), scores.tolist()):
+                results.setdefault(ordinal, score)
+        ranked = sorted(results.items(), key=lambda item: -item[1])[:top_k]
+        return [(self.node_ids[o], self.root_ids[o], s) for o, s in ranked]
@@ -0,0 +1,97 @@
+"""
+Simple load-test harness for the RAG backend.
+
+Fires POST /chat requests with a fixed number of concurrent clients and
+reports throughput and latency percentiles. Pass several --url values to
+compare servers side by side, e.g. the Flask dev server vs. the ASGI app:
+
+    python python-scripts/load_test.py \
+        --url http://localhost:5000/chat --url http://localhost:8000/chat \
+        --requests 200 --concurrency 16
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+
+DEFAULT_PROMPTS = [
+    "What products do you offer?",
+    "How should the product be stored?",
+    "Is there any anti-aging benefit?",
+    "What is the recommended daily dose?",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def send(url: str, prompt: str, timeout: float) -> float:
+    body = json.dumps({"prompt": prompt}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def run(url: str, prompts: List[str], total: int, concurrency: int, timeout: float) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+
+    def task(i: int):
+        return send(url, prompts[i % len(prompts)], timeout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(task, i) for i in range(total)]
+        for f in futures:
+            try:
+                latencies.append(f.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /chat endpoint.")
+    parser.add_argument("--url", action="append", help="Chat endpoint URL (repeatable)")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per URL")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--prompts", help="Optional file with one prompt per line")
+    args = parser.parse_args()
+
+    urls = args.url or ["http://localhost:5000/chat"]
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts, "r", encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    print(f"{'url':<40} {'ok':>6} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for url in urls:
+        r = run(url, prompts, args.requests, args.concurrency, args.timeout)
+        print(f"{url:<40} {r['requests'] - r['errors']:>6} {r['errors']:>5} {r['rps']:>8.2f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Minimal local stand-in for the OpenAI API, for exercising the backend's
+shared client (keep-alive pool, concurrency limit, retries, coalescing)
+without an API key or quota:
+
+    python python-scripts/mock_openai_server.py --port 8001 --latency 0.5 --error-rate 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python backend/api.py
+
+Serves GET /v1/models and POST /v1/chat/completions (plain and streaming).
+A fraction of completions (--error-rate) is answered with 429 or 503 to
+trigger backoff. GET /mock/stats reports request, error and connection
+counts and the highest number of concurrent completions seen.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+stats = {"requests": 0, "completions": 0, "errors_injected": 0, "connections": 0, "in_flight": 0, "max_in_flight": 0}
+stats_lock = threading.Lock()
+
+
+def answer_words(messages, n: int):
+    prompt = messages[-1].get("content", "") if messages else ""
+    if isinstance(prompt, list):  # content parts
+        prompt = " ".join(part.get("text", "") for part in prompt)
+    words = (prompt.split() or ["mock"])[:8]
+    return [words[i % len(words)] for i in range(n)]
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+    args = None
+
+    def setup(self):
+        super().setup()
+        with stats_lock:
+            stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        if self.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        with stats_lock:
+            stats["requests"] += 1
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": self.args.model, "object": "model", "created": 0, "owned_by": "mock"}
+            ]})
+        elif self.path == "/mock/stats":
+            with stats_lock:
+                self._send_json(200, dict(stats))
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with stats_lock:
+            stats["requests"] += 1
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        if random.random() < self.args.error_rate:
+            with stats_lock:
+                stats["errors_injected"] += 1
+            status = random.choice([429, 503])
+            self._send_json(status, {"error": {"message": "Injected failure", "type": "mock_error"}},
+                            {"Retry-After": "0"} if status == 429 else None)
+            return
+
+        with stats_lock:
+            stats["completions"] += 1
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            words = answer_words(body.get("messages", []), self.args.tokens)
+            if body.get("stream"):
+                self._stream(body, words)
+            else:
+                time.sleep(self.args.latency)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", self.args.model),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(words)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": length // 4, "completion_tokens": len(words),
+                              "total_tokens": length // 4 + len(words)},
+                })
+        finally:
+            with stats_lock:
+                stats["in_flight"] -= 1
+
+    def _stream(self, body: dict, words):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        delay = self.args.latency / max(len(words), 1)
+        for i, word in enumerate(words + [None]):
+            delta = {"content": (" " if i else "") + word} if word is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", self.args.model),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None if word is not None else "stop"}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            time.sleep(delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per completion")
+    parser.add_argument("--tokens", type=int, default=20, help="Words per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of completions answered with 429/503")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    MockOpenAIHandler.args = args
+    server = ThreadingHTTPServer((args.host, args.port), MockOpenAIHandler)
+    print(f"Mock OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()